@@ -0,0 +1,374 @@
+"""Migration 1: the schema as it was when versioned migrations were introduced.
+
+The tables below are a frozen copy of the models at that point; they must not be
+edited to follow later model changes, which get migrations of their own (see
+migrations.py). The baseline creates them on an empty database, and also brings
+up a database created before migrations existed: it creates the missing tables
+and indexes, adds the columns that were added to existing tables before then
+(LEGACY_COLUMNS), backfills their data and sets up the search structures.
+
+The backfills and the SQLite search structures are spelled out here as well,
+against these tables, rather than going through the models or the live helpers
+in summary.py, search.py and geo.py, which follow the current schema.
+"""
+from sqlalchemy import (
+    Boolean, Column, DateTime, Float, ForeignKey, Index, Integer, JSON, MetaData, String, Table, Text,
+    UniqueConstraint, and_, func, inspect, insert, literal_column, select, text, update
+)
+import locations
+import schema
+
+metadata = MetaData()
+
+users = Table(
+    "users", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("email", String, unique=True, index=True),
+    Column("username", String, unique=True, index=True),
+    Column("first_name", String),
+    Column("last_name", String),
+    Column("hashed_password", String),
+    Column("role", String),
+    Column("is_verified", Boolean),
+)
+
+locations_table = Table(
+    "locations", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("city", String),
+    Column("neighborhood", String, nullable=True),
+    Column("city_key", String, index=True),
+    Column("neighborhood_key", String, index=True),
+    UniqueConstraint("city_key", "neighborhood_key", name="_city_neighborhood_uc"),
+)
+
+properties = Table(
+    "properties", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("title", String, index=True),
+    Column("description", Text),
+    Column("price", Float),
+    Column("property_type", String),
+    Column("location", String),
+    Column("status", String),
+    Column("is_active", Boolean),
+    Column("owner_id", Integer, ForeignKey("users.id"), index=True),
+    Column("latitude", Float, nullable=True),
+    Column("longitude", Float, nullable=True),
+    Column("location_id", Integer, ForeignKey("locations.id"), nullable=True, index=True),
+    Column("updated_at", DateTime, nullable=True),
+    Index("ix_properties_lat_lng", "latitude", "longitude"),
+    Index("ix_properties_updated_at_id", "updated_at", "id"),
+)
+
+_LISTED = and_(properties.c.is_active == True, properties.c.status == literal_column("'available'"))
+Index(
+    "ix_properties_listed_type_price", properties.c.property_type, properties.c.price, properties.c.id,
+    sqlite_where=_LISTED, postgresql_where=_LISTED
+)
+Index(
+    "ix_properties_listed_price", properties.c.price, properties.c.id,
+    sqlite_where=_LISTED, postgresql_where=_LISTED
+)
+
+property_summary = Table(
+    "property_summary", metadata,
+    Column("property_id", Integer, ForeignKey("properties.id"), primary_key=True),
+    Column("review_count", Integer, nullable=False),
+    Column("rating_total", Integer, nullable=False),
+    Column("booking_count", Integer, nullable=False),
+    Column("image_count", Integer, nullable=False),
+    Column("cover_image_url", String, nullable=True),
+    Column("cover_image_variants", JSON, nullable=True),
+)
+
+location_trigrams = Table(
+    "location_trigrams", metadata,
+    Column("kind", String, primary_key=True),
+    Column("trigram", String, primary_key=True),
+    Column("name_key", String, primary_key=True),
+)
+
+bookings = Table(
+    "bookings", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("property_id", Integer, ForeignKey("properties.id")),
+    Column("client_id", Integer, ForeignKey("users.id"), index=True),
+    Column("booking_date", DateTime),
+    Column("status", String),
+    Index("ix_bookings_property_date", "property_id", "booking_date"),
+)
+
+reviews = Table(
+    "reviews", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("property_id", Integer, ForeignKey("properties.id"), index=True),
+    Column("author_id", Integer, ForeignKey("users.id"), index=True),
+    Column("rating", Integer),
+    Column("comment", Text),
+)
+
+Table(
+    "messages", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("sender_id", Integer, ForeignKey("users.id")),
+    Column("receiver_id", Integer, ForeignKey("users.id")),
+    Column("content", Text),
+    Column("timestamp", DateTime),
+    Index("ix_messages_sender_receiver_time", "sender_id", "receiver_id", "timestamp"),
+    Index("ix_messages_receiver_time", "receiver_id", "timestamp"),
+)
+
+Table(
+    "stored_files", metadata,
+    Column("sha256", String(64), primary_key=True),
+    Column("path", String),
+    Column("content_type", String),
+    Column("size_bytes", Integer),
+    Column("ref_count", Integer, nullable=False),
+    Column("variants", JSON, nullable=True),
+)
+
+property_images = Table(
+    "property_images", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("property_id", Integer, ForeignKey("properties.id"), index=True),
+    Column("url", String),
+    Column("content_type", String, nullable=True),
+    Column("size_bytes", Integer, nullable=True),
+    Column("sha256", String(64), ForeignKey("stored_files.sha256"), nullable=True, index=True),
+    Column("variants", JSON, nullable=True),
+    Column("position", Integer, nullable=True),
+    Column("is_cover", Boolean, nullable=True),
+)
+
+Table(
+    "revoked_sessions", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("session_id", String(32), nullable=True, unique=True),
+    Column("user_id", Integer, ForeignKey("users.id"), nullable=True, index=True),
+    Column("revoked_at", Float, nullable=False),
+    Column("expires_at", Float, nullable=False, index=True),
+)
+
+Table(
+    "rate_limit_buckets", metadata,
+    Column("key", String, primary_key=True),
+    Column("tokens", Float, nullable=False),
+    Column("updated_at", Float, nullable=False),
+)
+
+Table(
+    "favorites", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.id")),
+    Column("property_id", Integer, ForeignKey("properties.id"), index=True),
+    UniqueConstraint("user_id", "property_id", name="_user_property_favorite_uc"),
+)
+
+# The SQLite FTS5 and R*Tree indexes of the listings, with the triggers that keep them in sync.
+_SEARCH_INDEXES = {
+    "properties_fts": (
+        [
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS properties_fts USING fts5(
+                title, description, location,
+                content='properties', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS properties_fts_ai AFTER INSERT ON properties BEGIN
+                INSERT INTO properties_fts(rowid, title, description, location)
+                VALUES (new.id, new.title, new.description, new.location);
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS properties_fts_ad AFTER DELETE ON properties BEGIN
+                INSERT INTO properties_fts(properties_fts, rowid, title, description, location)
+                VALUES ('delete', old.id, old.title, old.description, old.location);
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS properties_fts_au AFTER UPDATE OF title, description, location
+            ON properties BEGIN
+                INSERT INTO properties_fts(properties_fts, rowid, title, description, location)
+                VALUES ('delete', old.id, old.title, old.description, old.location);
+                INSERT INTO properties_fts(rowid, title, description, location)
+                VALUES (new.id, new.title, new.description, new.location);
+            END
+            """,
+        ],
+        "INSERT INTO properties_fts(properties_fts) VALUES ('rebuild')",
+    ),
+    "properties_rtree": (
+        [
+            "CREATE VIRTUAL TABLE IF NOT EXISTS properties_rtree USING rtree(id, min_lat, max_lat, min_lng, max_lng)",
+            """
+            CREATE TRIGGER IF NOT EXISTS properties_rtree_ai AFTER INSERT ON properties
+            WHEN new.latitude IS NOT NULL AND new.longitude IS NOT NULL BEGIN
+                INSERT INTO properties_rtree VALUES (new.id, new.latitude, new.latitude, new.longitude, new.longitude);
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS properties_rtree_ad AFTER DELETE ON properties BEGIN
+                DELETE FROM properties_rtree WHERE id = old.id;
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS properties_rtree_au AFTER UPDATE OF latitude, longitude ON properties BEGIN
+                DELETE FROM properties_rtree WHERE id = old.id;
+                INSERT INTO properties_rtree
+                SELECT new.id, new.latitude, new.latitude, new.longitude, new.longitude
+                WHERE new.latitude IS NOT NULL AND new.longitude IS NOT NULL;
+            END
+            """,
+        ],
+        "INSERT INTO properties_rtree SELECT id, latitude, latitude, longitude, longitude FROM properties"
+        " WHERE latitude IS NOT NULL AND longitude IS NOT NULL",
+    ),
+}
+
+BACKFILL_BATCH_SIZE = 500
+
+# Columns added to tables of the original schema before migrations existed.
+LEGACY_COLUMNS = {
+    "properties": ["latitude", "longitude", "location_id", "updated_at"],
+    "property_images": ["content_type", "size_bytes", "sha256", "variants", "position", "is_cover"],
+}
+
+
+def _add_legacy_columns(engine) -> set:
+    """Adds the LEGACY_COLUMNS an existing database lacks; returns the (table, column) pairs added."""
+    added = set()
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table_name, column_names in LEGACY_COLUMNS.items():
+            existing = {column["name"] for column in inspector.get_columns(table_name)}
+            for name in column_names:
+                if name in existing:
+                    continue
+                column_type = metadata.tables[table_name].c[name].type.compile(dialect=engine.dialect)
+                conn.exec_driver_sql(f"ALTER TABLE {table_name} ADD COLUMN {name} {column_type}")
+                added.add((table_name, name))
+    return added
+
+
+def _number_images(engine):
+    """Gives existing images gallery positions in upload order."""
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "UPDATE property_images SET is_cover = false, position = ("
+            " SELECT COUNT(*) FROM property_images AS earlier"
+            " WHERE earlier.property_id = property_images.property_id AND earlier.id < property_images.id)"
+        )
+
+
+def _setup_search_indexes(engine):
+    """Creates the SQLite search indexes that are missing, filled from the existing listings."""
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as conn:
+        for name, (statements, fill) in _SEARCH_INDEXES.items():
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": name}
+            ).first()
+            for statement in statements:
+                conn.execute(text(statement))
+            if not exists:
+                conn.execute(text(fill))
+
+
+def _location_id(conn, city: str, neighborhood) -> int:
+    """Id of the dictionary entry for a city/neighborhood, creating it and indexing its names if needed.
+
+    Keys come from locations.py, so that they match the keys searches look up.
+    """
+    city_key, neighborhood_key = locations.normalize(city), locations.normalize(neighborhood)
+    table = locations_table
+    location_id = conn.execute(select(table.c.id).where(
+        table.c.city_key == city_key, table.c.neighborhood_key == neighborhood_key
+    )).scalar()
+    if location_id is not None:
+        return location_id
+
+    location_id = conn.execute(insert(table).values(
+        city=city.strip(), neighborhood=neighborhood.strip() if neighborhood_key else None,
+        city_key=city_key, neighborhood_key=neighborhood_key
+    )).inserted_primary_key[0]
+    for kind, key in ((locations.CITY, city_key), (locations.NEIGHBORHOOD, neighborhood_key)):
+        if not key:
+            continue
+        indexed = conn.execute(select(location_trigrams.c.name_key).where(
+            location_trigrams.c.kind == kind, location_trigrams.c.name_key == key
+        )).first()
+        if not indexed:
+            conn.execute(insert(location_trigrams), [
+                {"kind": kind, "trigram": gram, "name_key": key} for gram in locations.trigrams(key)
+            ])
+    return location_id
+
+
+def _link_locations(engine, batch_size: int = BACKFILL_BATCH_SIZE):
+    """Links listings without a location_id to dictionary entries, committing per batch."""
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            batch = conn.execute(select(properties.c.id, properties.c.location).where(
+                properties.c.location_id.is_(None), properties.c.id > last_id
+            ).order_by(properties.c.id).limit(batch_size)).all()
+            if not batch:
+                return
+            for prop_id, location_text in batch:
+                city, neighborhood = locations.parse_location(location_text)
+                if locations.normalize(city):
+                    conn.execute(update(properties).where(properties.c.id == prop_id).values(
+                        location_id=_location_id(conn, city, neighborhood)
+                    ))
+            last_id = batch[-1].id
+
+
+def _fill_summaries(engine):
+    """Computes a summary row for every listing from its reviews, bookings and images."""
+    listing = properties.c.id
+    images = property_images.c
+    cover = select(images.url).where(images.property_id == listing).order_by(
+        func.coalesce(images.is_cover, False).desc(), images.position, images.id
+    ).limit(1)
+    rows = select(
+        listing,
+        select(func.count()).where(reviews.c.property_id == listing).scalar_subquery(),
+        select(func.coalesce(func.sum(reviews.c.rating), 0)).where(reviews.c.property_id == listing)
+        .scalar_subquery(),
+        select(func.count()).where(
+            bookings.c.property_id == listing, func.coalesce(bookings.c.status, "") != "declined"
+        ).scalar_subquery(),
+        select(func.count()).where(images.property_id == listing).scalar_subquery(),
+        cover.scalar_subquery(),
+        cover.with_only_columns(images.variants).scalar_subquery(),
+    )
+    with engine.begin() as conn:
+        conn.execute(insert(property_summary).from_select([
+            "property_id", "review_count", "rating_total", "booking_count", "image_count",
+            "cover_image_url", "cover_image_variants",
+        ], rows))
+
+
+def apply(engine):
+    """Creates the baseline schema, or completes that of a database created before migrations."""
+    new_tables = set(metadata.tables) - set(inspect(engine).get_table_names())
+    metadata.create_all(bind=engine)
+    added = _add_legacy_columns(engine)
+
+    for table in metadata.sorted_tables:
+        for index in table.indexes:
+            schema.create_index_online(engine, index)
+
+    _setup_search_indexes(engine)
+
+    if ("properties", "location_id") in added:
+        _link_locations(engine)
+    if ("property_images", "position") in added:
+        _number_images(engine)
+    if "property_summary" in new_tables:
+        _fill_summaries(engine)
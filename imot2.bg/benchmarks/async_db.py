@@ -0,0 +1,132 @@
+"""Throughput and tail latency of the async database path against the sync one.
+
+Serves the same inbox query two ways on one throw-away SQLite database: the
+ported ``routers.messages.get_my_messages`` on the async engine, and the sync
+handler it replaced (a ``def`` route on ``get_db``, run in the threadpool). Each
+is hit by ``--concurrency`` clients in-process for ``--requests`` requests in
+total; requests per second, latency percentiles and failed requests are
+printed for both. Both engines keep SQLAlchemy's default pool, as the app does.
+
+Usage: python benchmarks/async_db.py [--concurrency 200] [--requests 4000] [--messages 50]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+os.chdir(APP_DIR)
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import create_engine, or_
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from database import async_url, get_async_db, get_db
+from routers import messages
+from routers.auth import get_current_user
+import migrations
+import models
+import schemas
+
+USERS = 20
+
+
+def sync_inbox(db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    return db.query(models.Message).filter(
+        or_(
+            models.Message.receiver_id == current_user.id,
+            models.Message.sender_id == current_user.id
+        )
+    ).order_by(models.Message.timestamp.desc()).all()
+
+
+def setup(workdir: str, message_count: int) -> FastAPI:
+    url = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+    migrations.migrate(engine)
+    Session = sessionmaker(bind=engine)
+    started = datetime(2026, 1, 1)
+    with Session() as db:
+        db.add_all(models.User(id=i, username=f"user{i}", email=f"user{i}@test.com") for i in range(1, USERS + 1))
+        db.add_all(
+            models.Message(sender_id=i % USERS + 1, receiver_id=(i + 1) % USERS + 1, content="Здравейте",
+                           timestamp=started + timedelta(minutes=i))
+            for i in range(message_count * USERS)
+        )
+        db.commit()
+    AsyncSession = async_sessionmaker(create_async_engine(async_url(url)), expire_on_commit=False)
+
+    def session():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def async_session():
+        async with AsyncSession() as db:
+            yield db
+
+    bench = FastAPI()
+    bench.add_api_route("/sync/inbox", sync_inbox, response_model=List[schemas.MessageResponse])
+    bench.add_api_route("/async/inbox", messages.get_my_messages, response_model=List[schemas.MessageResponse])
+    bench.dependency_overrides[get_db] = session
+    bench.dependency_overrides[get_async_db] = async_session
+    bench.dependency_overrides[get_current_user] = lambda: models.User(id=1, role="client")
+    return bench
+
+
+async def load(client: httpx.AsyncClient, path: str, concurrency: int, total: int):
+    latencies = []
+    failed = 0
+    remaining = iter(range(total))
+
+    async def worker():
+        nonlocal failed
+        for _ in remaining:
+            started = time.perf_counter()
+            response = await client.get(path)
+            latencies.append((time.perf_counter() - started) * 1000)
+            failed += response.is_error
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - started, failed
+
+
+def report(label: str, latencies, elapsed: float, failed: int):
+    ordered = sorted(latencies)
+    p99 = ordered[int(len(ordered) * 0.99) - 1]
+    print(f"{label:<6} {len(ordered) / elapsed:8.1f} req/s  p50={statistics.median(ordered):8.2f} ms "
+          f"p99={p99:8.2f} ms  max={ordered[-1]:8.2f} ms  failed={failed}")
+
+
+async def run(app: FastAPI, args):
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for path in ("/sync/inbox", "/async/inbox"):
+            await load(client, path, 1, 20)  # warm-up
+        for label in ("sync", "async"):
+            report(label, *await load(client, f"/{label}/inbox", args.concurrency, args.requests))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=4000)
+    parser.add_argument("--messages", type=int, default=50, help="messages per user")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        asyncio.run(run(setup(workdir, args.messages), args))
+
+
+if __name__ == "__main__":
+    main()
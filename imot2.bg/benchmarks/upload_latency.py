@@ -0,0 +1,113 @@
+"""Latency of ordinary requests while large images are being uploaded.
+
+Runs the app in-process against a throw-away SQLite database, starts several
+concurrent uploads and keeps sending cheap GET requests at the same time, then
+prints latency percentiles for the GET requests with and without uploads in
+flight. A handler that blocks the event loop shows up as GET latencies in the
+order of a whole upload.
+
+Usage: python benchmarks/upload_latency.py [--uploads 4] [--size-mb 8] [--requests 200]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+os.chdir(APP_DIR)
+
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from main import app
+from database import get_db
+from routers.auth import get_current_user
+import migrations
+import models
+import uploads
+
+JPEG_HEADER = b"\xff\xd8\xff\xe0"
+
+
+def setup(workdir: str):
+    engine = create_engine(f"sqlite:///{os.path.join(workdir, 'bench.db')}", connect_args={"check_same_thread": False})
+    migrations.migrate(engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        db.add(models.User(id=1, username="agent", email="agent@test.com", role="agent", is_verified=True))
+        db.add(models.Property(id=1, title="Bench", price=1, property_type="sale", location="София", owner_id=1))
+        db.commit()
+
+    def session():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = session
+    app.dependency_overrides[get_current_user] = lambda: models.User(id=1, role="agent", is_verified=True)
+    uploads.UPLOAD_DIR = os.path.join(workdir, "uploads")
+
+
+async def timed_gets(client: httpx.AsyncClient, count: int, stop: asyncio.Event = None):
+    latencies = []
+    for _ in range(count):
+        if stop is not None and stop.is_set():
+            break
+        started = time.perf_counter()
+        await client.get("/login")
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(0)
+    return latencies
+
+
+async def upload(client: httpx.AsyncClient, payload: bytes):
+    response = await client.post(
+        "/properties/1/upload-image", files={"file": ("bench.jpg", payload, "image/jpeg")}
+    )
+    response.raise_for_status()
+
+
+def report(label: str, latencies):
+    ordered = sorted(latencies)
+    p95 = ordered[int(len(ordered) * 0.95) - 1] if ordered else float("nan")
+    print(f"{label:<22} n={len(ordered):<5} p50={statistics.median(ordered):7.2f} ms "
+          f"p95={p95:7.2f} ms  max={ordered[-1]:7.2f} ms")
+
+
+async def run(args):
+    payload = JPEG_HEADER + os.urandom(args.size_mb * 1024 * 1024 - len(JPEG_HEADER))
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.get("/login")
+        report("idle", await timed_gets(client, args.requests))
+
+        stop = asyncio.Event()
+        gets = asyncio.create_task(timed_gets(client, args.requests * 100, stop))
+        started = time.perf_counter()
+        await asyncio.gather(*(upload(client, payload) for _ in range(args.uploads)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        report("during uploads", await gets)
+        print(f"{args.uploads} x {args.size_mb} MB uploaded in {elapsed:.2f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--uploads", type=int, default=4)
+    parser.add_argument("--size-mb", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        setup(workdir)
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,160 @@
-"""Database configuration and session management for the Imot2.bg application."""
-from sqlalchemy import create_engine
+"""Database configuration and session management for the Imot2.bg application.
+
+Routers that only talk to the database use the async engine (``get_async_db``),
+so a request waiting on SQL does not hold a threadpool thread; the rest still use
+the sync ``get_db``. Both engines point at the same database.
+
+The database is chosen with IMOT2_DATABASE_URL (SQLite by default, or a
+``postgresql://`` URL). Pool sizes come from IMOT2_DB_POOL_SIZE,
+IMOT2_DB_MAX_OVERFLOW, IMOT2_DB_POOL_TIMEOUT and IMOT2_DB_POOL_RECYCLE; each
+SQLite pragma in SQLITE_PRAGMAS can be overridden with IMOT2_SQLITE_<PRAGMA>,
+or skipped by setting it to an empty string.
+"""
+import os
+import re
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./imot2.db"
+DATABASE_URL_ENV = "IMOT2_DATABASE_URL"
+SQLALCHEMY_DATABASE_URL = os.environ.get(DATABASE_URL_ENV, "sqlite:///./imot2.db")
+
+# Async driver for each backend; asyncpg is only needed with PostgreSQL.
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+# Applied to every new SQLite connection.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",  # readers and the writer no longer block each other
+    "synchronous": "NORMAL",  # durable with WAL up to the last checkpoint; no fsync per commit
+    "cache_size": "-65536",  # negative means KiB: a 64 MiB page cache per connection
+    "mmap_size": "268435456",  # read up to 256 MiB of the file through mmap
+    "busy_timeout": "5000",  # ms to wait for a lock before "database is locked"
+}
+# Together the pool must cover the 40 threads of the sync threadpool: with fewer
+# connections, threads waiting for one starve the sessions that would release them.
+POOL_SIZE = 10
+MAX_OVERFLOW = 30
+POOL_TIMEOUT = 30
+# Recycling avoids connections dropped by PostgreSQL or a proxy while idle.
+POSTGRES_POOL_RECYCLE = 1800
+
+_PRAGMA_VALUE = re.compile(r"^-?[A-Za-z0-9_]+$")
+
+
+def _is_memory(url) -> bool:
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def sqlite_pragmas(env=None) -> dict:
+    """SQLITE_PRAGMAS with the IMOT2_SQLITE_<PRAGMA> overrides applied."""
+    env = os.environ if env is None else env
+    pragmas = {}
+    for name, default in SQLITE_PRAGMAS.items():
+        value = env.get(f"IMOT2_SQLITE_{name.upper()}", default).strip()
+        if not value:
+            continue
+        if not _PRAGMA_VALUE.match(value):
+            raise ValueError(f"Invalid value for SQLite pragma {name}: {value!r}")
+        pragmas[name] = value
+    return pragmas
+
+
+def engine_options(url, env=None) -> dict:
+    """Keyword arguments for create_engine() for the backend of ``url``.
+
+    SQLite gets a connection usable from the threadpool; PostgreSQL gets
+    pre-ping and recycling. Both get the pool sizing, except in-memory SQLite,
+    which has a single connection anyway.
+    """
+    env = os.environ if env is None else env
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite":
+        options = {"connect_args": {"check_same_thread": False}}
+        if _is_memory(url):
+            return options
+        recycle = -1
+    else:
+        options = {"pool_pre_ping": True}
+        recycle = POSTGRES_POOL_RECYCLE
+    options.update(
+        pool_size=int(env.get("IMOT2_DB_POOL_SIZE", POOL_SIZE)),
+        max_overflow=int(env.get("IMOT2_DB_MAX_OVERFLOW", MAX_OVERFLOW)),
+        pool_timeout=float(env.get("IMOT2_DB_POOL_TIMEOUT", POOL_TIMEOUT)),
+        pool_recycle=int(env.get("IMOT2_DB_POOL_RECYCLE", recycle)),
+    )
+    return options
+
+
+def install_pragmas(engine, pragmas: dict):
+    """Runs ``PRAGMA name = value`` for each pragma on every new connection of ``engine``."""
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name} = {value}")
+        finally:
+            cursor.close()
+
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+def make_engine(url: str = SQLALCHEMY_DATABASE_URL, env=None):
+    """A sync engine for ``url``, configured from the environment."""
+    engine = create_engine(url, **engine_options(url, env))
+    if engine.dialect.name == "sqlite":
+        install_pragmas(engine, sqlite_pragmas(env))
+    return engine
+
+
+def make_async_engine(url: str = SQLALCHEMY_DATABASE_URL, env=None):
+    """An async engine for the same database as ``url``, configured like make_engine()."""
+    engine = create_async_engine(async_url(url), **engine_options(url, env))
+    if engine.dialect.name == "sqlite":
+        install_pragmas(engine.sync_engine, sqlite_pragmas(env))
+    return engine
+
+
+engine = make_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Not expiring on commit: attribute access after commit would otherwise need
+# an implicit (and in async code, impossible) lazy load.
+AsyncSessionLocal = async_sessionmaker(autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
 
+_async_engine = None
+
+
+def async_url(url) -> str:
+    """The URL of the same database with the backend's async driver."""
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()]).render_as_string(hide_password=False)
+
+
+def get_async_engine():
+    """The async engine, created on first use so the driver is only imported when needed."""
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = make_async_engine()
+    return _async_engine
+
+
+def same_database(bind, other) -> bool:
+    """Whether two engines reach the same data, e.g. ``engine`` and the async engine's sync facade.
+
+    In-memory SQLite databases are private to their engine, so only identical
+    engines match there.
+    """
+    if bind is other:
+        return True
+    if bind is None or other is None:
+        return False
+    url, other_url = make_url(bind.url), make_url(other.url)
+    if _is_memory(url):
+        return False
+    return (url.get_backend_name(), url.host, url.port, url.database) == \
+        (other_url.get_backend_name(), other_url.host, other_url.port, other_url.database)
+
 
 def get_db():
     """Dependency for providing a database session to routes."""
@@ -19,3 +163,9 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    """Dependency for providing an async database session to routes."""
+    async with AsyncSessionLocal(bind=get_async_engine()) as db:
+        yield db
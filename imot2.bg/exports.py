@@ -0,0 +1,149 @@
+"""Streaming NDJSON/CSV listing export for partner portals.
+
+Listings are read through a server-side cursor (``yield_per``) in their own
+session and written out one line at a time, so an export holds one batch of rows
+in memory regardless of catalogue size. A full export contains every listed
+property; an incremental export ("changed since") contains every listing changed
+after a watermark, including ones that were since sold or deactivated, so that
+partners can withdraw them. Deleted listings appear in it too, as records with
+``deleted`` set and only the id and deletion time, taken from the tombstones that
+delete_property leaves behind.
+
+``updated_at`` and ``deleted_at`` are set when a change is flushed, before it is
+committed, so a change can carry a time before the end of an export that could
+not see it yet. The watermark handed out for the next export therefore lags the
+end of the export by WATERMARK_LAG: consecutive incremental exports overlap by
+that much, and partners drop the records they already have by (id, updated_at).
+"""
+import csv
+import heapq
+import io
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, Optional
+from sqlalchemy.orm import Session, selectinload
+import models
+
+CSV = "csv"
+NDJSON = "ndjson"
+FORMATS = (CSV, NDJSON)
+MEDIA_TYPES = {CSV: "text/csv; charset=utf-8", NDJSON: "application/x-ndjson"}
+EXPORT_BATCH_SIZE = 500
+
+FIELDS = (
+    "id", "title", "description", "price", "property_type", "location", "city", "neighborhood",
+    "latitude", "longitude", "status", "is_active", "owner_id", "updated_at", "images", "deleted",
+)
+# Separates image URLs in the single CSV "images" column.
+CSV_IMAGE_SEPARATOR = "|"
+# Upper bound on the time from flushing a change to committing it (bulk imports commit per batch).
+WATERMARK_LAG = timedelta(minutes=5)
+
+
+def as_utc(moment: datetime) -> datetime:
+    """Naive UTC datetime, the form timestamps are stored in; naive input is taken as UTC."""
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc)
+    return moment.replace(tzinfo=None)
+
+
+def watermark(until: datetime) -> datetime:
+    """``since`` for the export after one that read the changes up to ``until``."""
+    return until - WATERMARK_LAG
+
+
+def record(prop: models.Property) -> dict:
+    """Export fields of one listing."""
+    return {
+        "id": prop.id,
+        "title": prop.title,
+        "description": prop.description,
+        "price": prop.price,
+        "property_type": prop.property_type,
+        "location": prop.location,
+        "city": prop.place.city if prop.place else None,
+        "neighborhood": prop.place.neighborhood if prop.place else None,
+        "latitude": prop.latitude,
+        "longitude": prop.longitude,
+        "status": prop.status,
+        "is_active": prop.is_active,
+        "owner_id": prop.owner_id,
+        "updated_at": prop.updated_at.isoformat() if prop.updated_at else None,
+        "images": [image.url for image in prop.images],
+        "deleted": False,
+    }
+
+
+def tombstone_record(tombstone: models.PropertyTombstone) -> dict:
+    """Export fields of a deleted listing: its id and when it was deleted."""
+    row = dict.fromkeys(FIELDS)
+    row.update(id=tombstone.id, updated_at=tombstone.deleted_at.isoformat(), images=[], deleted=True)
+    return row
+
+
+def listings(db, since: Optional[datetime] = None, until: Optional[datetime] = None,
+             batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[models.Property]:
+    """Streams the listings to export, batch by batch."""
+    # Joined eager loading cannot stream (it de-duplicates rows), so related rows
+    # are fetched per batch with selectinload.
+    query = db.query(models.Property).options(
+        selectinload(models.Property.place), selectinload(models.Property.images)
+    ).join(models.User).filter(models.User.is_verified == True)
+
+    if since is None:
+        query = query.filter(models.LISTED).order_by(models.Property.id)
+    else:
+        query = query.filter(
+            models.Property.updated_at > as_utc(since)
+        ).order_by(models.Property.updated_at, models.Property.id)
+        if until is not None:
+            # Changes made while the export runs are left for the next one.
+            query = query.filter(models.Property.updated_at <= as_utc(until))
+
+    return query.yield_per(batch_size)
+
+
+def tombstones(db, since: datetime, until: Optional[datetime] = None,
+               batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[models.PropertyTombstone]:
+    """Streams the listings deleted after ``since`` (and up to ``until``), oldest first."""
+    query = db.query(models.PropertyTombstone).filter(models.PropertyTombstone.deleted_at > as_utc(since))
+    if until is not None:
+        query = query.filter(models.PropertyTombstone.deleted_at <= as_utc(until))
+    return query.order_by(models.PropertyTombstone.deleted_at, models.PropertyTombstone.id).yield_per(batch_size)
+
+
+def records(db, since: Optional[datetime] = None, until: Optional[datetime] = None,
+            batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[dict]:
+    """Export records; an incremental export interleaves changes and deletions in time order."""
+    if since is None:
+        return (record(prop) for prop in listings(db, batch_size=batch_size))
+    changed = ((prop.updated_at, record(prop)) for prop in listings(db, since, until, batch_size))
+    deleted = ((tomb.deleted_at, tombstone_record(tomb)) for tomb in tombstones(db, since, until, batch_size))
+    return (row for _, row in heapq.merge(changed, deleted, key=lambda change: change[0]))
+
+
+def ndjson_lines(records: Iterator[dict]) -> Iterator[str]:
+    for row in records:
+        yield json.dumps(row, ensure_ascii=False) + "\n"
+
+
+def csv_lines(records: Iterator[dict]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=FIELDS)
+    writer.writeheader()
+    for row in records:
+        writer.writerow({**row, "images": CSV_IMAGE_SEPARATOR.join(row["images"])})
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def stream_export(bind, file_format: str, since: Optional[datetime] = None,
+                  until: Optional[datetime] = None, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[str]:
+    """Export lines in the given format, read in a session that lives as long as the stream."""
+    with Session(bind=bind) as db:
+        rows = records(db, since, until, batch_size)
+        lines = csv_lines(rows) if file_format == CSV else ndjson_lines(rows)
+        yield from lines
@@ -0,0 +1,63 @@
+"""Facet counts (per property type, city and price bucket) for a listing search.
+
+All three facets come from a single grouped query over the filtered listings: rows
+are grouped by (type, city, price bucket) in the database and folded into the
+individual facets in Python, instead of running one full scan per facet.
+"""
+from collections import Counter
+from sqlalchemy import case, func
+import models
+import search
+
+# Upper bounds of the price buckets; the last bucket is open-ended.
+PRICE_BUCKET_EDGES = (1000, 50000, 100000, 200000, 500000)
+
+
+def _price_bucket():
+    """SQL expression numbering the price bucket of each listing (0 .. len(edges))."""
+    return case(
+        *[(models.Property.price < edge, index) for index, edge in enumerate(PRICE_BUCKET_EDGES)],
+        else_=len(PRICE_BUCKET_EDGES)
+    )
+
+
+def _bucket_bounds(index: int):
+    lower = PRICE_BUCKET_EDGES[index - 1] if index > 0 else 0
+    upper = PRICE_BUCKET_EDGES[index] if index < len(PRICE_BUCKET_EDGES) else None
+    return lower, upper
+
+
+def facet_counts(db, **filters) -> dict:
+    """Counts the listings matching ``filters`` (see search.filter_properties) per facet value."""
+    key = ("facets", search.cache_key(filters, None, 0, None))
+    cached = search.result_cache.get(key)
+    if cached is not None:
+        return cached
+
+    generation = search.result_cache.generation
+    query, _ = search.filter_properties(db, **filters)
+    bucket = _price_bucket().label("bucket")
+    rows = query.outerjoin(
+        models.Location, models.Location.id == models.Property.location_id
+    ).with_entities(
+        models.Property.property_type, models.Location.city, bucket, func.count()
+    ).group_by(models.Property.property_type, models.Location.city, bucket).all()
+
+    types, cities, prices = Counter(), Counter(), Counter()
+    for property_type, city, bucket_index, count in rows:
+        types[property_type] += count
+        if city:
+            cities[city] += count
+        prices[bucket_index] += count
+
+    result = {
+        "total": sum(types.values()),
+        "property_type": [{"value": value, "count": count} for value, count in types.most_common()],
+        "city": [{"value": value, "count": count} for value, count in cities.most_common()],
+        "price": [
+            {"min": _bucket_bounds(index)[0], "max": _bucket_bounds(index)[1], "count": prices[index]}
+            for index in range(len(PRICE_BUCKET_EDGES) + 1)
+        ],
+    }
+    search.result_cache.set(key, result, generation)
+    return result
@@ -0,0 +1,149 @@
+"""Password hashing on a dedicated, bounded executor.
+
+bcrypt is deliberately slow. Run in FastAPI's shared threadpool, a burst of
+logins occupies every worker thread and starves all other endpoints, so hashes
+run on their own pool of HASH_WORKERS threads instead (bcrypt releases the GIL,
+so the threads hash in parallel on all cores). At most MAX_PENDING hashes may be
+queued or running; further requests fail fast with HashingBusy, and a hash that
+waited longer than QUEUE_TIMEOUT_SECONDS is dropped, as its client has likely
+given up. Queue times and hashing times are kept in ``metrics``.
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+from passlib.context import CryptContext
+
+# Raising the cost re-hashes each password at its next successful login.
+BCRYPT_ROUNDS = 12
+HASH_WORKERS = max(2, os.cpu_count() or 1)
+MAX_PENDING = HASH_WORKERS * 8
+QUEUE_TIMEOUT_SECONDS = 5.0
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+
+class HashingBusy(Exception):
+    """Too many hashes are queued; the request should be retried later."""
+
+
+class HashingMetrics:
+    """Thread-safe counters for sizing the hashing pool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.pending = 0
+            self.completed = 0
+            self.rejected = 0
+            self.timed_out = 0
+            self.queue_seconds_total = 0.0
+            self.queue_seconds_max = 0.0
+            self.hash_seconds_total = 0.0
+
+    def admit(self) -> bool:
+        with self._lock:
+            if self.pending >= MAX_PENDING:
+                self.rejected += 1
+                return False
+            self.pending += 1
+            return True
+
+    def started(self, queue_seconds: float):
+        with self._lock:
+            self.queue_seconds_total += queue_seconds
+            self.queue_seconds_max = max(self.queue_seconds_max, queue_seconds)
+
+    def finished(self, hash_seconds: Optional[float]):
+        with self._lock:
+            self.pending -= 1
+            if hash_seconds is None:
+                self.timed_out += 1
+            else:
+                self.completed += 1
+                self.hash_seconds_total += hash_seconds
+
+    def stats(self) -> dict:
+        with self._lock:
+            started = self.completed + self.timed_out
+            return {
+                "workers": HASH_WORKERS,
+                "pending": self.pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "avg_queue_ms": round(1000 * self.queue_seconds_total / started, 1) if started else 0.0,
+                "max_queue_ms": round(1000 * self.queue_seconds_max, 1),
+                "avg_hash_ms": round(1000 * self.hash_seconds_total / self.completed, 1) if self.completed else 0.0,
+            }
+
+
+metrics = HashingMetrics()
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="hashing")
+        return _executor
+
+
+def _timed(submitted: float, func, *args):
+    queued = time.monotonic() - submitted
+    metrics.started(queued)
+    if queued > QUEUE_TIMEOUT_SECONDS:
+        metrics.finished(None)
+        raise HashingBusy()
+    try:
+        started = time.monotonic()
+        result = func(*args)
+    except BaseException:
+        metrics.finished(time.monotonic() - started)
+        raise
+    metrics.finished(time.monotonic() - started)
+    return result
+
+
+async def _run(func, *args):
+    if not metrics.admit():
+        raise HashingBusy()
+    loop = asyncio.get_running_loop()
+    try:
+        future = loop.run_in_executor(get_executor(), _timed, time.monotonic(), func, *args)
+    except BaseException:
+        metrics.finished(None)
+        raise
+    return await future
+
+
+def _verify_and_update(secret: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    if not pwd_context.verify(secret, hashed):
+        return False, None
+    try:
+        outdated = pwd_context.needs_update(hashed)
+    except ValueError:
+        # Not a hash this context knows; nothing to upgrade it to safely.
+        outdated = False
+    return True, pwd_context.hash(secret) if outdated else None
+
+
+async def hash_password(secret: str) -> str:
+    """Hashes a new password; raises HashingBusy when the pool is saturated."""
+    return await _run(pwd_context.hash, secret)
+
+
+async def verify_and_update(secret: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    """Checks a password; also returns a new hash if the stored one uses outdated parameters.
+
+    Raises HashingBusy when the pool is saturated.
+    """
+    return await _run(_verify_and_update, secret, hashed)
@@ -0,0 +1,123 @@
+"""Resized and WebP derivatives of uploaded listing photos.
+
+After an upload is saved, its derivatives are generated in a process pool, so
+Pillow's CPU-bound decoding and resizing neither blocks the event loop nor holds
+the GIL of the web worker. Each size is written as WebP and as JPEG next to the
+original and recorded on ``PropertyImage.variants``; cards and galleries then ask
+for the size they display instead of the multi-megabyte original.
+"""
+import asyncio
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+from sqlalchemy.orm import Session
+import models
+import summary
+
+logger = logging.getLogger(__name__)
+
+# Variant name -> longest edge in pixels. Images are never upscaled.
+SIZES = {"thumb": 320, "card": 640, "large": 1600}
+FORMATS = {"webp": ("WEBP", {"quality": 80, "method": 4}), "jpeg": ("JPEG", {"quality": 82, "optimize": True})}
+MAX_WORKERS = max(1, min(4, (os.cpu_count() or 2) // 2))
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=MAX_WORKERS)
+    return _pool
+
+
+def variant_path(path: str, name: str, file_format: str) -> str:
+    """Path of a derivative: the original's name with ``.<name>.<ext>`` appended to the stem."""
+    stem, _ = os.path.splitext(path)
+    return f"{stem}.{name}.{'jpg' if file_format == 'jpeg' else file_format}"
+
+
+def generate_variants(path: str) -> dict:
+    """Writes every derivative of the image at ``path``; runs inside a pool worker.
+
+    Returns {variant: {"width", "height", "webp", "jpeg"}} with file paths.
+    """
+    from PIL import Image, ImageOps
+
+    variants = {}
+    with Image.open(path) as original:
+        original.seek(0)
+        image = ImageOps.exif_transpose(original)
+        image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+        for name, edge in SIZES.items():
+            resized = image.copy()
+            resized.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+            variant = {"width": resized.width, "height": resized.height}
+            for file_format, (pil_format, options) in FORMATS.items():
+                target = variant_path(path, name, file_format)
+                frame = resized.convert("RGB") if pil_format == "JPEG" else resized
+                frame.save(target, pil_format, **options)
+                variant[file_format] = target
+            variants[name] = variant
+    return variants
+
+
+def _as_urls(variants: dict) -> dict:
+    return {
+        name: {key: f"/{value}" if key in FORMATS else value for key, value in variant.items()}
+        for name, variant in variants.items()
+    }
+
+
+def record_variants(bind, image_id: int, variants: dict):
+    """Stores generated derivatives on the image and, for cover images, on the listing summaries.
+
+    Images sharing the same stored file (see storage.py) get the derivatives too.
+    """
+    with Session(bind=bind) as db:
+        image = db.get(models.PropertyImage, image_id)
+        if image is None:
+            return
+        same_content = [image]
+        if image.sha256:
+            stored = db.get(models.StoredFile, image.sha256)
+            if stored is not None:
+                stored.variants = variants
+            same_content = db.query(models.PropertyImage).filter(
+                models.PropertyImage.sha256 == image.sha256
+            ).all()
+        for each in same_content:
+            if each.id == image.id or not each.variants:
+                each.variants = variants
+                summary.image_variants_ready(db, each)
+        db.commit()
+
+
+async def process_image(bind, image_id: int, path: str):
+    """Background task run after an upload: generates and records the image's derivatives."""
+    loop = asyncio.get_running_loop()
+    try:
+        variants = await loop.run_in_executor(get_pool(), generate_variants, path)
+    except Exception:
+        logger.warning("Could not generate derivatives for %s", path, exc_info=True)
+        return
+    await loop.run_in_executor(None, record_variants, bind, image_id, _as_urls(variants))
+
+
+def derivative_paths(path: str) -> list:
+    """Paths of every derivative of the file at ``path`` (whether generated yet or not)."""
+    return [variant_path(path, name, file_format) for name in SIZES for file_format in FORMATS]
+
+
+def stored_files(image: models.PropertyImage) -> list:
+    """Paths of the original file of an image and of all its derivatives."""
+    path = image.url.lstrip("/")
+    return [path] + derivative_paths(path)
+
+
+def image_url(url: Optional[str], variants: Optional[dict] = None, size: str = "card",
+              file_format: str = "jpeg") -> Optional[str]:
+    """URL of the best stored rendition of an image: the requested variant, else the original."""
+    chosen = ((variants or {}).get(size) or {}).get(file_format) or url
+    return "/" + chosen.lstrip("/") if chosen else None
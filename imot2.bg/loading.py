@@ -0,0 +1,24 @@
+"""Eager-loading strategies for property queries.
+
+Each endpoint picks the strategy that matches what it serializes or renders, so a
+page of results is loaded with a fixed number of SQL statements instead of one
+lazy load per row. The per-listing summary (ratings, counts, cover image) is a
+single row, so it is joined into the main query.
+"""
+from sqlalchemy.orm import joinedload, selectinload
+import models
+
+
+def api_listing():
+    """PropertyResponse lists: every image, fetched for the whole page in one IN query."""
+    return [joinedload(models.Property.summary), selectinload(models.Property.images)]
+
+
+def search_cards():
+    """Search result cards: the cover image and rating from the listing summary."""
+    return [joinedload(models.Property.summary)]
+
+
+def property_detail():
+    """A single listing with its full gallery."""
+    return [joinedload(models.Property.summary), selectinload(models.Property.images)]
@@ -0,0 +1,183 @@
+"""Normalized city/neighborhood dictionary with transliterated, typo-tolerant matching.
+
+Every name is stored under a key: lower-cased and transliterated to Latin with the
+official Bulgarian system, so "София", "Sofia" and "SOFIA" share one key. A filter
+value is resolved against the dictionary (exact key, then key prefix, then trigram
+similarity) and listings are filtered by ``location_id`` with an indexed lookup
+instead of a substring scan over the free-text location.
+"""
+import re
+import unicodedata
+from typing import List, Optional, Tuple
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+import models
+
+CITY = "city"
+NEIGHBORHOOD = "neighborhood"
+
+# Minimum trigram similarity (shared / union) for a typo-tolerant match.
+SIMILARITY_THRESHOLD = 0.4
+BACKFILL_BATCH_SIZE = 500
+
+_TRANSLITERATION = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ж": "zh", "з": "z",
+    "и": "i", "й": "y", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p",
+    "р": "r", "с": "s", "т": "t", "у": "u", "ф": "f", "х": "h", "ц": "ts", "ч": "ch",
+    "ш": "sh", "щ": "sht", "ъ": "a", "ь": "y", "ю": "yu", "я": "ya", "ѝ": "i",
+}
+# Prefixes such as "гр." (city) or "ж.к." (housing estate) that are not part of the name.
+_NAME_PREFIXES = {"gr", "grad", "kv", "kvartal", "zhk"}
+_WORD_RE = re.compile(r"[a-z0-9]+")
+# "ж.к." / "ж. к." is spelled with dots; fold it into one word before splitting.
+_ZHK_RE = re.compile(r"\bzh\.\s*k\.")
+
+
+def transliterate(value: str) -> str:
+    """Lower-cases and transliterates Bulgarian Cyrillic to Latin; "ия" at a word end becomes "ia"."""
+    value = re.sub(r"ия\b", "ia", value.lower())
+    latin = "".join(_TRANSLITERATION.get(char, char) for char in value)
+    decomposed = unicodedata.normalize("NFKD", latin)
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def normalize(value: Optional[str]) -> str:
+    """Dictionary key of a city or neighborhood name."""
+    words = _WORD_RE.findall(_ZHK_RE.sub("zhk ", transliterate(value or "")))
+    while len(words) > 1 and words[0] in _NAME_PREFIXES:
+        words = words[1:]
+    return " ".join(words)
+
+
+def trigrams(key: str) -> set:
+    """Word trigrams of a key, padded like PostgreSQL's pg_trgm."""
+    grams = set()
+    for word in key.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def parse_location(value: Optional[str]) -> Tuple[str, Optional[str]]:
+    """Splits a free-text location such as "София, Лозенец" into (city, neighborhood)."""
+    city, _, neighborhood = (value or "").partition(",")
+    return city.strip(), (neighborhood.strip() or None)
+
+
+def _key_column(kind: str):
+    return models.Location.city_key if kind == CITY else models.Location.neighborhood_key
+
+
+def match_keys(db, kind: str, value: Optional[str]) -> List[str]:
+    """Resolves a city or neighborhood filter value to dictionary keys.
+
+    Tries an exact key, then keys starting with the value, then the most similar
+    keys by trigram similarity. Every step is an index lookup.
+    """
+    key = normalize(value)
+    if not key:
+        return []
+    column = _key_column(kind)
+
+    if db.query(models.Location.id).filter(column == key).first():
+        return [key]
+
+    prefixed = db.query(column).filter(column >= key, column < key + "\uffff").distinct().all()
+    if prefixed:
+        return [row[0] for row in prefixed]
+
+    wanted = trigrams(key)
+    shared = db.query(models.LocationTrigram.name_key, func.count()).filter(
+        models.LocationTrigram.kind == kind,
+        models.LocationTrigram.trigram.in_(wanted)
+    ).group_by(models.LocationTrigram.name_key).all()
+
+    scored = []
+    for name_key, count in shared:
+        similarity = count / (len(wanted) + len(trigrams(name_key)) - count)
+        if similarity >= SIMILARITY_THRESHOLD:
+            scored.append((similarity, name_key))
+    if not scored:
+        return []
+    best = max(score for score, _ in scored)
+    return [name_key for score, name_key in scored if score == best]
+
+
+def apply_location_filter(query, db, city: Optional[str] = None, neighborhood: Optional[str] = None):
+    """Restricts a Property query to listings in the matching cities/neighborhoods."""
+    if not normalize(city) and not normalize(neighborhood):
+        return query
+
+    conditions = []
+    if normalize(city):
+        conditions.append(models.Location.city_key.in_(match_keys(db, CITY, city)))
+    if normalize(neighborhood):
+        conditions.append(models.Location.neighborhood_key.in_(match_keys(db, NEIGHBORHOOD, neighborhood)))
+
+    matching = select(models.Location.id).where(*conditions)
+    return query.filter(models.Property.location_id.in_(matching))
+
+
+def _index_name(db, kind: str, key: str):
+    """Adds the trigrams of a new name to the trigram index."""
+    exists = db.query(models.LocationTrigram.name_key).filter(
+        models.LocationTrigram.kind == kind, models.LocationTrigram.name_key == key
+    ).first()
+    if not exists:
+        db.add_all([models.LocationTrigram(kind=kind, trigram=gram, name_key=key) for gram in trigrams(key)])
+
+
+def get_or_create(db, city: str, neighborhood: Optional[str] = None) -> Optional[models.Location]:
+    """Returns the dictionary entry for a city/neighborhood, creating it if needed.
+
+    The entry is flushed but not committed, so it joins the caller's transaction.
+    """
+    city_key, neighborhood_key = normalize(city), normalize(neighborhood)
+    if not city_key:
+        return None
+
+    criteria = (models.Location.city_key == city_key, models.Location.neighborhood_key == neighborhood_key)
+    location = db.query(models.Location).filter(*criteria).first()
+    if location:
+        return location
+
+    try:
+        with db.begin_nested():
+            location = models.Location(
+                city=city.strip(),
+                neighborhood=neighborhood.strip() if neighborhood_key else None,
+                city_key=city_key,
+                neighborhood_key=neighborhood_key
+            )
+            db.add(location)
+            _index_name(db, CITY, city_key)
+            if neighborhood_key:
+                _index_name(db, NEIGHBORHOOD, neighborhood_key)
+            db.flush()
+    except IntegrityError:
+        # Created concurrently by another request.
+        location = db.query(models.Location).filter(*criteria).first()
+    return location
+
+
+def resolve(db, location_text: Optional[str]) -> Optional[models.Location]:
+    """Dictionary entry for a free-text location such as "София, Лозенец"."""
+    return get_or_create(db, *parse_location(location_text))
+
+
+def backfill(db, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """Links listings without a location_id to dictionary entries; returns how many were linked."""
+    linked, last_id = 0, 0
+    while True:
+        batch = db.query(models.Property).filter(
+            models.Property.location_id.is_(None), models.Property.id > last_id
+        ).order_by(models.Property.id).limit(batch_size).all()
+        if not batch:
+            return linked
+        for prop in batch:
+            location = resolve(db, prop.location)
+            if location:
+                prop.location_id = location.id
+                linked += 1
+        last_id = batch[-1].id
+        db.commit()
@@ -1,19 +1,41 @@
 """Main application entry point and route definitions for Imot2.bg."""
+from contextlib import asynccontextmanager
 from typing import Optional
 from fastapi import FastAPI, Depends, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
+import images
+import loading
+import migrations
 import models
+import pagination
+import search
+import sessions
+import static_files
+import uploads
 from database import engine, get_db
 from routers import auth, properties, bookings, reviews, messages, admin
 from routers.auth import get_current_user
-models.Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="Imot2.bg API")
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Refuses to start on an unmigrated database; `python manage.py migrate` applies migrations."""
+    migrations.check(engine)
+    yield
+
+
+app = FastAPI(title="Imot2.bg API", lifespan=lifespan)
+app.add_middleware(uploads.UploadSizeLimit)
+
+# Uploads are immutable and cached for a year; mounted first so /static does not shadow it.
+app.mount(
+    "/static/uploads", static_files.UploadedFiles(directory=uploads.UPLOAD_DIR, check_dir=False), name="uploads"
+)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
+templates.env.globals["image_url"] = images.image_url
 
 app.include_router(auth.router)
 app.include_router(properties.router)
@@ -25,11 +47,7 @@ app.include_router(admin.router)
 @app.get("/")
 def home(request: Request, db: Session = Depends(get_db)):
     """Home page with a personalized greeting for logged-in users."""
-    username = request.cookies.get("username")
-    current_user = None
-
-    if username:
-        current_user = db.query(models.User).filter(models.User.username == username).first()
+    current_user = sessions.authenticate(request, db)
 
     return templates.TemplateResponse(request, "index.html", {"user": current_user})
 
@@ -45,7 +63,7 @@ def get_register_page(request: Request):
     return templates.TemplateResponse(request, "register.html")
 
 @app.get("/add-property")
-def get_add_property_page(request: Request, current_user: models.User = Depends(get_current_user)):
+def get_add_property_page(request: Request, current_user: sessions.SessionUser = Depends(get_current_user)):
     """Displays the property creation form. Restricted to logged-in users."""
     return templates.TemplateResponse("create_property.html", {"request": request, "user": current_user})
 
@@ -53,7 +71,7 @@ def get_add_property_page(request: Request, current_user: models.User = Depends(
 def manage_properties_page(
     request: Request,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: sessions.SessionUser = Depends(get_current_user)
 ):
     """Dashboard for agents to manage their own property listings."""
     my_properties = db.query(models.Property).filter(
@@ -70,25 +88,23 @@ def search_properties_page(
         request: Request,
         p_type: Optional[str] = None,
         city: Optional[str] = None,
+        neighborhood: Optional[str] = None,
         max_price: Optional[float] = None,
+        sort: Optional[str] = None,
+        cursor: Optional[str] = None,
         db: Session = Depends(get_db)
 ):
     """Search page with dynamic filtering of properties."""
-    query = db.query(models.Property).join(models.User).filter(models.User.is_verified)
-
-    if p_type:
-        query = query.filter(models.Property.property_type == str(p_type))
-    if city:
-        query = query.filter(models.Property.location.ilike(f"%{city}%"))
-    if max_price:
-        query = query.filter(models.Property.price <= max_price)
-
-    properties_list = query.all()
+    properties_list, next_cursor = search.search_page(
+        db, sort=sort, limit=pagination.DEFAULT_PAGE_SIZE, cursor=cursor,
+        options=loading.search_cards(), prop_type=p_type, city=city,
+        neighborhood=neighborhood, max_price=max_price
+    )
 
-    username = request.cookies.get("username")
-    current_user = db.query(models.User).filter(models.User.username == username).first() if username else None
+    current_user = sessions.authenticate(request, db)
 
     return templates.TemplateResponse(request, "search_properties.html", {
         "properties": properties_list,
+        "next_cursor": next_cursor,
         "user": current_user
     })
@@ -0,0 +1,95 @@
+"""Command-line maintenance tasks for Imot2.bg.
+
+Usage: python manage.py <command>
+"""
+import argparse
+from database import engine, SessionLocal
+import locations
+import migrations
+import storage
+import summary
+
+
+def cmd_migrate(args):
+    """Applies pending schema migrations."""
+    if args.status:
+        version = migrations.current_version(engine)
+        print(f"Schema version {version} of {migrations.HEAD}.")
+        for migration in migrations.pending(engine):
+            print(f"Pending: {migration.version} {migration.name}")
+        if version < migrations.HEAD:
+            raise SystemExit(1)
+        return
+    for migration in migrations.migrate(engine):
+        print(f"Applied {migration.version} {migration.name}")
+    print(f"Schema is at version {migrations.HEAD}.")
+
+
+def cmd_backfill_locations(args):
+    """Links listings without a location_id to the location dictionary."""
+    with SessionLocal() as db:
+        linked = locations.backfill(db, batch_size=args.batch_size)
+    print(f"Linked {linked} listings.")
+
+
+def cmd_rebuild_summaries(args):
+    """Recomputes every listing summary from reviews, bookings and images."""
+    with SessionLocal() as db:
+        rebuilt = summary.rebuild(db, batch_size=args.batch_size)
+    print(f"Rebuilt {rebuilt} listing summaries.")
+
+
+def cmd_check_summaries(args):
+    """Reports listings whose summary is out of step with the source tables."""
+    with SessionLocal() as db:
+        mismatched = summary.check(db, batch_size=args.batch_size)
+    if mismatched:
+        print(f"{len(mismatched)} summaries out of date: {', '.join(map(str, mismatched))}")
+        raise SystemExit(1)
+    print("All listing summaries are consistent.")
+
+
+def cmd_gc_uploads(args):
+    """Removes uploaded files that no listing refers to."""
+    with SessionLocal() as db:
+        report = storage.collect_garbage(
+            db, batch_size=args.batch_size, min_age=args.min_age, dry_run=args.dry_run
+        )
+    for path in report["orphans"]:
+        print(path)
+    action = "Found" if args.dry_run else f"Removed {report['removed']} of"
+    print(f"Scanned {report['scanned']} files. {action} {report['orphaned']} orphans "
+          f"({report['freed_bytes']} bytes freed).")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Imot2.bg maintenance tasks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate = commands.add_parser("migrate", help=cmd_migrate.__doc__)
+    migrate.add_argument("--status", action="store_true",
+                         help="Only report pending migrations; exit status 1 if there are any")
+    migrate.set_defaults(func=cmd_migrate)
+
+    backfill = commands.add_parser("backfill-locations", help=cmd_backfill_locations.__doc__)
+    backfill.add_argument("--batch-size", type=int, default=locations.BACKFILL_BATCH_SIZE)
+    backfill.set_defaults(func=cmd_backfill_locations)
+
+    for name, func in (("rebuild-summaries", cmd_rebuild_summaries), ("check-summaries", cmd_check_summaries)):
+        command = commands.add_parser(name, help=func.__doc__)
+        command.add_argument("--batch-size", type=int, default=summary.REBUILD_BATCH_SIZE)
+        command.set_defaults(func=func)
+
+    gc_uploads = commands.add_parser("gc-uploads", help=cmd_gc_uploads.__doc__)
+    gc_uploads.add_argument("--batch-size", type=int, default=storage.GC_BATCH_SIZE)
+    gc_uploads.add_argument("--min-age", type=float, default=storage.GC_MIN_AGE_SECONDS,
+                            help="Skip files modified in the last N seconds")
+    gc_uploads.add_argument("--dry-run", action="store_true", help="Only report orphans")
+    gc_uploads.set_defaults(func=cmd_gc_uploads)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Versioned schema migrations.
+
+Each migration is a numbered step, recorded in ``schema_migrations`` once it has
+been applied. ``python manage.py migrate`` applies the pending ones in order; the
+app itself only checks the recorded version at startup (check()), so workers no
+longer run DDL while they boot.
+
+Each migration spells out its own DDL rather than following the models, so that
+what it does never changes once it has shipped; a change to the models needs a
+new migration. Migrations must be idempotent: create tables with checkfirst, add
+columns only if they are missing and create indexes with
+schema.create_index_online(), so that one interrupted half-way can simply be run
+again. Migration 1 is the baseline (see baseline.py): it brings an empty
+database, or one created before migrations existed, up to the schema of that time.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from typing import Callable, List, NamedTuple
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, Table, func, inspect, insert, select, text
+import baseline
+import models
+import schema
+
+logger = logging.getLogger(__name__)
+
+# PostgreSQL advisory lock held while migrating, so that two deploys cannot migrate at once.
+ADVISORY_LOCK_KEY = 7_260_153
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    apply: Callable  # apply(engine)
+
+
+class SchemaOutOfDate(RuntimeError):
+    """The database is behind the schema version this code needs."""
+
+
+def _add_property_tombstones(engine):
+    """Deleted listings, for incremental exports."""
+    tables = MetaData()
+    tombstones = Table(
+        "property_tombstones", tables,
+        Column("id", Integer, primary_key=True, autoincrement=False),
+        Column("deleted_at", DateTime, nullable=False),
+    )
+    tombstones.create(bind=engine, checkfirst=True)
+    schema.create_index_online(engine, Index("ix_property_tombstones_deleted_at", tombstones.c.deleted_at))
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "baseline", baseline.apply),
+    Migration(2, "property_tombstones", _add_property_tombstones),
+]
+HEAD = MIGRATIONS[-1].version
+
+
+def current_version(engine) -> int:
+    """The last applied migration; 0 for an empty or unversioned database."""
+    if not inspect(engine).has_table(models.SchemaMigration.__tablename__):
+        return 0
+    with engine.connect() as conn:
+        return conn.execute(select(func.max(models.SchemaMigration.version))).scalar() or 0
+
+
+def pending(engine) -> List[Migration]:
+    version = current_version(engine)
+    return [migration for migration in MIGRATIONS if migration.version > version]
+
+
+@contextmanager
+def _migration_lock(engine):
+    if engine.dialect.name != "postgresql":
+        yield
+        return
+    with engine.connect() as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY})
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": ADVISORY_LOCK_KEY})
+
+
+def migrate(engine) -> List[Migration]:
+    """Applies the pending migrations in order, recording each one; returns those applied."""
+    applied = []
+    with _migration_lock(engine):
+        models.SchemaMigration.__table__.create(bind=engine, checkfirst=True)
+        for migration in pending(engine):
+            started = time.monotonic()
+            migration.apply(engine)
+            with engine.begin() as conn:
+                conn.execute(insert(models.SchemaMigration).values(
+                    version=migration.version, name=migration.name, applied_at=models.utcnow()
+                ))
+            logger.info("Applied migration %d (%s) in %.1f s", migration.version, migration.name,
+                        time.monotonic() - started)
+            applied.append(migration)
+    if applied and engine.dialect.name == "sqlite":
+        with engine.begin() as conn:
+            conn.exec_driver_sql("PRAGMA optimize")
+    return applied
+
+
+def check(engine):
+    """Raises SchemaOutOfDate if the database is behind HEAD.
+
+    A database ahead of HEAD is accepted: migrations only add tables, columns and
+    indexes, so the previous release keeps working during a rolling deploy.
+    """
+    version = current_version(engine)
+    if version < HEAD:
+        raise SchemaOutOfDate(
+            f"Database schema is at version {version}, this code needs {HEAD}; run `python manage.py migrate`"
+        )
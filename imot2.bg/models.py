@@ -2,13 +2,19 @@
 from datetime import datetime, timezone
 from sqlalchemy import (
     Column, Integer, String, Float, Text,
-    Boolean, ForeignKey, DateTime, UniqueConstraint
+    Boolean, ForeignKey, DateTime, UniqueConstraint, Index, JSON,
+    and_, func, literal_column
 )
 from sqlalchemy.orm import relationship
 
 from database import Base
 
 
+def utcnow() -> datetime:
+    """The current UTC time without a zone, as DateTime columns store it (asyncpg rejects aware values)."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -38,12 +44,94 @@ class Property(Base):
     location = Column(String)
     status = Column(String, default="available")  # "available", "sold", "rented"
     is_active = Column(Boolean, default=True)
-    owner_id = Column(Integer, ForeignKey("users.id"))
+    owner_id = Column(Integer, ForeignKey("users.id"), index=True)
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+    location_id = Column(Integer, ForeignKey("locations.id"), nullable=True, index=True)
+    updated_at = Column(
+        DateTime, nullable=True,
+        default=utcnow, onupdate=utcnow
+    )
 
     owner = relationship("User", back_populates="properties")
-    images = relationship("PropertyImage", back_populates="property", cascade="all, delete-orphan")
+    place = relationship("Location", back_populates="properties")
+    images = relationship(
+        "PropertyImage", back_populates="property", cascade="all, delete-orphan",
+        order_by=lambda: COVER_ORDER
+    )
     reviews = relationship("Review", back_populates="property", cascade="all, delete-orphan")
     bookings = relationship("Booking", back_populates="property", cascade="all, delete-orphan")
+    summary = relationship(
+        "PropertySummary", back_populates="property", uselist=False, cascade="all, delete-orphan"
+    )
+
+    @property
+    def average_rating(self):
+        return self.summary.average_rating if self.summary else None
+
+    @property
+    def review_count(self):
+        return self.summary.review_count if self.summary else 0
+
+    @property
+    def booking_count(self):
+        return self.summary.booking_count if self.summary else 0
+
+    @property
+    def cover_image_url(self):
+        return self.summary.cover_image_url if self.summary else None
+
+    __table_args__ = (
+        # Map viewport queries on backends without the R*Tree index (see geo.py).
+        Index("ix_properties_lat_lng", "latitude", "longitude"),
+        # Incremental export walks listings changed since a point in time (see exports.py).
+        Index("ix_properties_updated_at_id", "updated_at", "id"),
+    )
+
+
+class PropertySummary(Base):
+    """Denormalized per-listing counters for cards and detail pages (see summary.py)."""
+    __tablename__ = "property_summary"
+
+    property_id = Column(Integer, ForeignKey("properties.id"), primary_key=True)
+    review_count = Column(Integer, default=0, nullable=False)
+    rating_total = Column(Integer, default=0, nullable=False)
+    booking_count = Column(Integer, default=0, nullable=False)  # без отказаните
+    image_count = Column(Integer, default=0, nullable=False)
+    cover_image_url = Column(String, nullable=True)
+    cover_image_variants = Column(JSON, nullable=True)
+
+    @property
+    def average_rating(self):
+        return round(self.rating_total / self.review_count, 2) if self.review_count else None
+
+    property = relationship("Property", back_populates="summary")
+
+
+class Location(Base):
+    """A city or a neighborhood within a city; keys are lower-cased Latin transliterations."""
+    __tablename__ = "locations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    city = Column(String)
+    neighborhood = Column(String, nullable=True)
+    city_key = Column(String, index=True)
+    neighborhood_key = Column(String, default="", index=True)  # "" for the city itself
+
+    properties = relationship("Property", back_populates="place")
+
+    __table_args__ = (
+        UniqueConstraint("city_key", "neighborhood_key", name="_city_neighborhood_uc"),
+    )
+
+
+class LocationTrigram(Base):
+    """Trigram index over city and neighborhood keys for typo-tolerant matching."""
+    __tablename__ = "location_trigrams"
+
+    kind = Column(String, primary_key=True)  # "city" или "neighborhood"
+    trigram = Column(String, primary_key=True)
+    name_key = Column(String, primary_key=True)
 
 
 class Booking(Base):
@@ -51,20 +139,25 @@ class Booking(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     property_id = Column(Integer, ForeignKey("properties.id"))
-    client_id = Column(Integer, ForeignKey("users.id"))
-    booking_date = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    client_id = Column(Integer, ForeignKey("users.id"), index=True)
+    booking_date = Column(DateTime, default=utcnow)
     status = Column(String, default="pending")
 
     property = relationship("Property", back_populates="bookings")
     client = relationship("User", back_populates="bookings")
 
+    __table_args__ = (
+        # Slot checks and the agent calendar look bookings up by property and date.
+        Index("ix_bookings_property_date", "property_id", "booking_date"),
+    )
+
 
 class Review(Base):
     __tablename__ = "reviews"
 
     id = Column(Integer, primary_key=True, index=True)
-    property_id = Column(Integer, ForeignKey("properties.id"))
-    author_id = Column(Integer, ForeignKey("users.id"))
+    property_id = Column(Integer, ForeignKey("properties.id"), index=True)
+    author_id = Column(Integer, ForeignKey("users.id"), index=True)
     rating = Column(Integer)  # 1 до 5
     comment = Column(Text)
 
@@ -79,20 +172,82 @@ class Message(Base):
     sender_id = Column(Integer, ForeignKey("users.id"))
     receiver_id = Column(Integer, ForeignKey("users.id"))
     content = Column(Text)
-    timestamp = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    timestamp = Column(DateTime, default=utcnow)
 
     sender = relationship("User", foreign_keys=[sender_id])
     receiver = relationship("User", foreign_keys=[receiver_id])
 
+    __table_args__ = (
+        # Inbox and conversation queries filter by participant and order by time.
+        Index("ix_messages_sender_receiver_time", "sender_id", "receiver_id", "timestamp"),
+        Index("ix_messages_receiver_time", "receiver_id", "timestamp"),
+    )
+
 
 class PropertyImage(Base):
     __tablename__ = "property_images"
 
     id = Column(Integer, primary_key=True, index=True)
-    property_id = Column(Integer, ForeignKey("properties.id"))
+    property_id = Column(Integer, ForeignKey("properties.id"), index=True)
     url = Column(String)  # Път: static/uploads/image.jpg
+    content_type = Column(String, nullable=True)
+    size_bytes = Column(Integer, nullable=True)
+    sha256 = Column(String(64), ForeignKey("stored_files.sha256"), nullable=True, index=True)
+    variants = Column(JSON, nullable=True)  # {"thumb"|"card"|"large": {"width", "height", "webp", "jpeg"}}
+    position = Column(Integer, nullable=True)  # ред в галерията, от 0
+    is_cover = Column(Boolean, default=False, nullable=True)
 
     property = relationship("Property", back_populates="images")
+    stored_file = relationship("StoredFile")
+
+
+class StoredFile(Base):
+    """An uploaded file stored once under its SHA-256 and shared by every image with those bytes."""
+    __tablename__ = "stored_files"
+
+    sha256 = Column(String(64), primary_key=True)
+    path = Column(String)  # static/uploads/ab/cd/<sha256>.jpg
+    content_type = Column(String)
+    size_bytes = Column(Integer)
+    ref_count = Column(Integer, default=0, nullable=False)  # брой PropertyImage записи
+    variants = Column(JSON, nullable=True)
+
+
+class RevokedSession(Base):
+    """A revoked session token, or (without session_id) every token of a user issued before revoked_at."""
+    __tablename__ = "revoked_sessions"
+
+    id = Column(Integer, primary_key=True)
+    session_id = Column(String(32), nullable=True, unique=True)  # jti на токена
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
+    revoked_at = Column(Float, nullable=False)  # Unix time
+    expires_at = Column(Float, nullable=False, index=True)  # след това записът не е нужен
+
+
+class RateLimitBucket(Base):
+    """A token bucket of the database rate-limit backend (see ratelimit.py)."""
+    __tablename__ = "rate_limit_buckets"
+
+    key = Column(String, primary_key=True)  # "<limiter>:<ip или потребител>"
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(Float, nullable=False)  # Unix time
+
+
+class PropertyTombstone(Base):
+    """A deleted listing, kept so that incremental exports can withdraw it (see exports.py)."""
+    __tablename__ = "property_tombstones"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)  # id of the deleted property
+    deleted_at = Column(DateTime, nullable=False, default=utcnow, index=True)
+
+
+class SchemaMigration(Base):
+    """An applied schema migration (see migrations.py)."""
+    __tablename__ = "schema_migrations"
+
+    version = Column(Integer, primary_key=True, autoincrement=False)
+    name = Column(String, nullable=False)
+    applied_at = Column(DateTime, default=utcnow)
 
 
 class Favorite(Base):
@@ -100,7 +255,7 @@ class Favorite(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
-    property_id = Column(Integer, ForeignKey("properties.id"))
+    property_id = Column(Integer, ForeignKey("properties.id"), index=True)
 
     user = relationship("User", back_populates="favorites")
     property = relationship("Property")
@@ -108,3 +263,21 @@ class Favorite(Base):
     __table_args__ = (
         UniqueConstraint('user_id', 'property_id', name='_user_property_favorite_uc'),
     )
+
+
+# Gallery order: the image flagged as cover first, then by position.
+COVER_ORDER = (func.coalesce(PropertyImage.is_cover, False).desc(), PropertyImage.position, PropertyImage.id)
+
+# Listings shown in public search. SQLite only uses a partial index when the query
+# repeats its predicate, so the status is a literal rather than a bound parameter.
+LISTED = and_(Property.is_active == True, Property.status == literal_column("'available'"))
+
+# Search filters by type and price and pages through results by (price, id).
+Index(
+    "ix_properties_listed_type_price", Property.property_type, Property.price, Property.id,
+    sqlite_where=LISTED, postgresql_where=LISTED
+)
+Index(
+    "ix_properties_listed_price", Property.price, Property.id,
+    sqlite_where=LISTED, postgresql_where=LISTED
+)
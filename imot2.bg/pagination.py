@@ -0,0 +1,123 @@
+"""Keyset (cursor) pagination for property listings.
+
+Pages are fetched with a "WHERE (sort_key, id) > last_seen" condition instead of
+OFFSET, so the database seeks straight to the next page through the sort index
+and page 100 costs the same as page one.
+"""
+import base64
+import binascii
+import json
+from typing import Optional
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+import models
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# sort name -> (key column, descending). Property ids are assigned in insertion
+# order, so "newest" is the id descending and needs no extra index.
+SORT_KEYS = {
+    "newest": (models.Property.id, True),
+    "id": (models.Property.id, False),
+    "price_asc": (models.Property.price, False),
+    "price_desc": (models.Property.price, True),
+}
+RELEVANCE = "relevance"
+DISTANCE = "distance"
+# Sorts on a value computed by the search itself (bm25 rank, distance from a point),
+# passed to resolve_sort/paginate as {sort name: column}. Smaller values come first.
+COMPUTED_SORTS = (RELEVANCE, DISTANCE)
+SORT_OPTIONS = (*SORT_KEYS, *COMPUTED_SORTS)
+
+
+def encode_cursor(sort: str, values) -> str:
+    """Serializes the sort key of the last row on a page into an opaque cursor."""
+    payload = json.dumps([sort, *values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> list:
+    """Parses a cursor produced by encode_cursor for the same sort order."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if not isinstance(payload, list) or not payload or payload[0] != sort:
+        raise HTTPException(status_code=400, detail="Cursor does not match the requested sort order")
+    return payload[1:]
+
+
+def _check_cursor_values(values: list, columns: list):
+    """Rejects cursor values that cannot be the sort key of a row: wrong arity, non-numbers,
+    or null for a column that cannot be null."""
+    if len(values) != len(columns):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    for value, column in zip(values, columns):
+        if value is None:
+            if not getattr(column, "nullable", False):
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+        elif isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def resolve_sort(sort: Optional[str], computed: Optional[dict] = None) -> str:
+    """Validates the sort option against the computed sorts the search made available.
+
+    Defaults to relevance for ranked searches, distance for radius searches and newest
+    otherwise.
+    """
+    computed = computed or {}
+    if not sort:
+        return next((name for name in COMPUTED_SORTS if name in computed), "newest")
+    if sort not in SORT_OPTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid sort. Use one of: {', '.join(SORT_OPTIONS)}."
+        )
+    if sort == RELEVANCE and RELEVANCE not in computed:
+        return "newest"
+    if sort == DISTANCE and DISTANCE not in computed:
+        raise HTTPException(status_code=400, detail="Sorting by distance requires lat, lng and radius_km")
+    return sort
+
+
+def paginate(query, sort: str, limit: int, cursor: Optional[str] = None, computed: Optional[dict] = None):
+    """Returns one page of a Property query and the cursor of the next page (or None).
+
+    ``computed`` maps the computed sorts (relevance, distance) to their columns and is
+    required for those sorts; ties on every key are broken by the property id.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    if sort in COMPUTED_SORTS:
+        key, descending = computed[sort], False
+        query = query.add_columns(key)
+    else:
+        key, descending = SORT_KEYS[sort]
+
+    columns = [models.Property.id] if key is models.Property.id else [key, models.Property.id]
+
+    if cursor:
+        values = decode_cursor(cursor, sort)
+        _check_cursor_values(values, columns)
+        position = tuple_(*columns)
+        query = query.filter(position < tuple_(*values) if descending else position > tuple_(*values))
+
+    query = query.order_by(*[column.desc() if descending else column.asc() for column in columns])
+    rows = query.limit(limit + 1).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    if sort in COMPUTED_SORTS:
+        items = [row[0] for row in rows]
+        last_values = [rows[-1][1], items[-1].id] if rows else None
+    else:
+        items = rows
+        last_values = [getattr(items[-1], column.key) for column in columns] if rows else None
+
+    next_cursor = encode_cursor(sort, last_values) if has_more else None
+    return items, next_cursor
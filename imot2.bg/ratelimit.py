@@ -0,0 +1,174 @@
+"""Token-bucket throttling for the authentication endpoints.
+
+Every login attempt costs a full bcrypt verification, so unthrottled credential
+stuffing turns straight into CPU exhaustion. Each limiter is a token bucket per
+key (client IP or username): it holds up to ``capacity`` tokens, refills at
+``capacity / period`` tokens per second, and a request that finds it empty is
+rejected with 429 and a Retry-After.
+
+Buckets live in process memory by default. With IMOT2_RATELIMIT_BACKEND=database
+they are kept in the ``rate_limit_buckets`` table instead, so that every worker
+process shares them; each check is a single conditional UPDATE.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import case, insert, literal, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+import models
+
+BACKEND_ENV = "IMOT2_RATELIMIT_BACKEND"
+MAX_MEMORY_KEYS = 100_000
+
+
+class MemoryBackend:
+    """Buckets in a bounded LRU dict; the least recently used keys are dropped first."""
+    blocking = False
+
+    def __init__(self, max_keys: int = MAX_MEMORY_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, capacity: float, rate: float, now: float) -> Tuple[bool, float]:
+        """Takes one token; returns (allowed, seconds until a token is available)."""
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class DatabaseBackend:
+    """Buckets in the ``rate_limit_buckets`` table, shared by all worker processes."""
+    blocking = True
+
+    def __init__(self, bind=None):
+        self._bind = bind
+
+    @property
+    def bind(self):
+        if self._bind is None:
+            from database import engine
+            self._bind = engine
+        return self._bind
+
+    def take(self, key: str, capacity: float, rate: float, now: float) -> Tuple[bool, float]:
+        bucket = models.RateLimitBucket
+        refilled = bucket.tokens + (literal(now) - bucket.updated_at) * rate
+        available = case((refilled > capacity, capacity), else_=refilled)
+        with Session(bind=self.bind) as db:
+            taken = db.execute(
+                update(bucket).where(bucket.key == key, available >= 1)
+                .values(tokens=available - 1, updated_at=now)
+            ).rowcount
+            if not taken:
+                tokens = db.execute(select(available).where(bucket.key == key)).scalar()
+                if tokens is None:
+                    try:
+                        db.execute(insert(bucket).values(key=key, tokens=capacity - 1, updated_at=now))
+                        taken = 1
+                    except IntegrityError:
+                        # Created concurrently by another worker; count this request as over the limit.
+                        db.rollback()
+                        tokens = 0.0
+            db.commit()
+        return (True, 0.0) if taken else (False, (1 - tokens) / rate)
+
+    def reset(self):
+        with Session(bind=self.bind) as db:
+            db.query(models.RateLimitBucket).delete()
+            db.commit()
+
+
+def _configured_backend():
+    return DatabaseBackend() if os.environ.get(BACKEND_ENV) == "database" else MemoryBackend()
+
+
+backend = _configured_backend()
+
+
+class RateLimiter:
+    """A token bucket per key: ``capacity`` requests at once, refilled over ``period`` seconds."""
+
+    def __init__(self, name: str, capacity: int, period: float):
+        self.name = name
+        self.capacity = capacity
+        self.period = period
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.rejected = 0
+
+    def take(self, key: str, now: Optional[float] = None) -> Tuple[bool, float]:
+        allowed, retry_after = backend.take(
+            f"{self.name}:{key}", self.capacity, self.capacity / self.period, time.time() if now is None else now
+        )
+        with self._lock:
+            if allowed:
+                self.allowed += 1
+            else:
+                self.rejected += 1
+        return allowed, retry_after
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"capacity": self.capacity, "period_seconds": self.period,
+                    "allowed": self.allowed, "rejected": self.rejected}
+
+    def reset_stats(self):
+        with self._lock:
+            self.allowed = self.rejected = 0
+
+
+LOGIN_BY_IP = RateLimiter("login-ip", capacity=30, period=60)
+LOGIN_BY_USERNAME = RateLimiter("login-user", capacity=5, period=300)
+REGISTER_BY_IP = RateLimiter("register-ip", capacity=10, period=3600)
+LIMITERS = (LOGIN_BY_IP, LOGIN_BY_USERNAME, REGISTER_BY_IP)
+
+
+def client_ip(request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
+def _check(*limits: Tuple[RateLimiter, str]):
+    for limiter, key in limits:
+        allowed, retry_after = limiter.take(key)
+        if not allowed:
+            raise HTTPException(
+                status_code=429, detail="Too many attempts, please try again later",
+                headers={"Retry-After": str(max(1, int(retry_after + 0.999)))}
+            )
+
+
+async def enforce(*limits: Tuple[RateLimiter, str]):
+    """Takes a token from each (limiter, key) pair in turn; raises 429 at the first empty bucket."""
+    if backend.blocking:
+        await run_in_threadpool(_check, *limits)
+    else:
+        _check(*limits)
+
+
+def stats() -> dict:
+    return {limiter.name: limiter.stats() for limiter in LIMITERS}
+
+
+def reset():
+    """Empties every bucket and counter (tests, or after a false alarm)."""
+    backend.reset()
+    for limiter in LIMITERS:
+        limiter.reset_stats()
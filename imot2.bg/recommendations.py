@@ -0,0 +1,223 @@
+"""Similar-listing recommendations from an in-memory NumPy feature matrix.
+
+Every listed property is one row of a feature matrix (log price, coordinates,
+average rating) plus integer codes for its type and city. A "similar listings"
+query scores all rows against one listing in a single vectorized pass and picks
+the top k with ``argpartition``, instead of running per-request SQL.
+
+The index is built lazily from the database and kept current by the listing and
+review write paths, which re-read only the rows they changed. It is also rebuilt
+after REFRESH_SECONDS, which picks up writes made by other worker processes.
+"""
+import math
+import threading
+import time
+from typing import Iterable, List, Optional
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session, joinedload
+import geo
+import locations
+import models
+from database import same_database
+
+DEFAULT_LIMIT = 4
+REFRESH_SECONDS = 300
+
+# Feature matrix columns.
+LOG_PRICE, LATITUDE, LONGITUDE, RATING = range(4)
+_FEATURES = 4
+
+# Distance weights: one unit is "a price twice as high", "5 km away", etc.
+PRICE_SCALE = math.log(2)
+GEO_SCALE_KM = 5.0
+MAX_GEO_PENALTY = 2.0
+TYPE_MISMATCH_PENALTY = 3.0
+CITY_MISMATCH_PENALTY = 2.0
+RATING_SCALE = 2.0
+
+
+def _city_key(location: Optional[str]) -> str:
+    return locations.normalize(locations.parse_location(location)[0])
+
+
+class SimilarityIndex:
+    """Listed properties as rows of a NumPy matrix, updated in place on writes."""
+
+    def __init__(self, refresh_seconds: float = REFRESH_SECONDS, clock=time.monotonic):
+        self.refresh_seconds = refresh_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        """Drops the index; the next query rebuilds it."""
+        self._bind = None
+        self._built_at = None
+        self._size = 0
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._features = np.zeros((0, _FEATURES))
+        self._type_codes = np.zeros(0, dtype=np.int32)
+        self._city_codes = np.zeros(0, dtype=np.int32)
+        self._rows = {}
+        self._codes = {}
+
+    def invalidate(self):
+        """Marks the index stale so that the next query rebuilds it."""
+        with self._lock:
+            self._built_at = None
+
+    def __len__(self):
+        return self._size
+
+    def _code(self, value: Optional[str]) -> int:
+        """Stable integer code of a category value; unknown/empty values get -1."""
+        if not value:
+            return -1
+        return self._codes.setdefault(value, len(self._codes))
+
+    def _vector(self, price, latitude, longitude, rating):
+        return [
+            math.log1p(max(price or 0, 0)),
+            np.nan if latitude is None else latitude,
+            np.nan if longitude is None else longitude,
+            np.nan if rating is None else rating,
+        ]
+
+    def _set_row(self, row: int, listing):
+        prop_id, price, property_type, location, latitude, longitude, rating = listing
+        self._ids[row] = prop_id
+        self._features[row] = self._vector(price, latitude, longitude, rating)
+        self._type_codes[row] = self._code(property_type)
+        self._city_codes[row] = self._code(_city_key(location))
+        self._rows[prop_id] = row
+
+    def _grow(self, capacity: int):
+        if capacity <= len(self._ids):
+            return
+        capacity = max(capacity, 2 * len(self._ids), 64)
+        self._ids = np.resize(self._ids, capacity)
+        self._features = np.resize(self._features, (capacity, _FEATURES))
+        self._type_codes = np.resize(self._type_codes, capacity)
+        self._city_codes = np.resize(self._city_codes, capacity)
+
+    def _upsert(self, listing):
+        row = self._rows.get(listing[0])
+        if row is None:
+            self._grow(self._size + 1)
+            row, self._size = self._size, self._size + 1
+        self._set_row(row, listing)
+
+    def _remove(self, prop_id: int):
+        """Removes a row by moving the last row into its place."""
+        row = self._rows.pop(prop_id, None)
+        if row is None:
+            return
+        last = self._size - 1
+        if row != last:
+            for array in (self._ids, self._features, self._type_codes, self._city_codes):
+                array[row] = array[last]
+            self._rows[int(self._ids[row])] = row
+        self._size = last
+
+    @staticmethod
+    def _query(db):
+        rating = (models.PropertySummary.rating_total * 1.0
+                  / func.nullif(models.PropertySummary.review_count, 0))
+        return db.query(
+            models.Property.id, models.Property.price, models.Property.property_type,
+            models.Property.location, models.Property.latitude, models.Property.longitude, rating
+        ).join(models.User).outerjoin(models.PropertySummary).filter(
+            models.User.is_verified == True, models.LISTED
+        )
+
+    def _is_current(self, bind) -> bool:
+        return (same_database(self._bind, bind) and self._built_at is not None
+                and self._clock() - self._built_at < self.refresh_seconds)
+
+    def _rebuild(self, db):
+        self.clear()
+        listings = self._query(db).all()
+        self._grow(len(listings))
+        for listing in listings:
+            self._upsert(listing)
+        self._bind = db.get_bind()
+        self._built_at = self._clock()
+
+    def refresh(self, db, property_ids: Iterable[int]):
+        """Re-reads the given listings after a write; unlisted or deleted ones are dropped.
+
+        Does nothing if the index has not been built for this database yet.
+        """
+        property_ids = list(property_ids)
+        with self._lock:
+            if not same_database(self._bind, db.get_bind()) or not property_ids:
+                return
+            listings = self._query(db).filter(models.Property.id.in_(property_ids)).all()
+            for prop_id in set(property_ids) - {listing[0] for listing in listings}:
+                self._remove(prop_id)
+            for listing in listings:
+                self._upsert(listing)
+
+    def refresh_later(self, bind, property_ids: Iterable[int]):
+        """refresh() as a background task, in a session of its own on the engine the index was built from.
+
+        ``bind`` is that of the session that made the change, which may be an async
+        engine's sync facade. The refresh waits for the lock, which a rebuild in
+        similar() can hold for a while, so async routes must not call refresh() on
+        the event loop.
+        """
+        with self._lock:
+            built_from = self._bind
+        if not same_database(built_from, bind):
+            return
+        with Session(bind=built_from) as db:
+            self.refresh(db, property_ids)
+
+    def similar(self, db, prop: models.Property, limit: int = DEFAULT_LIMIT) -> List[int]:
+        """Ids of the listings most similar to ``prop``, most similar first."""
+        with self._lock:
+            if not self._is_current(db.get_bind()):
+                self._rebuild(db)
+            rating = prop.average_rating
+            target = np.array(self._vector(prop.price, prop.latitude, prop.longitude, rating))
+            type_code = self._codes.get(prop.property_type, -2)
+            city_code = self._codes.get(_city_key(prop.location), -2)
+
+            size = self._size
+            features = self._features[:size]
+            ids = self._ids[:size]
+            score = np.abs(features[:, LOG_PRICE] - target[LOG_PRICE]) / PRICE_SCALE
+            score += TYPE_MISMATCH_PENALTY * (self._type_codes[:size] != type_code)
+            score += CITY_MISMATCH_PENALTY * (self._city_codes[:size] != city_code)
+
+            # Distance terms only count where both listings have the value (NaN otherwise).
+            lat_km = (features[:, LATITUDE] - target[LATITUDE]) * geo.KM_PER_DEGREE
+            lng_km = ((features[:, LONGITUDE] - target[LONGITUDE])
+                      * geo.KM_PER_DEGREE * math.cos(math.radians(target[LATITUDE])))
+            nearby = np.minimum(np.hypot(lat_km, lng_km) / GEO_SCALE_KM, MAX_GEO_PENALTY)
+            score += np.nan_to_num(nearby, nan=0.0)
+            rated = np.abs(features[:, RATING] - target[RATING]) / RATING_SCALE
+            score += np.nan_to_num(rated, nan=0.0)
+
+            score[ids == prop.id] = np.inf
+            limit = min(limit, size - int(prop.id in self._rows))
+            if limit <= 0:
+                return []
+            best = np.argpartition(score, limit - 1)[:limit]
+            return ids[best[np.argsort(score[best], kind="stable")]].tolist()
+
+
+index = SimilarityIndex()
+
+
+def similar_listings(db, prop: models.Property, limit: int = DEFAULT_LIMIT) -> List[models.Property]:
+    """The listings most similar to ``prop``, with their summaries, most similar first."""
+    ids = index.similar(db, prop, limit)
+    if not ids:
+        return []
+    rows = db.query(models.Property).options(joinedload(models.Property.summary)).filter(
+        models.Property.id.in_(ids)
+    ).all()
+    by_id = {row.id: row for row in rows}
+    return [by_id[prop_id] for prop_id in ids if prop_id in by_id]
@@ -3,8 +3,15 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from datetime import datetime, timezone
 from typing import List
+import hashing
 import models
+import ratelimit
+import recommendations
 import schemas
+import search
+import sessions
+import storage
+import summary
 from database import get_db
 from .auth import get_current_user
 
@@ -14,7 +21,7 @@ router = APIRouter(prefix="/admin", tags=["Admin Panel"])
 @router.get("/stats")
 def get_admin_stats(
         db: Session = Depends(get_db),
-        current_user: models.User = Depends(get_current_user)
+        current_user: sessions.SessionUser = Depends(get_current_user)
 ):
     """Returns statistics for properties, bookings and reviews count."""
 
@@ -41,6 +48,11 @@ def get_admin_stats(
             "total_bookings": db.query(models.Booking).count(),
             "total_reviews": db.query(models.Review).count()
         },
+        "cache_stats": {
+            "search_results": search.result_cache.stats()
+        },
+        "hashing_stats": hashing.metrics.stats(),
+        "rate_limit_stats": ratelimit.stats(),
         "system_info": {
             "report_generated_at": datetime.now(timezone.utc).isoformat(),
             "admin_user": current_user.username
@@ -54,7 +66,7 @@ def get_admin_stats(
 def verify_user(
         user_id: int,
         db: Session = Depends(get_db),
-        current_user: models.User = Depends(get_current_user)
+        current_user: sessions.SessionUser = Depends(get_current_user)
 ):
     """Allows administrative users to verify (approve) a user or agent profile."""
     if current_user.role != "admin":
@@ -72,15 +84,20 @@ def verify_user(
         raise HTTPException(status_code=400, detail="User is already verified")
 
     user_to_verify.is_verified = True
+    # Earlier session tokens still say "not verified"; the user logs in again.
+    sessions.revocations.revoke_user(db, user_to_verify.id)
     db.commit()
     db.refresh(user_to_verify)
+    # Listings of unverified owners are hidden from search until now.
+    search.invalidate_results()
+    recommendations.index.invalidate()
     return user_to_verify
 
 
 @router.get("/reviews", response_model=List[schemas.ReviewResponse])
 def get_all_reviews(
         db: Session = Depends(get_db),
-        current_user: models.User = Depends(get_current_user)
+        current_user: sessions.SessionUser = Depends(get_current_user)
 ):
     """Retrieves all reviews."""
     if current_user.role != "admin":
@@ -93,7 +110,7 @@ def get_all_reviews(
 def delete_review(
         review_id: int,
         db: Session = Depends(get_db),
-        current_user: models.User = Depends(get_current_user)
+        current_user: sessions.SessionUser = Depends(get_current_user)
 ):
     """Allows administrative users to delete a review."""
     if current_user.role != "admin":
@@ -103,18 +120,38 @@ def delete_review(
     if not review:
         raise HTTPException(status_code=404, detail="Review not found")
 
+    property_id = review.property_id
     db.delete(review)
+    summary.review_removed(db, review)
     db.commit()
+    recommendations.index.refresh(db, [property_id])
     return {"message": f"Review {review_id} has been deleted by admin"}
 
 
 @router.get("/bookings", response_model=List[schemas.BookingResponse])
 def get_all_bookings(
         db: Session = Depends(get_db),
-        current_user: models.User = Depends(get_current_user)
+        current_user: sessions.SessionUser = Depends(get_current_user)
 ):
     """Retrieves all bookings."""
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
 
     return db.query(models.Booking).all()
+
+
+@router.post("/uploads/gc", response_model=schemas.UploadGcReport)
+def collect_upload_garbage(
+        dry_run: bool = True,
+        db: Session = Depends(get_db),
+        current_user: sessions.SessionUser = Depends(get_current_user)
+):
+    """Finds uploaded files that no listing uses; with dry_run=false also deletes them.
+
+    Runs in the threadpool, so other requests are served meanwhile. Files uploaded
+    in the last hour are never touched.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+    return storage.collect_garbage(db, dry_run=dry_run)
@@ -1,22 +1,29 @@
 """Authentication routes for user registration, login, and logout."""
 from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import RedirectResponse
 from fastapi.templating import Jinja2Templates
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from passlib.context import CryptContext
 from starlette.responses import JSONResponse
+import hashing
 import models
+import ratelimit
 import schemas
-from database import get_db
+import sessions
+from database import get_async_db, get_db
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 templates = Jinja2Templates(directory="templates")
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = hashing.pwd_context
 
+def _busy() -> HTTPException:
+    return HTTPException(
+        status_code=503, detail="Too many sign-in attempts in progress, please retry", headers={"Retry-After": "1"}
+    )
 
-@router.post("/register", response_model=schemas.UserResponse)
-def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    """Register a new user."""
+
+def _check_new_user(db: Session, user: schemas.UserCreate):
     db_user = db.query(models.User).filter(
         (models.User.email == user.email) | (models.User.username == user.username)
     ).first()
@@ -26,8 +33,8 @@ def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
     if user.role not in ["client", "agent"]:
         raise HTTPException(status_code=400, detail="Invalid role selection")
 
-    hashed_pass = pwd_context.hash(user.password)
 
+def _add_user(db: Session, user: schemas.UserCreate, hashed_pass: str) -> models.User:
     new_user = models.User(
         email=user.email,
         username=user.username,
@@ -44,41 +51,94 @@ def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
     return new_user
 
 
-def get_current_user(request: Request, db: Session = Depends(get_db)):
-    """Dependency function to retrieve the currently logged-in user from the session cookie."""
-    username = request.cookies.get("username")
-    if not username:
+@router.post("/register", response_model=schemas.UserResponse)
+async def register(request: Request, user: schemas.UserCreate, db: Session = Depends(get_db)):
+    """Register a new user.
+
+    Throttled per client IP (see ratelimit.py). The password is hashed on the
+    dedicated hashing pool (see hashing.py); the database work runs in the threadpool.
+    """
+    await ratelimit.enforce((ratelimit.REGISTER_BY_IP, ratelimit.client_ip(request)))
+    await run_in_threadpool(_check_new_user, db, user)
+
+    try:
+        hashed_pass = await hashing.hash_password(user.password)
+    except hashing.HashingBusy:
+        raise _busy()
+
+    return await run_in_threadpool(_add_user, db, user, hashed_pass)
+
+
+async def get_current_user(request: Request, db: AsyncSession = Depends(get_async_db)) -> sessions.SessionUser:
+    """Dependency returning the logged-in user from the signed session token.
+
+    Id, username, role and verification status come from the token, so no user
+    query is made; only the revocation list is re-read now and then (see sessions.py).
+    It runs on the event loop: the async session only connects for such a reload.
+    """
+    user = await sessions.authenticate_async(request, db)
+    if user is None:
         raise HTTPException(
             status_code=401,
             detail="User not authenticated"
         )
 
-    user = db.query(models.User).filter(models.User.username == username).first()
-    if not user:
-        raise HTTPException(status_code=401, detail="User not found")
-
     return user
 
 
+def _store_rehash(db: Session, user: models.User, new_hash: str):
+    user.hashed_password = new_hash
+    db.commit()
+
+
+def _find_user(db: Session, username: str) -> models.User:
+    return db.query(models.User).filter(models.User.username == username).first()
+
+
 @router.post("/login")
-def login(
+async def login(
+        request: Request,
         login_data: schemas.UserLogin,
         db: Session = Depends(get_db)
 ):
-    """Authenticates a user by username and password, sets a secure HTTP-only cookie to maintain the session."""
-    user = db.query(models.User).filter(models.User.username == login_data.username).first()
+    """Authenticates a user by username and password and sets a signed, HTTP-only session cookie.
+
+    Attempts are throttled per client IP and per username before any password is
+    checked. A password hashed with outdated bcrypt parameters is re-hashed on success.
+    """
+    await ratelimit.enforce(
+        (ratelimit.LOGIN_BY_IP, ratelimit.client_ip(request)),
+        (ratelimit.LOGIN_BY_USERNAME, login_data.username.strip().lower())
+    )
+    user = await run_in_threadpool(_find_user, db, login_data.username)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid username or password")
 
-    if not user or not pwd_context.verify(login_data.password, user.hashed_password):
+    try:
+        valid, new_hash = await hashing.verify_and_update(login_data.password, user.hashed_password)
+    except hashing.HashingBusy:
+        raise _busy()
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid username or password")
+    if new_hash:
+        await run_in_threadpool(_store_rehash, db, user, new_hash)
 
     response = JSONResponse(content={"message": "Login successful"})
-    response.set_cookie(key="username", value=user.username, httponly=True)
+    response.set_cookie(
+        key=sessions.COOKIE_NAME, value=sessions.issue(user), httponly=True, samesite="lax",
+        max_age=sessions.SESSION_TTL_SECONDS
+    )
     return response
 
 
 @router.get("/logout")
-def logout():
-    """Terminates the user session by deleting the 'username' cookie."""
+def logout(request: Request, db: Session = Depends(get_db)):
+    """Revokes the session token and deletes the session cookie."""
+    session = sessions.authenticate(request, db)
+    if session is not None:
+        sessions.revocations.revoke(db, session)
+        db.commit()
+
     response = RedirectResponse(url="/", status_code=303)
-    response.delete_cookie(key="username")
+    response.delete_cookie(key=sessions.COOKIE_NAME)
     return response
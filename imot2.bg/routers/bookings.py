@@ -2,31 +2,34 @@
 from datetime import date
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import func
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
 import models
 import schemas
-from database import get_db
+import sessions
+import summary
+from database import get_async_db
 from routers.auth import get_current_user
 
 router = APIRouter(prefix="/bookings", tags=["Bookings & Calendar"])
 
 @router.post("/", response_model=schemas.BookingResponse)
-def create_booking(
+async def create_booking(
     booking_data: schemas.BookingCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: sessions.SessionUser = Depends(get_current_user)
 ):
     """Creates a property viewing booking."""
-    prop = db.query(models.Property).filter(models.Property.id == booking_data.property_id).first()
+    prop = await db.get(models.Property, booking_data.property_id)
     if not prop:
         raise HTTPException(status_code=404, detail="Property not found")
 
-    existing_booking = db.query(models.Booking).filter(
+    existing_booking = (await db.scalars(select(models.Booking).filter(
         models.Booking.property_id == booking_data.property_id,
         models.Booking.booking_date == booking_data.booking_date,
         models.Booking.status == "confirmed"
-    ).first()
+    ))).first()
 
     if existing_booking:
         raise HTTPException(
@@ -41,36 +44,37 @@ def create_booking(
         status="pending"
     )
     db.add(new_booking)
-    db.commit()
-    db.refresh(new_booking)
+    await db.run_sync(summary.booking_added, new_booking)
+    await db.commit()
+    await db.refresh(new_booking)
     return new_booking
 
 @router.get("/calendar", response_model=List[schemas.BookingResponse])
-def get_daily_schedule(
+async def get_daily_schedule(
     day: date,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: sessions.SessionUser = Depends(get_current_user)
 ):
     """Returns the agent's schedule for a specific day."""
     if current_user.role not in ["agent", "admin"]:
         raise HTTPException(status_code=403, detail="Only agents can view schedules")
 
-    return db.query(models.Booking).join(models.Property).filter(
+    return (await db.scalars(select(models.Booking).join(models.Property).filter(
         models.Property.owner_id == current_user.id,
         func.date(models.Booking.booking_date) == day
-    ).order_by(models.Booking.booking_date.asc()).all()
+    ).order_by(models.Booking.booking_date.asc()))).all()
 
 @router.patch("/{booking_id}/status")
-def update_booking_status(
+async def update_booking_status(
     booking_id: int,
     new_status: str,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: sessions.SessionUser = Depends(get_current_user)
 ):
     """Allows the agent to confirm or decline a booking."""
-    booking = db.query(models.Booking).join(models.Property).filter(
+    booking = (await db.scalars(select(models.Booking).options(joinedload(models.Booking.property)).filter(
         models.Booking.id == booking_id
-    ).first()
+    ))).first()
 
     if not booking:
         raise HTTPException(status_code=404, detail="Booking not found")
@@ -81,6 +85,8 @@ def update_booking_status(
     if new_status not in ["confirmed", "declined"]:
         raise HTTPException(status_code=400, detail="Invalid status. Use 'confirmed' or 'declined'.")
 
+    old_status = booking.status
     booking.status = new_status
-    db.commit()
+    await db.run_sync(summary.booking_status_changed, booking, old_status)
+    await db.commit()
     return {"message": f"Booking status updated to: {new_status}"}
@@ -1,24 +1,25 @@
 """Messaging system between users."""
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import or_, select
 from typing import List
 import models
 import schemas
-from database import get_db
+import sessions
+from database import get_async_db
 from routers.auth import get_current_user
 
 router = APIRouter(prefix="/messages", tags=["Messaging"])
 
 @router.post("/", response_model=schemas.MessageResponse)
-def send_message(
+async def send_message(
     msg: schemas.MessageCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: sessions.SessionUser = Depends(get_current_user)
 ):
     """Sends a new message to another user."""
 
-    receiver = db.query(models.User).filter(models.User.id == msg.receiver_id).first()
+    receiver = await db.get(models.User, msg.receiver_id)
     if not receiver:
         raise HTTPException(status_code=404, detail="Receiver not found")
 
@@ -31,33 +32,33 @@ def send_message(
         content=msg.content
     )
     db.add(new_msg)
-    db.commit()
-    db.refresh(new_msg)
+    await db.commit()
+    await db.refresh(new_msg)
     return new_msg
 
 @router.get("/inbox", response_model=List[schemas.MessageResponse])
-def get_my_messages(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+async def get_my_messages(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: sessions.SessionUser = Depends(get_current_user)
 ):
     """Retrieves the message history for the current user."""
-    return db.query(models.Message).filter(
+    return (await db.scalars(select(models.Message).filter(
         or_(
             models.Message.receiver_id == current_user.id,
             models.Message.sender_id == current_user.id
         )
-    ).order_by(models.Message.timestamp.desc()).all()
+    ).order_by(models.Message.timestamp.desc()))).all()
 
 @router.get("/chat/{other_user_id}", response_model=List[schemas.MessageResponse])
-def get_conversation(
+async def get_conversation(
     other_user_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: sessions.SessionUser = Depends(get_current_user)
 ):
     """Retrieves a specific conversation between the logged-in user and another user."""
-    return db.query(models.Message).filter(
+    return (await db.scalars(select(models.Message).filter(
         or_(
             (models.Message.sender_id == current_user.id) & (models.Message.receiver_id == other_user_id),
             (models.Message.sender_id == other_user_id) & (models.Message.receiver_id == current_user.id)
         )
-    ).order_by(models.Message.timestamp.asc()).all()
+    ).order_by(models.Message.timestamp.asc()))).all()
@@ -1,49 +1,149 @@
 """Search, creation, and image uploads for properties."""
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status, Request
+import asyncio
+from datetime import datetime, timezone
+from fastapi import APIRouter, BackgroundTasks, Depends, UploadFile, File, Form, HTTPException, Query, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-import shutil
 from typing import List, Optional
+import exports
+import facets
+import geo
+import images
+import imports
+import loading
+import locations
 import models
+import pagination
+import recommendations
 import schemas
+import search
+import sessions
+import storage
+import summary
+import uploads
 from database import get_db
 from .auth import get_current_user
-import os, uuid
 
 router = APIRouter(prefix="/properties", tags=["Properties"])
 
 
-@router.get("/", response_model=List[schemas.PropertyResponse])
+def geo_filters(
+        min_lat: Optional[float] = Query(None, ge=-90, le=90),
+        min_lng: Optional[float] = Query(None, ge=-180, le=180),
+        max_lat: Optional[float] = Query(None, ge=-90, le=90),
+        max_lng: Optional[float] = Query(None, ge=-180, le=180),
+        lat: Optional[float] = Query(None, ge=-90, le=90),
+        lng: Optional[float] = Query(None, ge=-180, le=180),
+        radius_km: Optional[float] = Query(None, gt=0, le=geo.MAX_RADIUS_KM)
+):
+    """Map filters: a bounding box (min/max lat/lng) and/or a radius around lat, lng."""
+    filters = {}
+
+    box = (min_lat, min_lng, max_lat, max_lng)
+    if any(value is not None for value in box):
+        if any(value is None for value in box):
+            raise HTTPException(status_code=400, detail="A bounding box needs min_lat, min_lng, max_lat and max_lng")
+        if min_lat > max_lat or min_lng > max_lng:
+            raise HTTPException(status_code=400, detail="Bounding box minimums must not exceed maximums")
+        filters["bbox"] = box
+
+    circle = (lat, lng, radius_km)
+    if any(value is not None for value in circle):
+        if any(value is None for value in circle):
+            raise HTTPException(status_code=400, detail="A radius search needs lat, lng and radius_km")
+        filters["near"] = circle
+
+    return filters
+
+
+@router.get("/", response_model=schemas.PropertyPage)
 def get_properties(
         title: Optional[str] = None,
         prop_type: Optional[str] = None,
         location: Optional[str] = None,
+        city: Optional[str] = None,
+        neighborhood: Optional[str] = None,
+        q: Optional[str] = None,
+        sort: Optional[str] = None,
+        limit: int = Query(pagination.DEFAULT_PAGE_SIZE, ge=1, le=pagination.MAX_PAGE_SIZE),
+        cursor: Optional[str] = None,
+        include_facets: bool = False,
+        map_filters: dict = Depends(geo_filters),
         db: Session = Depends(get_db)
 ):
-    """Retrieves a list of properties. Supports filtering by title, category, and location."""
-    query = db.query(models.Property).join(models.User).filter(
-        models.User.is_verified
+    """Retrieves a page of properties. Supports filtering by title, category, and location,
+    and a ranked free-text search (q) over title, description and location. City and
+    neighborhood match the location dictionary, tolerating typos and Latin spelling.
+
+    Map browsing filters by a bounding box or a radius (see geo_filters); radius
+    searches can be sorted by distance. Pass the returned next_cursor back as cursor
+    to fetch the following page. With include_facets, the counts from
+    /properties/facets are returned alongside.
+    """
+    filters = {
+        "q": q, "title": title, "prop_type": prop_type, "location": location,
+        "city": city, "neighborhood": neighborhood, **map_filters
+    }
+    items, next_cursor = search.search_page(
+        db, sort=sort, limit=limit, cursor=cursor, options=loading.api_listing(), **filters
     )
 
-    if title:
-        query = query.filter(models.Property.title.ilike(f"%{title}%"))
-
-    if prop_type:
-        query = query.filter(models.Property.property_type == prop_type)
+    page = {"items": items, "next_cursor": next_cursor}
+    if include_facets:
+        page["facets"] = facets.facet_counts(db, **filters)
+    return page
 
-    if location:
-        query = query.filter(models.Property.location.ilike(f"%{location}%"))
 
-    return query.all()
+@router.get("/facets", response_model=schemas.PropertyFacets)
+def get_property_facets(
+        title: Optional[str] = None,
+        prop_type: Optional[str] = None,
+        location: Optional[str] = None,
+        city: Optional[str] = None,
+        neighborhood: Optional[str] = None,
+        q: Optional[str] = None,
+        map_filters: dict = Depends(geo_filters),
+        db: Session = Depends(get_db)
+):
+    """Counts the listings matching the filters per property type, city and price bucket."""
+    return facets.facet_counts(
+        db, q=q, title=title, prop_type=prop_type, location=location,
+        city=city, neighborhood=neighborhood, **map_filters
+    )
 
 
-@router.post("/{property_id}/upload-image")
-async def upload_image(
-        property_id: int,
-        file: UploadFile = File(...),
-        db: Session = Depends(get_db),
-        current_user: models.User = Depends(get_current_user)
+@router.get("/export")
+def export_properties(
+        file_format: str = Query(exports.NDJSON, alias="format"),
+        since: Optional[datetime] = None,
+        db: Session = Depends(get_db)
 ):
-    """Uploads a single image for a specific property."""
+    """Streams the catalogue as NDJSON or CSV for partner portals.
+
+    Without ``since`` every listed property is exported. With ``since`` only listings
+    changed after it are exported, including ones no longer listed, followed in time
+    order by deletions (records with ``deleted`` set). Pass the
+    X-Export-Watermark header of the previous export as the next ``since``; it lags
+    behind the export (see exports.py), so records already received can come again
+    and are recognized by (id, updated_at).
+    """
+    if file_format not in exports.FORMATS:
+        raise HTTPException(status_code=400, detail="Unsupported format. Use 'csv' or 'ndjson'.")
+
+    until = datetime.now(timezone.utc)
+    return StreamingResponse(
+        exports.stream_export(db.get_bind(), file_format, since=since, until=until),
+        media_type=exports.MEDIA_TYPES[file_format],
+        headers={
+            "X-Export-Watermark": exports.watermark(until).isoformat(),
+            "Content-Disposition": f'attachment; filename="properties.{file_format}"',
+        }
+    )
+
+
+def _owned_property(db: Session, property_id: int, current_user: sessions.SessionUser) -> models.Property:
     property_item = db.query(models.Property).filter(models.Property.id == property_id).first()
 
     if not property_item:
@@ -52,35 +152,133 @@ async def upload_image(
     if property_item.owner_id != current_user.id:
         raise HTTPException(status_code=403, detail="Permission denied: You do not own this property")
 
-    file_extension = os.path.splitext(file.filename)[1]
-    unique_filename = f"{uuid.uuid4()}{file_extension}"
-    upload_dir = "static/uploads"
+    return property_item
 
-    os.makedirs(upload_dir, exist_ok=True)
 
-    file_path = os.path.join(upload_dir, unique_filename)
+def _next_position(db: Session, property_id: int) -> int:
+    last = db.query(func.max(models.PropertyImage.position)).filter(
+        models.PropertyImage.property_id == property_id
+    ).scalar()
+    return 0 if last is None else last + 1
 
-    try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-    except Exception:
-        raise HTTPException(status_code=500, detail="Could not save file")
 
-    new_image = models.PropertyImage(property_id=property_id, url=f"/{file_path}")
+def _add_image(db: Session, property_item: models.Property, stored: uploads.StoredUpload, position: int,
+               is_cover: bool = False) -> models.PropertyImage:
+    stored_file = storage.acquire(db, stored)
+    new_image = models.PropertyImage(
+        property_id=property_item.id, url=stored.url, content_type=stored.content_type,
+        size_bytes=stored.size, sha256=stored.sha256, variants=stored_file.variants,
+        position=position, is_cover=is_cover
+    )
     db.add(new_image)
+    summary.image_added(db, new_image)
+    return new_image
+
+
+def _save_images(db: Session, property_item: models.Property, stored: List[uploads.StoredUpload],
+                 cover: Optional[int] = None) -> List[models.PropertyImage]:
+    """Adds the uploaded images after the listing's existing ones, in one transaction."""
+    if cover is not None:
+        db.query(models.PropertyImage).filter(
+            models.PropertyImage.property_id == property_item.id, models.PropertyImage.is_cover == True
+        ).update({models.PropertyImage.is_cover: False}, synchronize_session=False)
+
+    first_position = _next_position(db, property_item.id)
+    new_images = [
+        _add_image(db, property_item, upload, first_position + offset, is_cover=offset == cover)
+        for offset, upload in enumerate(stored)
+    ]
+    property_item.updated_at = models.utcnow()
     db.commit()
-    db.refresh(new_image)
+    for new_image in new_images:
+        db.refresh(new_image)
+    return new_images
 
-    return {"message": "Image uploaded successfully", "url": new_image.url}
 
+def _save_image(db: Session, property_item: models.Property, stored: uploads.StoredUpload) -> models.PropertyImage:
+    return _save_images(db, property_item, [stored])[0]
 
-@router.post("/", response_model=schemas.PropertyResponse)
-def create_property(
-        property_data: schemas.PropertyCreate,
+
+@router.post("/{property_id}/upload-image")
+async def upload_image(
+        property_id: int,
+        background_tasks: BackgroundTasks,
+        file: UploadFile = File(...),
         db: Session = Depends(get_db),
-        current_user: models.User = Depends(get_current_user)
+        current_user: sessions.SessionUser = Depends(get_current_user)
 ):
-    """Creates a new property listing linked to an agent."""
+    """Uploads a single image (JPEG, PNG, GIF or WebP, up to 10 MB) for a specific property.
+
+    The request body is capped by uploads.UploadSizeLimit before it is parsed.
+    Ownership is checked before the file is stored; the file is streamed to disk in
+    chunks and the database work runs in the threadpool, so a large upload does not
+    hold up other requests. Resized and WebP variants are generated in the
+    background after the response (see images.py).
+    """
+    property_item = await run_in_threadpool(_owned_property, db, property_id, current_user)
+
+    stored = await storage.store(await uploads.save_upload(file))
+    try:
+        new_image = await run_in_threadpool(_save_image, db, property_item, stored)
+    except Exception:
+        # The stored file is left to storage.collect_garbage(): other uploads may share it.
+        await run_in_threadpool(db.rollback)
+        raise HTTPException(status_code=500, detail="Could not save image")
+
+    if not new_image.variants:
+        background_tasks.add_task(images.process_image, db.get_bind(), new_image.id, stored.path)
+    return {"message": "Image uploaded successfully", "url": new_image.url, "sha256": new_image.sha256}
+
+
+async def _store_file(file: UploadFile) -> uploads.StoredUpload:
+    return await storage.store(await uploads.save_upload(file))
+
+
+@router.post("/{property_id}/images", response_model=List[schemas.UploadedImage])
+async def upload_images(
+        property_id: int,
+        background_tasks: BackgroundTasks,
+        files: List[UploadFile] = File(...),
+        cover: Optional[int] = Form(None, ge=0, description="Index of the file to use as the listing's cover"),
+        db: Session = Depends(get_db),
+        current_user: sessions.SessionUser = Depends(get_current_user)
+):
+    """Uploads a gallery of up to 20 images for a property in one request.
+
+    The request body is capped by uploads.UploadSizeLimit before it is parsed.
+    Ownership is checked once, the files are streamed to storage concurrently and
+    all images are saved in one transaction, after the listing's existing images
+    and in the order they were sent. ``cover`` makes one of them the listing's cover.
+    If any file is rejected, none of them is saved.
+    """
+    if len(files) > uploads.MAX_BATCH_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {uploads.MAX_BATCH_FILES} images per upload")
+    if cover is not None and cover >= len(files):
+        raise HTTPException(status_code=400, detail="Cover index is out of range")
+    property_item = await run_in_threadpool(_owned_property, db, property_id, current_user)
+
+    results = await asyncio.gather(*(_store_file(file) for file in files), return_exceptions=True)
+    stored = [result for result in results if isinstance(result, uploads.StoredUpload)]
+    failure = next((result for result in results if isinstance(result, BaseException)), None)
+    if failure is not None:
+        # Files already stored are left to storage.collect_garbage(): other uploads may share them.
+        if isinstance(failure, HTTPException):
+            raise failure
+        raise HTTPException(status_code=500, detail="Could not save images")
+
+    try:
+        new_images = await run_in_threadpool(_save_images, db, property_item, stored, cover)
+    except Exception:
+        await run_in_threadpool(db.rollback)
+        raise HTTPException(status_code=500, detail="Could not save images")
+
+    for new_image, upload in zip(new_images, stored):
+        if not new_image.variants:
+            background_tasks.add_task(images.process_image, db.get_bind(), new_image.id, upload.path)
+    return new_images
+
+
+def _check_can_create_listings(current_user: sessions.SessionUser):
     if current_user.role not in ["agent", "admin"]:
         raise HTTPException(
             status_code=403,
@@ -93,14 +291,54 @@ def create_property(
             detail="Account not verified: Please wait for admin approval"
         )
 
+
+@router.post("/import", response_model=schemas.ImportReport)
+def import_properties(
+        file: UploadFile = File(...),
+        file_format: Optional[str] = Query(None, alias="format"),
+        db: Session = Depends(get_db),
+        current_user: sessions.SessionUser = Depends(get_current_user)
+):
+    """Bulk-imports listings from a CSV or NDJSON file (one listing per row/line).
+
+    Columns/keys are the PropertyCreate fields. Valid rows are saved in batches;
+    invalid rows are skipped and reported with their line number.
+    """
+    _check_can_create_listings(current_user)
+
+    file_format = file_format or imports.detect_format(file.filename, file.content_type)
+    if file_format not in imports.FORMATS:
+        raise HTTPException(status_code=400, detail="Unsupported file format. Use 'csv' or 'ndjson'.")
+
+    report = imports.import_listings(db, file.file, file_format, owner_id=current_user.id)
+    if report["imported"]:
+        search.invalidate_results()
+    return report
+
+
+@router.post("/", response_model=schemas.PropertyResponse)
+def create_property(
+        property_data: schemas.PropertyCreate,
+        db: Session = Depends(get_db),
+        current_user: sessions.SessionUser = Depends(get_current_user)
+):
+    """Creates a new property listing linked to an agent."""
+    _check_can_create_listings(current_user)
+
+    place = locations.resolve(db, property_data.location)
+
     new_prop = models.Property(
         title=property_data.title,
         price=property_data.price,
         property_type=property_data.property_type,
         location=property_data.location,
+        latitude=property_data.latitude,
+        longitude=property_data.longitude,
+        location_id=place.id if place else None,
         description=property_data.description,
         owner_id=current_user.id
     )
+    summary.property_created(new_prop)
 
     try:
         db.add(new_prop)
@@ -110,16 +348,25 @@ def create_property(
         db.rollback()
         raise HTTPException(status_code=500, detail="Database error during creation")
 
+    search.invalidate_results()
+    recommendations.index.refresh(db, [new_prop.id])
+
     return new_prop
 
 
 @router.delete("/{property_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_property(
         property_id: int,
+        background_tasks: BackgroundTasks,
         db: Session = Depends(get_db),
-        current_user: models.User = Depends(get_current_user)
+        current_user: sessions.SessionUser = Depends(get_current_user)
 ):
-    """Deletes a property listing and its details(pictures)."""
+    """Deletes a property listing and its details(pictures).
+
+    Files of images stored before content addressing are removed after the
+    response, once the deletion has committed; shared stored files are left to
+    storage.collect_garbage() once their last reference is gone.
+    """
     db_property = db.query(models.Property).filter(models.Property.id == property_id).first()
 
     if not db_property:
@@ -131,27 +378,39 @@ def delete_property(
             detail="Permission denied: You are not the owner of this listing"
         )
 
+    unshared = []
     for image in db_property.images:
-        try:
-            file_path = image.url.lstrip('/')
-            if os.path.exists(file_path):
-                os.remove(file_path)
-        except Exception as e:
-            print(f"Error deleting file {image.url}: {e}")
+        if image.sha256:
+            # Shared files are removed only with their last reference (see storage.py).
+            storage.release(db, image)
+        else:
+            unshared.extend(images.stored_files(image))
 
     db.delete(db_property)
+    # Incremental exports tell partners about the deletion (see exports.py).
+    db.merge(models.PropertyTombstone(id=property_id, deleted_at=models.utcnow()))
     db.commit()
+    background_tasks.add_task(storage.delete_paths, unshared)
+    search.invalidate_results()
+    recommendations.index.refresh(db, [property_id])
 
     return None
 
 
-@router.get("/{property_id}", response_model=schemas.PropertyResponse)
+@router.get("/{property_id}", response_model=schemas.PropertyDetail)
 def get_property_details(
         property_id: int,
         db: Session = Depends(get_db),):
-    """Detailed view for a specific property."""
-    db_property = db.query(models.Property).filter(models.Property.id == property_id).first()
+    """Detailed view for a specific property, with a few similar listings."""
+    db_property = db.query(models.Property).options(*loading.property_detail()).filter(
+        models.Property.id == property_id
+    ).first()
     if not db_property:
         raise HTTPException(status_code=404, detail="Property not found")
 
-    return db_property
+    details = schemas.PropertyDetail.model_validate(db_property)
+    details.similar = [
+        schemas.SimilarProperty.model_validate(similar)
+        for similar in recommendations.similar_listings(db, db_property)
+    ]
+    return details
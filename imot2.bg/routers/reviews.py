@@ -1,29 +1,38 @@
 """Property review and rating."""
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 import models
+import recommendations
 import schemas
-from database import get_db
+import sessions
+import summary
+from database import get_async_db
 from routers.auth import get_current_user  # Задължително за сигурност
 
 router = APIRouter(prefix="/reviews", tags=["Reviews"])
 
 @router.post("/", response_model=schemas.ReviewResponse)
-def create_review(
+async def create_review(
     review_data: schemas.ReviewCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: sessions.SessionUser = Depends(get_current_user)
 ):
-    """Creates a new review. One user can write only one review under each property."""
-    prop = db.query(models.Property).filter(models.Property.id == review_data.property_id).first()
+    """Creates a new review. One user can write only one review under each property.
+
+    The summary helpers are synchronous and run through ``run_sync``. The similar-listings
+    index is refreshed in a background task, as it can wait on a rebuild (see recommendations.py).
+    """
+    prop = await db.get(models.Property, review_data.property_id)
     if not prop:
         raise HTTPException(status_code=404, detail="Property not found")
 
-    existing_review = db.query(models.Review).filter(
+    existing_review = (await db.scalars(select(models.Review).filter(
         models.Review.property_id == review_data.property_id,
         models.Review.author_id == current_user.id
-    ).first()
+    ))).first()
 
     if existing_review:
         raise HTTPException(
@@ -42,13 +51,15 @@ def create_review(
     )
 
     db.add(new_review)
-    db.commit()
-    db.refresh(new_review)
+    await db.run_sync(summary.review_added, new_review)
+    await db.commit()
+    await db.refresh(new_review)
+    background_tasks.add_task(recommendations.index.refresh_later, db.get_bind(), [new_review.property_id])
     return new_review
 
 @router.get("/property/{property_id}", response_model=List[schemas.ReviewResponse])
-def get_property_reviews(property_id: int, db: Session = Depends(get_db)):
+async def get_property_reviews(property_id: int, db: AsyncSession = Depends(get_async_db)):
     """Retrieves all reviews for a specific property."""
-    return db.query(models.Review).filter(
+    return (await db.scalars(select(models.Review).filter(
         models.Review.property_id == property_id
-    ).all()
+    ))).all()
@@ -0,0 +1,36 @@
+"""Index DDL shared by the migrations (see migrations.py)."""
+import re
+from sqlalchemy import text
+from sqlalchemy.schema import CreateIndex
+
+
+def create_index_sql(index, dialect) -> str:
+    """``CREATE INDEX IF NOT EXISTS`` for ``index``; on PostgreSQL also CONCURRENTLY."""
+    sql = str(CreateIndex(index, if_not_exists=True).compile(dialect=dialect))
+    if dialect.name == "postgresql":
+        sql = re.sub(r"^CREATE (UNIQUE )?INDEX ", r"CREATE \1INDEX CONCURRENTLY ", sql)
+    return sql
+
+
+def create_index_online(engine, index):
+    """Creates ``index`` if it is missing, without blocking writes where the database allows it.
+
+    PostgreSQL builds it concurrently, outside a transaction, first dropping the
+    invalid leftover of an interrupted build. SQLite has no concurrent build, but
+    in WAL mode readers carry on while it runs.
+    """
+    sql = create_index_sql(index, engine.dialect)
+    if engine.dialect.name != "postgresql":
+        with engine.begin() as conn:
+            conn.exec_driver_sql(sql)
+        return
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        invalid = conn.execute(text(
+            "SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid"
+            " WHERE pg_class.relname = :name AND NOT pg_index.indisvalid"
+        ), {"name": index.name}).first()
+        if invalid:
+            conn.exec_driver_sql(f'DROP INDEX CONCURRENTLY IF EXISTS "{index.name}"')
+        conn.exec_driver_sql(sql)
+
@@ -67,6 +67,17 @@ class MessageResponse(MessageCreate):
 
 class ImageResponse(BaseModel):
     url: str
+    variants: Optional[dict] = None  # size -> {"width", "height", "webp", "jpeg"}, once generated
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class UploadedImage(BaseModel):
+    id: int
+    url: str
+    sha256: Optional[str] = None
+    position: Optional[int] = None
+    is_cover: bool = False
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -77,6 +88,8 @@ class PropertyCreate(BaseModel):
     price: float
     property_type: str
     location: str
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
 
 
 class PropertyResponse(PropertyCreate):
@@ -84,10 +97,72 @@ class PropertyResponse(PropertyCreate):
     owner_id: int
     status: str
     images: List[ImageResponse] = []
+    average_rating: Optional[float] = None
+    review_count: int = 0
+    booking_count: int = 0
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class SimilarProperty(BaseModel):
+    id: int
+    title: str
+    price: float
+    property_type: str
+    location: str
+    cover_image_url: Optional[str] = None
+    average_rating: Optional[float] = None
 
     model_config = ConfigDict(from_attributes=True)
 
 
+class PropertyDetail(PropertyResponse):
+    similar: List[SimilarProperty] = []
+
+
+class FacetCount(BaseModel):
+    value: Optional[str] = None
+    count: int
+
+
+class PriceBucketCount(BaseModel):
+    min: float
+    max: Optional[float] = None
+    count: int
+
+
+class PropertyFacets(BaseModel):
+    total: int
+    property_type: List[FacetCount]
+    city: List[FacetCount]
+    price: List[PriceBucketCount]
+
+
+class PropertyPage(BaseModel):
+    items: List[PropertyResponse]
+    next_cursor: Optional[str] = None
+    facets: Optional[PropertyFacets] = None
+
+
+class ImportRowError(BaseModel):
+    line: int
+    errors: List[str]
+
+
+class ImportReport(BaseModel):
+    imported: int
+    failed: int
+    errors: List[ImportRowError]
+
+
+class UploadGcReport(BaseModel):
+    scanned: int
+    orphaned: int
+    removed: int
+    freed_bytes: int
+    orphans: List[str]  # a sample of the orphaned paths
+
+
 class FavoriteBase(BaseModel):
     property_id: int
 
@@ -0,0 +1,258 @@
+"""Full-text search over property titles, descriptions and locations.
+
+On SQLite the listings are indexed in an FTS5 virtual table that triggers keep in
+sync with the ``properties`` table. Other backends fall back to token-wise ILIKE
+matching, which is slower but returns the same listings.
+"""
+import re
+from typing import List, Optional
+from sqlalchemy import Float, Integer, and_, text
+import geo
+import locations
+import models
+import pagination
+from cache import TTLCache
+
+FTS_TABLE = "properties_fts"
+
+# bm25 column weights, in the order the columns are declared in the FTS table.
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+LOCATION_WEIGHT = 5.0
+
+# unicode61 folds case for Latin and Cyrillic alike; "remove_diacritics 2" also
+# matches "ѝ" against "и", which Bulgarian text uses interchangeably.
+_FTS_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, description, location,
+        content='properties', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON properties BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, description, location)
+        VALUES (new.id, new.title, new.description, new.location);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON properties BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description, location)
+        VALUES ('delete', old.id, old.title, old.description, old.location);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF title, description, location
+    ON properties BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description, location)
+        VALUES ('delete', old.id, old.title, old.description, old.location);
+        INSERT INTO {FTS_TABLE}(rowid, title, description, location)
+        VALUES (new.id, new.title, new.description, new.location);
+    END
+    """,
+]
+
+_TOKEN_RE = re.compile(r"[^\W_]+")
+
+# Ordered property ids per search page, keyed by the normalized filters. Listings are
+# loaded fresh by primary key on every hit, so only changes to which listings match
+# (not to their images or details) need to invalidate it.
+RESULT_CACHE_SIZE = 1024
+RESULT_CACHE_TTL = 60
+result_cache = TTLCache(maxsize=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL)
+
+
+def tokenize(value: Optional[str]) -> List[str]:
+    """Splits free text into lower-cased word tokens (Latin and Cyrillic)."""
+    return [token.lower() for token in _TOKEN_RE.findall(value or "")]
+
+
+def uses_fts(bind) -> bool:
+    """Whether queries against this engine/connection can use the FTS5 index."""
+    return getattr(bind.dialect, "name", None) == "sqlite"
+
+
+def setup_search_index(engine):
+    """Creates the FTS5 index and its sync triggers, backfilling existing rows."""
+    if not uses_fts(engine):
+        return
+
+    with engine.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": FTS_TABLE}
+        ).first()
+        for statement in _FTS_DDL:
+            conn.execute(text(statement))
+        if not exists:
+            conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+
+def _match_terms(tokens: List[str]) -> str:
+    """Builds an FTS5 prefix query; tokens are quoted so user input is never parsed as syntax."""
+    return " AND ".join(f'"{token}"*' for token in tokens)
+
+
+def build_match_expression(
+        q: Optional[str] = None,
+        title: Optional[str] = None,
+        location: Optional[str] = None
+) -> Optional[str]:
+    """Combines the free-text and per-column filters into one FTS5 MATCH expression."""
+    clauses = []
+    for column, value in (("title", title), ("location", location)):
+        tokens = tokenize(value)
+        if tokens:
+            clauses.append(f"{column} : ({_match_terms(tokens)})")
+
+    tokens = tokenize(q)
+    if tokens:
+        clauses.append(f"({_match_terms(tokens)})")
+
+    return " AND ".join(clauses) or None
+
+
+def _fallback_filter(q, title, location):
+    """Token-wise ILIKE conditions for backends without FTS5."""
+    conditions = [models.Property.title.ilike(f"%{token}%") for token in tokenize(title)]
+    conditions += [models.Property.location.ilike(f"%{token}%") for token in tokenize(location)]
+    for token in tokenize(q):
+        pattern = f"%{token}%"
+        conditions.append(
+            models.Property.title.ilike(pattern)
+            | models.Property.description.ilike(pattern)
+            | models.Property.location.ilike(pattern)
+        )
+    return and_(*conditions) if conditions else None
+
+
+def apply_text_search(
+        query,
+        db,
+        q: Optional[str] = None,
+        title: Optional[str] = None,
+        location: Optional[str] = None
+):
+    """Restricts a Property query to listings matching the text filters.
+
+    Returns the filtered query and the bm25 relevance column (lower is better), or
+    None when there is nothing to rank by. Matches in the title are weighted above
+    the location and the description.
+    """
+    if not uses_fts(db.get_bind()):
+        condition = _fallback_filter(q, title, location)
+        return (query if condition is None else query.filter(condition)), None
+
+    match = build_match_expression(q, title, location)
+    if match is None:
+        return query, None
+
+    matches = text(
+        f"SELECT rowid AS property_id, "
+        f"bm25({FTS_TABLE}, {TITLE_WEIGHT}, {DESCRIPTION_WEIGHT}, {LOCATION_WEIGHT}) AS rank "
+        f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match"
+    ).bindparams(match=match).columns(property_id=Integer, rank=Float).subquery("fts_matches")
+
+    query = query.join(matches, matches.c.property_id == models.Property.id)
+    return query, (matches.c.rank if tokenize(q) else None)
+
+
+def filter_properties(
+        db,
+        q: Optional[str] = None,
+        title: Optional[str] = None,
+        prop_type: Optional[str] = None,
+        location: Optional[str] = None,
+        city: Optional[str] = None,
+        neighborhood: Optional[str] = None,
+        max_price: Optional[float] = None,
+        bbox: Optional[tuple] = None,
+        near: Optional[tuple] = None,
+        options=()
+):
+    """Builds the listing search shared by the API and the search page.
+
+    Only active, available listings of verified owners are returned; ``options`` are
+    the loader options (see loading.py) for what the caller renders. ``location`` is
+    matched as free text, ``city``/``neighborhood`` through the location dictionary
+    (see locations.py). ``bbox`` is a (south, west, north, east) box and ``near`` a
+    (lat, lng, radius_km) circle.
+
+    Returns the query and the computed sort columns it provides: "relevance" for
+    ranked text searches and "distance" for radius searches (see pagination.py).
+    """
+    query = db.query(models.Property).options(*options).join(models.User).filter(
+        models.User.is_verified, models.LISTED
+    )
+
+    if prop_type:
+        query = query.filter(models.Property.property_type == prop_type)
+    if max_price:
+        query = query.filter(models.Property.price <= max_price)
+    query = locations.apply_location_filter(query, db, city=city, neighborhood=neighborhood)
+
+    computed = {}
+    if bbox:
+        query = geo.apply_bbox(query, db, *bbox)
+    if near:
+        query, computed[pagination.DISTANCE] = geo.apply_radius(query, db, *near)
+
+    query, rank = apply_text_search(query, db, q=q, title=title, location=location)
+    if rank is not None:
+        computed[pagination.RELEVANCE] = rank
+    return query, computed
+
+
+def cache_key(filters: dict, sort: Optional[str], limit: int, cursor: Optional[str]) -> tuple:
+    """Normalizes search parameters so equivalent searches share a cache entry."""
+    normalized = {}
+    for name, value in filters.items():
+        if name in ("q", "title", "location"):
+            value = " ".join(tokenize(value))
+        elif name in ("city", "neighborhood"):
+            value = locations.normalize(value)
+        if value:
+            normalized[name] = value
+    return tuple(sorted(normalized.items())), sort or "", limit, cursor or ""
+
+
+def invalidate_results():
+    """Drops cached search results; call after writes that change which listings match."""
+    result_cache.clear()
+
+
+def _load_by_ids(db, ids: List[int], options):
+    """Loads listings by primary key, preserving the cached order."""
+    if not ids:
+        return []
+    rows = db.query(models.Property).options(*options).filter(models.Property.id.in_(ids)).all()
+    by_id = {prop.id: prop for prop in rows}
+    return [by_id[prop_id] for prop_id in ids if prop_id in by_id]
+
+
+def search_page(
+        db,
+        sort: Optional[str] = None,
+        limit: int = pagination.DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None,
+        options=(),
+        **filters
+):
+    """Runs a listing search (see filter_properties) and returns one page and the next cursor.
+
+    Results go through result_cache: a hit costs a primary-key lookup instead of the search.
+    """
+    key = cache_key(filters, sort, limit, cursor)
+    cached = result_cache.get(key)
+    if cached is not None:
+        ids, next_cursor = cached
+        return _load_by_ids(db, ids, options), next_cursor
+
+    generation = result_cache.generation
+    query, computed = filter_properties(db, options=options, **filters)
+    sort = pagination.resolve_sort(sort, computed)
+    items, next_cursor = pagination.paginate(query, sort, limit, cursor, computed=computed)
+
+    result_cache.set(key, ([prop.id for prop in items], next_cursor), generation)
+    return items, next_cursor
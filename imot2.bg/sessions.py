@@ -0,0 +1,236 @@
+"""Signed, expiring session tokens.
+
+Login issues a JWT (HS256) in the ``session`` cookie carrying the user's id,
+username, role and verification status, so authentication and role checks need
+no database lookup. Each token names its signing key in the ``kid`` header. Keys
+come from IMOT2_SESSION_KEYS as ``kid:secret,kid:secret``; the first one signs new
+tokens and the others are only accepted, so a key is rotated by putting a new one
+first and dropping the old one once its tokens have expired.
+
+Logout revokes its token, and changing a user's verification revokes every token
+issued to the user before. Revocations are stored in ``revoked_sessions`` and held
+in memory; each process re-reads them every REVOCATION_REFRESH_SECONDS, so a
+revocation made by another worker takes effect within that time. A worker's own
+revocations are applied to its copy once the transaction recording them commits.
+Checking a token only touches the database when the copy is due for a reload, so
+authenticate_async() runs on the event loop without a threadpool hop.
+"""
+import logging
+import os
+import secrets
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+from jose import JWTError, jwt
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+import models
+from database import same_database
+
+logger = logging.getLogger(__name__)
+
+COOKIE_NAME = "session"
+ALGORITHM = "HS256"
+SESSION_TTL_SECONDS = 12 * 60 * 60
+REVOCATION_REFRESH_SECONDS = 30
+KEYS_ENV = "IMOT2_SESSION_KEYS"
+# Session.info key of the in-memory revocations waiting for their transaction to commit.
+PENDING_REVOCATIONS = "pending_revocations"
+
+
+class InvalidSession(Exception):
+    """The token is malformed, forged, expired or signed with an unknown key."""
+
+
+@dataclass(frozen=True)
+class SessionUser:
+    """The user making a request, as stated by its session token."""
+    id: int
+    username: str
+    role: str
+    is_verified: bool
+    session_id: str
+    issued_at: float
+    expires_at: float
+
+
+def parse_keys(value: Optional[str]) -> Dict[str, str]:
+    """Parses ``kid:secret,kid:secret`` into {kid: secret}, keeping the order."""
+    keys = {}
+    for item in (value or "").split(","):
+        kid, _, secret = item.strip().partition(":")
+        if kid and secret:
+            keys[kid] = secret
+    return keys
+
+
+def _configured_keys() -> Dict[str, str]:
+    keys = parse_keys(os.environ.get(KEYS_ENV))
+    if not keys:
+        logger.warning("%s is not set; sessions will not survive a restart or work across workers", KEYS_ENV)
+        keys = {"local": secrets.token_urlsafe(32)}
+    return keys
+
+
+# kid -> secret; the first key signs.
+keys = _configured_keys()
+
+
+def issue(user: models.User) -> str:
+    """Signs a new session token for the user."""
+    kid, secret = next(iter(keys.items()))
+    now = time.time()
+    claims = {
+        "sub": str(user.id),
+        "name": user.username,
+        "role": user.role,
+        "verified": bool(user.is_verified),
+        "jti": secrets.token_hex(16),
+        "iat": now,
+        "exp": int(now + SESSION_TTL_SECONDS),
+    }
+    return jwt.encode(claims, secret, algorithm=ALGORITHM, headers={"kid": kid})
+
+
+def decode(token: str) -> SessionUser:
+    """Verifies a token's signature and expiry; raises InvalidSession."""
+    try:
+        secret = keys.get(jwt.get_unverified_header(token).get("kid"))
+        if secret is None:
+            raise InvalidSession("Unknown signing key")
+        claims = jwt.decode(token, secret, algorithms=[ALGORITHM])
+        return SessionUser(
+            id=int(claims["sub"]), username=claims["name"], role=claims["role"],
+            is_verified=bool(claims["verified"]), session_id=claims["jti"],
+            issued_at=float(claims["iat"]), expires_at=float(claims["exp"])
+        )
+    except (JWTError, KeyError, TypeError, ValueError) as error:
+        raise InvalidSession(str(error)) from error
+
+
+class RevocationList:
+    """Revoked sessions and per-user revocation times, mirrored from ``revoked_sessions``."""
+
+    def __init__(self, refresh_seconds: float = REVOCATION_REFRESH_SECONDS, clock=time.monotonic):
+        self.refresh_seconds = refresh_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        """Forgets the loaded revocations; the next check reloads them."""
+        with self._lock:
+            self._bind = None
+            self._loaded_at = None
+            self._session_ids = set()
+            self._users = {}
+            # (applied at, apply) for revocations made here, replayed over a reload that may predate them.
+            self._applied: List[Tuple[float, Callable]] = []
+
+    def _stale(self, bind) -> bool:
+        return (self._loaded_at is None or self._clock() - self._loaded_at >= self.refresh_seconds
+                or not same_database(self._bind, bind))
+
+    def _load(self, db):
+        # The query runs without the lock: on the event loop, another coroutine may check meanwhile.
+        started = self._clock()
+        session_ids, users = set(), {}
+        rows = db.query(models.RevokedSession).filter(models.RevokedSession.expires_at > time.time())
+        for row in rows:
+            if row.session_id:
+                session_ids.add(row.session_id)
+            elif row.user_id is not None:
+                users[row.user_id] = max(users.get(row.user_id, 0), row.revoked_at)
+        with self._lock:
+            self._bind, self._loaded_at = db.get_bind(), started
+            self._session_ids, self._users = session_ids, users
+            self._applied = [(applied_at, apply) for applied_at, apply in self._applied if applied_at >= started]
+            for _, apply in self._applied:
+                apply()
+
+    def _revoked(self, session: SessionUser) -> bool:
+        with self._lock:
+            return (session.session_id in self._session_ids
+                    or session.issued_at < self._users.get(session.id, float("-inf")))
+
+    def is_revoked(self, db, session: SessionUser) -> bool:
+        if self._stale(db.get_bind()):
+            self._load(db)
+        return self._revoked(session)
+
+    async def is_revoked_async(self, db: AsyncSession, session: SessionUser) -> bool:
+        """is_revoked() on an async session."""
+        if self._stale(db.get_bind()):
+            await db.run_sync(self._load)
+        return self._revoked(session)
+
+    def revoke(self, db, session: SessionUser):
+        """Revokes one token, in the caller's transaction."""
+        db.query(models.RevokedSession).filter(
+            models.RevokedSession.expires_at <= time.time()
+        ).delete(synchronize_session=False)
+        db.add(models.RevokedSession(
+            session_id=session.session_id, user_id=session.id,
+            revoked_at=time.time(), expires_at=session.expires_at
+        ))
+        self._after_commit(db, lambda: self._session_ids.add(session.session_id))
+
+    def revoke_user(self, db, user_id: int):
+        """Revokes every token issued to a user until now, in the caller's transaction."""
+        now = time.time()
+        db.add(models.RevokedSession(user_id=user_id, revoked_at=now, expires_at=now + SESSION_TTL_SECONDS))
+        self._after_commit(db, lambda: self._users.update({user_id: now}))
+
+    def _after_commit(self, db, apply):
+        """Applies a revocation to the loaded copy once the caller's transaction commits."""
+        bind = db.get_bind()
+
+        def applied():
+            with self._lock:
+                if same_database(self._bind, bind):
+                    apply()
+                    self._applied.append((self._clock(), apply))
+
+        db.info.setdefault(PENDING_REVOCATIONS, []).append(applied)
+
+
+revocations = RevocationList()
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending_revocations(db):
+    for apply in db.info.pop(PENDING_REVOCATIONS, []):
+        apply()
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_pending_revocations(db):
+    db.info.pop(PENDING_REVOCATIONS, None)
+
+
+def _request_session(request) -> Optional[SessionUser]:
+    token = request.cookies.get(COOKIE_NAME)
+    if not token:
+        return None
+    try:
+        return decode(token)
+    except InvalidSession:
+        return None
+
+
+def authenticate(request, db) -> Optional[SessionUser]:
+    """The user of a request, or None without a valid, unrevoked token."""
+    session = _request_session(request)
+    if session is None:
+        return None
+    return None if revocations.is_revoked(db, session) else session
+
+
+async def authenticate_async(request, db: AsyncSession) -> Optional[SessionUser]:
+    """authenticate() on an async session."""
+    session = _request_session(request)
+    if session is None:
+        return None
+    return None if await revocations.is_revoked_async(db, session) else session
@@ -0,0 +1,95 @@
+"""Serving of uploaded images with long-lived cache headers.
+
+Uploaded files never change once written: originals are named by the SHA-256 of
+their bytes (see storage.py), derivatives by the original's name, and older
+uploads by a random UUID. Responses are therefore marked ``immutable`` with a
+one-year max-age, so browsers and the CDN stop revalidating every photo. Files
+named by their checksum get a strong ETag derived from the name instead of
+Starlette's mtime/size one, which stays the same across servers and restores.
+
+A ``.br`` or ``.gz`` file next to the requested one is served instead when the
+client accepts that encoding. Range requests and If-None-Match / If-Modified-Since
+304s are handled by Starlette's FileResponse and StaticFiles.
+"""
+import mimetypes
+import os
+import re
+from typing import Optional, Tuple
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse
+from starlette.types import Scope
+
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Preferred first; the file extension of the precompressed copy for each encoding.
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+_CONTENT_ADDRESSED = re.compile(r"^[0-9a-f]{64}\.")
+
+
+def encoding_qualities(accept_encoding: Optional[str]) -> dict:
+    """Parses Accept-Encoding into {coding: q}."""
+    qualities = {}
+    for item in (accept_encoding or "").split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.lower()] = quality
+    return qualities
+
+
+def strong_etag(path: str, encoding: Optional[str] = None) -> Optional[str]:
+    """ETag of a content-addressed file, or None for files not named by their checksum."""
+    name = os.path.basename(path)
+    if not _CONTENT_ADDRESSED.match(name):
+        return None
+    return f'"{name}.{encoding}"' if encoding else f'"{name}"'
+
+
+def _precompressed(path: str, accept_encoding: Optional[str]) -> Tuple[Optional[str], Optional[str], bool]:
+    """Picks a precompressed copy of ``path``: (encoding, its path, whether any copy exists)."""
+    qualities = encoding_qualities(accept_encoding)
+    has_copies = False
+    for encoding, extension in ENCODINGS:
+        if not os.path.isfile(path + extension):
+            continue
+        has_copies = True
+        if qualities.get(encoding, qualities.get("*", 0)) > 0:
+            return encoding, path + extension, True
+    return None, None, has_copies
+
+
+class UploadedFiles(StaticFiles):
+    """StaticFiles for ``static/uploads`` with immutable caching and precompressed copies."""
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        headers = {"cache-control": CACHE_CONTROL}
+
+        encoding, encoded_path, has_copies = _precompressed(str(full_path), request_headers.get("accept-encoding"))
+        if has_copies:
+            headers["vary"] = "Accept-Encoding"
+        path = full_path
+        if encoding:
+            path, stat_result = encoded_path, os.stat(encoded_path)
+            headers["content-encoding"] = encoding
+        etag = strong_etag(str(full_path), encoding)
+        if etag:
+            headers["etag"] = etag
+
+        response = FileResponse(
+            path, status_code=status_code, stat_result=stat_result, headers=headers,
+            media_type=mimetypes.guess_type(str(full_path))[0]
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
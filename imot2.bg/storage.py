@@ -0,0 +1,204 @@
+"""Content-addressed storage for uploaded images.
+
+Files live under ``static/uploads/<aa>/<bb>/<sha256><ext>``, named by the SHA-256
+of their bytes, so a photo uploaded for many listings is stored once. Each stored
+file has a ``stored_files`` row whose ``ref_count`` is the number of
+``PropertyImage`` rows pointing at it.
+
+Requests never delete stored files: an upload of the same bytes may already have
+moved its file into place without having committed its reference yet. A row whose
+last reference goes away stays at ``ref_count`` 0, and collect_garbage() deletes
+it, with the file and its derivatives, once the file has not been touched for
+``min_age`` seconds. It also removes files that no row refers to, such as those
+left behind by a failed or crashed upload.
+"""
+import dataclasses
+import logging
+import os
+import re
+import time
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional
+import aiofiles.os
+from sqlalchemy.exc import IntegrityError
+import images
+import models
+import uploads
+
+logger = logging.getLogger(__name__)
+
+GC_BATCH_SIZE = 500
+# Younger files may belong to an upload whose transaction has not committed yet.
+GC_MIN_AGE_SECONDS = 3600
+ORPHAN_SAMPLE_SIZE = 100
+
+_CONTENT_ADDRESSED = re.compile(r"^([0-9a-f]{64})\.")
+
+
+def content_path(sha256: str, extension: str, root: Optional[str] = None) -> str:
+    """Where a file with the given checksum is stored."""
+    return os.path.join(root or uploads.UPLOAD_DIR, sha256[:2], sha256[2:4], f"{sha256}{extension}")
+
+
+async def store(upload: uploads.StoredUpload) -> uploads.StoredUpload:
+    """Moves a freshly streamed upload to its content address.
+
+    If the same bytes are already stored, the existing file is simply replaced by
+    an identical one, which is atomic and leaves readers unaffected.
+    """
+    target = content_path(upload.sha256, os.path.splitext(upload.path)[1])
+    await aiofiles.os.makedirs(os.path.dirname(target), exist_ok=True)
+    await aiofiles.os.replace(upload.path, target)
+    return dataclasses.replace(upload, path=target, url=f"/{target}")
+
+
+def _add_reference(db, sha256: str) -> int:
+    return db.query(models.StoredFile).filter(models.StoredFile.sha256 == sha256).update(
+        {models.StoredFile.ref_count: models.StoredFile.ref_count + 1}, synchronize_session=False
+    )
+
+
+def acquire(db, upload: uploads.StoredUpload) -> models.StoredFile:
+    """Records one more reference to a stored file, creating its row on first use.
+
+    Joins the caller's transaction; the reference is kept only if the caller commits.
+    """
+    if not _add_reference(db, upload.sha256):
+        try:
+            with db.begin_nested():
+                db.add(models.StoredFile(
+                    sha256=upload.sha256, path=upload.path, content_type=upload.content_type,
+                    size_bytes=upload.size, ref_count=1
+                ))
+        except IntegrityError:
+            # Stored concurrently by another request.
+            _add_reference(db, upload.sha256)
+    return db.query(models.StoredFile).populate_existing().filter(
+        models.StoredFile.sha256 == upload.sha256
+    ).one()
+
+
+def files_of(stored: models.StoredFile) -> List[str]:
+    """Paths of a stored file and of all its derivatives."""
+    return [stored.path] + images.derivative_paths(stored.path)
+
+
+def release(db, image: models.PropertyImage):
+    """Drops the reference of an image that is being deleted, in the caller's transaction.
+
+    The row is kept at ``ref_count`` 0 for collect_garbage(), so that an upload
+    of the same bytes in flight can still acquire it.
+    """
+    db.query(models.StoredFile).filter(models.StoredFile.sha256 == image.sha256).update(
+        {models.StoredFile.ref_count: models.StoredFile.ref_count - 1}, synchronize_session=False
+    )
+
+
+def delete_paths(paths: Iterable[str]) -> int:
+    """Deletes files, logging the ones that cannot be removed; returns how many were deleted."""
+    deleted = 0
+    for path in paths:
+        try:
+            os.remove(path)
+            deleted += 1
+        except FileNotFoundError:
+            pass
+        except OSError:
+            logger.warning("Could not delete stored file %s", path, exc_info=True)
+    return deleted
+
+
+def _uploaded_files(root: str) -> Iterator[str]:
+    for directory, _, names in os.walk(root):
+        for name in sorted(names):
+            if not name.startswith("."):
+                yield os.path.join(directory, name)
+
+
+def _legacy_references(db, batch_size: int) -> set:
+    """Paths of the files and derivatives of images stored before content addressing."""
+    referenced = set()
+    urls = db.query(models.PropertyImage.url).filter(
+        models.PropertyImage.sha256.is_(None), models.PropertyImage.url.isnot(None)
+    ).yield_per(batch_size)
+    for (url,) in urls:
+        path = url.lstrip("/")
+        referenced.update(os.path.abspath(each) for each in [path] + images.derivative_paths(path))
+    return referenced
+
+
+def _referenced(db, checksums: set) -> set:
+    return {sha256 for (sha256,) in db.query(models.StoredFile.sha256).filter(
+        models.StoredFile.sha256.in_(checksums), models.StoredFile.ref_count > 0
+    )} if checksums else set()
+
+
+def _forget(db, checksums: set) -> set:
+    """Deletes the unreferenced rows of ``checksums``; returns those referenced again meanwhile."""
+    if checksums:
+        db.query(models.StoredFile).filter(
+            models.StoredFile.sha256.in_(checksums), models.StoredFile.ref_count <= 0
+        ).delete(synchronize_session=False)
+        db.commit()
+    return _referenced(db, checksums)
+
+
+def collect_garbage(db, root: Optional[str] = None, batch_size: int = GC_BATCH_SIZE,
+                    min_age: float = GC_MIN_AGE_SECONDS, dry_run: bool = False) -> dict:
+    """Finds files under the uploads directory that no image refers to and, unless dry_run, deletes them.
+
+    Content-addressed files are checked against the ``stored_files`` rows with
+    references, and older files against ``property_images``, a batch of files at a
+    time. Files modified in the last ``min_age`` seconds are left alone. The
+    unreferenced rows of the removed files are deleted as well. Returns counts and
+    a sample of the orphaned paths.
+    """
+    root = root or uploads.UPLOAD_DIR
+    cutoff = time.time() - min_age
+    legacy = _legacy_references(db, batch_size)
+    report = {"scanned": 0, "orphaned": 0, "removed": 0, "freed_bytes": 0, "orphans": []}
+
+    files = _uploaded_files(root)
+    while batch := list(islice(files, batch_size)):
+        report["scanned"] += len(batch)
+        candidates = {}
+        for path in batch:
+            try:
+                stat_result = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if stat_result.st_mtime <= cutoff:
+                match = _CONTENT_ADDRESSED.match(os.path.basename(path))
+                candidates[path] = (match.group(1) if match else None, stat_result.st_size)
+
+        checksums = {sha256 for sha256, _ in candidates.values() if sha256}
+        stored = _referenced(db, checksums)
+        db.rollback()
+        orphans = {path: candidate for path, candidate in candidates.items()
+                   if not ((candidate[0] in stored) if candidate[0] else (os.path.abspath(path) in legacy))}
+        # Rows are deleted only while unreferenced; a file acquired since the check above is kept.
+        revived = set() if dry_run else _forget(db, {sha256 for sha256, _ in orphans.values() if sha256} - stored)
+
+        for path, (sha256, size) in orphans.items():
+            if sha256 in revived:
+                continue
+            report["orphaned"] += 1
+            if len(report["orphans"]) < ORPHAN_SAMPLE_SIZE:
+                report["orphans"].append(path)
+            if dry_run:
+                continue
+            try:
+                # The same bytes may have been uploaded again since the check.
+                if os.stat(path).st_mtime > cutoff:
+                    continue
+            except FileNotFoundError:
+                continue
+            if delete_paths([path]):
+                report["removed"] += 1
+                report["freed_bytes"] += size
+
+    logger.info(
+        "Upload GC scanned %d files, found %d orphans, removed %d (%d bytes)",
+        report["scanned"], report["orphaned"], report["removed"], report["freed_bytes"]
+    )
+    return report
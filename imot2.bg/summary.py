@@ -0,0 +1,167 @@
+"""Incrementally maintained per-listing summary (ratings, bookings, cover image).
+
+Cards and detail pages read review/booking counts, the average rating and the
+cover image from one ``property_summary`` row instead of aggregating reviews,
+bookings and images per listing. The write paths adjust the row in the same
+transaction as the change itself, with atomic ``SET x = x + n`` updates, and
+rebuild() recomputes rows from the source tables for backfills and repairs.
+"""
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import JSON, case, func, insert, type_coerce
+import models
+
+REBUILD_BATCH_SIZE = 500
+DECLINED = "declined"
+
+
+def property_created(prop: models.Property):
+    """Attaches an empty summary to a new listing; it is inserted with the listing."""
+    prop.summary = models.PropertySummary(
+        review_count=0, rating_total=0, booking_count=0, image_count=0
+    )
+
+
+def _adjust(db, property_id: int, cover: Optional[models.PropertyImage] = None, replace_cover: bool = False,
+            **deltas):
+    """Applies counter deltas to a listing's summary, recomputing it if the row is missing.
+
+    ``cover`` becomes the listing's cover if it has none yet, or in any case with ``replace_cover``.
+    """
+    values = {
+        getattr(models.PropertySummary, name): getattr(models.PropertySummary, name) + delta
+        for name, delta in deltas.items()
+    }
+    if cover is not None:
+        url, variants = cover.url, type_coerce(cover.variants, JSON)
+        if not replace_cover:
+            has_cover = models.PropertySummary.cover_image_url.isnot(None)
+            url = case((has_cover, models.PropertySummary.cover_image_url), else_=url)
+            variants = case((has_cover, models.PropertySummary.cover_image_variants), else_=variants)
+        values[models.PropertySummary.cover_image_url] = url
+        values[models.PropertySummary.cover_image_variants] = variants
+
+    updated = db.query(models.PropertySummary).filter(
+        models.PropertySummary.property_id == property_id
+    ).update(values, synchronize_session=False)
+    if not updated:
+        db.flush()
+        rebuild_rows(db, [property_id])
+
+
+def review_added(db, review: models.Review):
+    _adjust(db, review.property_id, review_count=1, rating_total=review.rating)
+
+
+def review_removed(db, review: models.Review):
+    _adjust(db, review.property_id, review_count=-1, rating_total=-review.rating)
+
+
+def booking_added(db, booking: models.Booking):
+    if booking.status != DECLINED:
+        _adjust(db, booking.property_id, booking_count=1)
+
+
+def booking_status_changed(db, booking: models.Booking, old_status: str):
+    """Keeps the booking count in step when a booking is declined or re-confirmed."""
+    was_counted, is_counted = old_status != DECLINED, booking.status != DECLINED
+    if was_counted != is_counted:
+        _adjust(db, booking.property_id, booking_count=1 if is_counted else -1)
+
+
+def image_added(db, image: models.PropertyImage):
+    """Counts a new image; an image flagged as cover, or the first image of a listing, becomes its cover."""
+    _adjust(db, image.property_id, cover=image, replace_cover=bool(image.is_cover), image_count=1)
+
+
+def image_variants_ready(db, image: models.PropertyImage):
+    """Copies the derivatives of a listing's cover image onto its summary."""
+    db.query(models.PropertySummary).filter(
+        models.PropertySummary.property_id == image.property_id,
+        models.PropertySummary.cover_image_url == image.url
+    ).update({models.PropertySummary.cover_image_variants: image.variants}, synchronize_session=False)
+
+
+def compute(db, property_ids: Iterable[int]) -> Dict[int, dict]:
+    """Summary values of the given listings, aggregated from the source tables."""
+    property_ids = list(property_ids)
+    rows = {
+        prop_id: {"review_count": 0, "rating_total": 0, "booking_count": 0, "image_count": 0,
+                  "cover_image_url": None, "cover_image_variants": None}
+        for prop_id in property_ids
+    }
+
+    reviews = db.query(
+        models.Review.property_id, func.count(), func.coalesce(func.sum(models.Review.rating), 0)
+    ).filter(models.Review.property_id.in_(property_ids)).group_by(models.Review.property_id)
+    for prop_id, count, total in reviews:
+        rows[prop_id].update(review_count=count, rating_total=total)
+
+    bookings = db.query(models.Booking.property_id, func.count()).filter(
+        models.Booking.property_id.in_(property_ids),
+        func.coalesce(models.Booking.status, "") != DECLINED
+    ).group_by(models.Booking.property_id)
+    for prop_id, count in bookings:
+        rows[prop_id]["booking_count"] = count
+
+    images = db.query(
+        models.PropertyImage.property_id, models.PropertyImage.url, models.PropertyImage.variants
+    ).filter(models.PropertyImage.property_id.in_(property_ids)).order_by(
+        models.PropertyImage.property_id, *models.COVER_ORDER
+    )
+    for prop_id, url, variants in images:
+        row = rows[prop_id]
+        if not row["image_count"]:
+            row.update(cover_image_url=url, cover_image_variants=variants)
+        row["image_count"] += 1
+
+    return rows
+
+
+def rebuild_rows(db, property_ids: List[int]):
+    """Replaces the summaries of the given listings; does not commit."""
+    rows = compute(db, property_ids)
+    db.query(models.PropertySummary).filter(
+        models.PropertySummary.property_id.in_(property_ids)
+    ).delete(synchronize_session=False)
+    if rows:
+        db.execute(insert(models.PropertySummary), [
+            {"property_id": prop_id, **values} for prop_id, values in rows.items()
+        ])
+
+
+def _property_id_batches(db, batch_size: int):
+    last_id = 0
+    while True:
+        ids = [row[0] for row in db.query(models.Property.id).filter(
+            models.Property.id > last_id
+        ).order_by(models.Property.id).limit(batch_size)]
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
+
+
+def rebuild(db, batch_size: int = REBUILD_BATCH_SIZE) -> int:
+    """Recomputes every listing summary, committing per batch; returns the number of listings."""
+    rebuilt = 0
+    for ids in _property_id_batches(db, batch_size):
+        rebuild_rows(db, ids)
+        db.commit()
+        rebuilt += len(ids)
+    return rebuilt
+
+
+def check(db, batch_size: int = REBUILD_BATCH_SIZE) -> List[int]:
+    """Ids of listings whose stored summary is missing or differs from the source tables."""
+    mismatched = []
+    for ids in _property_id_batches(db, batch_size):
+        stored = {
+            row.property_id: row for row in db.query(models.PropertySummary).filter(
+                models.PropertySummary.property_id.in_(ids)
+            )
+        }
+        for prop_id, expected in compute(db, ids).items():
+            row = stored.get(prop_id)
+            if row is None or any(getattr(row, name) != value for name, value in expected.items()):
+                mismatched.append(prop_id)
+    return mismatched
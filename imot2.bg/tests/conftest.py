@@ -0,0 +1,139 @@
+"""Fixtures shared by the test modules: a fresh database for each test.
+
+``engine`` is an in-memory SQLite database with the application's schema.
+Routers on the async engine cannot see an in-memory database, so tests of those
+use ``shared_engine`` (a file) together with ``async_db``, which points
+get_async_db at it.
+
+With IMOT2_DATABASE_URL set, e.g. to a PostgreSQL database, every test runs on
+that database instead. Point it at a scratch database: its tables are dropped
+before and after each test. Tests marked ``sqlite`` check SQLite specifics
+(query plans, FTS5 and R*Tree tables) and are skipped on other backends.
+The database should use a UTF-8 ctype (e.g. ``LC_CTYPE=C.UTF-8``), so that
+ILIKE folds Cyrillic.
+"""
+import os
+import pytest
+from sqlalchemy import MetaData, create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import close_all_sessions
+from sqlalchemy.pool import NullPool, StaticPool
+from main import app
+from database import DATABASE_URL_ENV, async_url, get_async_db, make_engine
+import geo
+import migrations
+import models
+import recommendations
+import search
+import sessions
+
+DATABASE_URL = os.environ.get(DATABASE_URL_ENV)
+
+# Tests insert rows with small explicit ids; sequences on other backends start above them.
+FIRST_GENERATED_ID = 1000
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "sqlite: relies on SQLite specifics; skipped on other databases")
+
+
+def pytest_runtest_setup(item):
+    if item.get_closest_marker("sqlite") and DATABASE_URL and make_url(DATABASE_URL).get_backend_name() != "sqlite":
+        pytest.skip(f"needs SQLite, {DATABASE_URL_ENV} is {make_url(DATABASE_URL).get_backend_name()}")
+
+
+def _drop_tables(engine):
+    if engine.dialect.name != "sqlite":
+        tables = MetaData()
+        tables.reflect(engine)
+        tables.drop_all(engine)
+        return
+    # The FTS5 and R*Tree tables are not models; dropping them also drops their shadow tables.
+    with engine.begin() as conn:
+        for table in (search.FTS_TABLE, geo.RTREE_TABLE):
+            conn.exec_driver_sql(f"DROP TABLE IF EXISTS {table}")
+    models.Base.metadata.drop_all(engine)
+
+
+def _migrate(engine):
+    migrations.migrate(engine)
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as conn:
+        for table in models.Base.metadata.sorted_tables:
+            if table.autoincrement_column is not None:
+                conn.execute(
+                    text("SELECT setval(pg_get_serial_sequence(:table, :column), :start, false)"),
+                    {"table": table.name, "column": table.autoincrement_column.name, "start": FIRST_GENERATED_ID}
+                )
+
+
+def _configured_engine():
+    engine = make_engine(DATABASE_URL)
+    _drop_tables(engine)
+    return engine
+
+
+def _dispose(engine):
+    if DATABASE_URL:
+        # A session a test left open would hold locks that DROP TABLE waits for.
+        close_all_sessions()
+        _drop_tables(engine)
+    engine.dispose()
+
+
+@pytest.fixture(autouse=True)
+def forget_loaded_data():
+    """Clears the in-process copies of database data, which would match the next test's database by URL."""
+    yield
+    recommendations.index.clear()
+    sessions.revocations.clear()
+
+
+@pytest.fixture
+def empty_engine():
+    """A database without any tables: in memory, or IMOT2_DATABASE_URL emptied."""
+    if DATABASE_URL:
+        engine = _configured_engine()
+    else:
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    yield engine
+    _dispose(engine)
+
+
+@pytest.fixture
+def engine(empty_engine):
+    """An in-memory database with the application's schema."""
+    _migrate(empty_engine)
+    return empty_engine
+
+
+@pytest.fixture
+def shared_engine(tmp_path):
+    """A database with the application's schema that the async engine can reach too.
+
+    A file under tmp_path, or IMOT2_DATABASE_URL.
+    """
+    if DATABASE_URL:
+        engine = _configured_engine()
+    else:
+        engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False})
+    _migrate(engine)
+    yield engine
+    _dispose(engine)
+
+
+@pytest.fixture
+def async_db(shared_engine):
+    """Serves get_async_db from shared_engine's database; yields the async session factory."""
+    async_engine = create_async_engine(async_url(shared_engine.url), poolclass=NullPool)
+    sessions = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    async def override():
+        async with sessions() as session:
+            yield session
+
+    app.dependency_overrides[get_async_db] = override
+    yield sessions
+    app.dependency_overrides.pop(get_async_db, None)
@@ -5,6 +5,8 @@ from main import app
 from database import get_db
 from routers.auth import get_current_user
 import models
+import ratelimit
+import sessions
 
 client = TestClient(app)
 
@@ -27,6 +29,8 @@ def mock_client_user():
 def clean_overrides():
     yield
     app.dependency_overrides.clear()
+    ratelimit.reset()
+    client.cookies.clear()
 
 
 @patch("routers.auth.pwd_context.hash")
@@ -65,13 +69,13 @@ def test_login_success():
 
         response = client.post("/auth/login", json={"username": "tester", "password": "password"})
         assert response.status_code == 200
-        assert response.cookies.get("username") == "tester"
+        assert sessions.decode(response.cookies.get(sessions.COOKIE_NAME)).username == "tester"
 
 
 def test_logout():
     response = client.get("/auth/logout", follow_redirects=False)
     assert response.status_code == 303
-    assert 'username=""' in response.headers.get("set-cookie", "")
+    assert 'session=""' in response.headers.get("set-cookie", "")
 
 
 def test_get_admin_stats():
@@ -156,4 +160,4 @@ def test_admin_get_all_bookings_success():
 
     response = client.get("/admin/bookings")
     assert response.status_code == 200
-    assert isinstance(response.json(), list)
\ No newline at end of file
+    assert isinstance(response.json(), list)
\ No newline at end of file
@@ -1,9 +1,13 @@
+import asyncio
 import pytest
 from unittest.mock import MagicMock, patch
 from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
 from main import app
 from database import get_db
 import models
+import ratelimit
+import sessions
 
 client = TestClient(app)
 
@@ -12,6 +16,9 @@ client = TestClient(app)
 def clean_overrides():
     yield
     app.dependency_overrides.clear()
+    sessions.revocations.clear()
+    ratelimit.reset()
+    client.cookies.clear()
 
 
 @patch("routers.auth.pwd_context.hash")
@@ -78,13 +85,14 @@ def test_login_success():
         from routers.auth import pwd_context
         mp.setattr(pwd_context, "verify", lambda p, h: True)
 
-        fake_user = models.User(username="testuser", hashed_password="hashed")
+        fake_user = models.User(id=1, username="testuser", role="client", is_verified=True, hashed_password="hashed")
         mock_db.query.return_value.filter.return_value.first.return_value = fake_user
 
         response = client.post("/auth/login", json={"username": "testuser", "password": "password"})
 
         assert response.status_code == 200
-        assert response.cookies.get("username") == "testuser"
+        session = sessions.decode(response.cookies.get(sessions.COOKIE_NAME))
+        assert (session.id, session.username, session.role, session.is_verified) == (1, "testuser", "client", True)
         assert response.json()["message"] == "Login successful"
 
 
@@ -103,7 +111,7 @@ def test_logout():
     response = client.get("/auth/logout", follow_redirects=False)
     assert response.status_code == 303
     cookies = response.headers.get("set-cookie", "")
-    assert 'username=""' in cookies or 'Max-Age=0' in cookies
+    assert 'session=""' in cookies or 'Max-Age=0' in cookies
 
 
 def test_get_current_user_no_cookie():
@@ -112,5 +120,38 @@ def test_get_current_user_no_cookie():
     mock_request.cookies = {}
 
     with pytest.raises(Exception) as exc:
-        get_current_user(request=mock_request, db=MagicMock())
-    assert "401" in str(exc.value)
\ No newline at end of file
+        asyncio.run(get_current_user(request=mock_request, db=MagicMock()))
+    assert "401" in str(exc.value)
+
+
+@pytest.fixture
+def db_session(shared_engine, async_db):
+    db = sessionmaker(bind=shared_engine)()
+    db.add_all([
+        models.User(id=1, username="admin", email="admin@test.com", role="admin", is_verified=True),
+        models.User(id=2, username="agent", email="agent@test.com", first_name="Ivan", last_name="Ivanov",
+                    role="agent", is_verified=False),
+    ])
+    db.commit()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def test_verification_revokes_sessions(db_session):
+    app.dependency_overrides[get_db] = lambda: db_session
+    agent = db_session.get(models.User, 2)
+    assert agent.is_verified is False
+    agent_token = sessions.issue(agent)
+    admin_token = sessions.issue(db_session.get(models.User, 1))
+    db_session.expunge_all()
+
+    client.cookies.set(sessions.COOKIE_NAME, admin_token)
+    response = client.patch("/admin/verify/2")
+
+    assert response.status_code == 200
+    db_session.expunge_all()
+    assert db_session.get(models.User, 2).is_verified is True
+    client.cookies.set(sessions.COOKIE_NAME, agent_token)
+    assert client.get("/messages/inbox").status_code == 401
@@ -0,0 +1,129 @@
+import io
+import pytest
+from PIL import Image
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+from main import app
+from database import get_db
+from routers.auth import get_current_user
+import baseline
+import models
+import search
+import storage
+import uploads
+
+
+def photo(color):
+    buffer = io.BytesIO()
+    Image.new("RGB", (400, 300), color).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+@pytest.fixture(autouse=True)
+def clean_overrides():
+    yield
+    app.dependency_overrides.clear()
+    search.invalidate_results()
+
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOAD_DIR", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def db_session(engine):
+    db = sessionmaker(bind=engine)()
+    db.add(models.User(id=1, username="agent", email="agent@test.com", role="agent", is_verified=True))
+    db.add(models.Property(id=1, title="Студио", price=500, property_type="rent", location="София", owner_id=1,
+                           summary=models.PropertySummary(review_count=0, rating_total=0, booking_count=0,
+                                                          image_count=0)))
+    db.commit()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def client(db_session, upload_dir):
+    app.dependency_overrides[get_db] = lambda: db_session
+    app.dependency_overrides[get_current_user] = lambda: db_session.get(models.User, 1)
+    return TestClient(app)
+
+
+def upload_gallery(client, contents, cover=None):
+    files = [("files", (f"p{index}.jpg", content, "image/jpeg")) for index, content in enumerate(contents)]
+    data = {} if cover is None else {"cover": str(cover)}
+    return client.post("/properties/1/images", files=files, data=data)
+
+
+def test_gallery_is_saved_in_order_with_cover(client, db_session):
+    response = upload_gallery(client, [photo("red"), photo("green"), photo("blue")], cover=1)
+
+    assert response.status_code == 200
+    uploaded = response.json()
+    assert [(image["position"], image["is_cover"]) for image in uploaded] == [(0, False), (1, True), (2, False)]
+    db_session.expire_all()
+    row = db_session.get(models.PropertySummary, 1)
+    assert (row.image_count, row.cover_image_url) == (3, uploaded[1]["url"])
+    assert [image["url"] for image in client.get("/properties/1").json()["images"]] == [
+        uploaded[1]["url"], uploaded[0]["url"], uploaded[2]["url"]
+    ]
+
+
+def test_next_gallery_is_appended_and_can_move_cover(client, db_session):
+    first = upload_gallery(client, [photo("red"), photo("green")], cover=0).json()
+    second = upload_gallery(client, [photo("blue")], cover=0).json()
+
+    assert second[0]["position"] == 2
+    db_session.expire_all()
+    covers = db_session.query(models.PropertyImage).filter(models.PropertyImage.is_cover == True).all()
+    assert [image.id for image in covers] == [second[0]["id"]]
+    assert db_session.get(models.PropertySummary, 1).cover_image_url == second[0]["url"]
+    assert db_session.get(models.Property, 1).images[0].id == second[0]["id"]
+    assert first[0]["url"] != second[0]["url"]
+
+
+def test_rejected_file_saves_nothing(client, db_session, upload_dir):
+    files = [("files", ("ok.jpg", photo("red"), "image/jpeg")), ("files", ("notes.txt", b"hello", "text/plain"))]
+
+    response = client.post("/properties/1/images", files=files)
+
+    assert response.status_code == 415
+    assert db_session.query(models.PropertyImage).count() == 0
+    assert db_session.query(models.StoredFile).count() == 0
+    assert storage.collect_garbage(db_session, root=str(upload_dir), min_age=0)["removed"] == 1
+    assert [path for path in upload_dir.rglob("*") if path.is_file()] == []
+
+
+def test_gallery_size_and_cover_are_validated(client, monkeypatch):
+    monkeypatch.setattr(uploads, "MAX_BATCH_FILES", 2)
+
+    assert upload_gallery(client, [photo("red")] * 3).status_code == 400
+    assert upload_gallery(client, [photo("red")], cover=1).status_code == 400
+
+
+def test_existing_images_are_numbered_in_upload_order(db_session):
+    db_session.add_all([models.PropertyImage(property_id=1, url=f"static/uploads/{name}.jpg") for name in "abc"])
+    db_session.commit()
+
+    baseline._number_images(db_session.get_bind())
+
+    db_session.expire_all()
+    assert [(image.url, image.position) for image in db_session.get(models.Property, 1).images] == [
+        ("static/uploads/a.jpg", 0), ("static/uploads/b.jpg", 1), ("static/uploads/c.jpg", 2)
+    ]
+
+
+def test_gallery_body_is_capped_before_parsing(client, db_session, upload_dir, monkeypatch):
+    monkeypatch.setattr(uploads, "CHUNK_SIZE", 64)
+    monkeypatch.setattr(uploads, "MAX_UPLOAD_BYTES", 100)
+
+    # Each file is within the limit; parsed, the request would fail on the file count (400) instead.
+    response = upload_gallery(client, [b"\xff\xd8\xff" + b"\x00" * 90] * (uploads.MAX_BATCH_FILES + 5))
+
+    assert response.status_code == 413
+    assert db_session.query(models.PropertyImage).count() == 0
+    assert [path for path in upload_dir.rglob("*") if path.is_file()] == []
@@ -1,9 +1,8 @@
 import pytest
-from unittest.mock import MagicMock
 from fastapi.testclient import TestClient
-from datetime import datetime, date
+from datetime import datetime
+from sqlalchemy.orm import sessionmaker
 from main import app
-from database import get_db
 from routers.auth import get_current_user
 import models
 
@@ -24,40 +23,49 @@ def clean_overrides():
     app.dependency_overrides.clear()
 
 
-def test_create_booking_success():
-    mock_db = MagicMock()
-    app.dependency_overrides[get_db] = lambda: mock_db
+@pytest.fixture
+def db_session(shared_engine, async_db):
+    db = sessionmaker(bind=shared_engine)()
+    db.add_all([
+        models.User(id=1, username="agent_pro", email="agent@test.com", role="agent", is_verified=True),
+        models.User(id=2, username="buyer", email="buyer@test.com", role="client", is_verified=True),
+        models.User(id=99, username="other", email="other@test.com", role="agent", is_verified=True),
+        models.Property(id=10, title="Lux Apartment", price=1000, property_type="rent", location="София",
+                        owner_id=1),
+        models.Property(id=11, title="Foreign", price=1000, property_type="rent", location="София", owner_id=99),
+    ])
+    db.commit()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def test_create_booking_success(db_session):
     app.dependency_overrides[get_current_user] = mock_client
 
-    mock_db.query.return_value.filter.return_value.first.side_effect = [
-        models.Property(id=10, title="Lux Apartment", owner_id=1),
-        None
-    ]
-
-    def mock_add(obj):
-        obj.id = 1
-        obj.status = "pending"
-        obj.booking_date = datetime(2026, 5, 20, 10, 0)
-
-    mock_db.add.side_effect = mock_add
-
     payload = {"property_id": 10, "booking_date": "2026-05-20T10:00:00"}
     response = client.post("/bookings/", json=payload)
 
     assert response.status_code == 200
     assert response.json()["status"] == "pending"
     assert response.json()["property_id"] == 10
+    assert response.json()["client_id"] == 2
+    assert db_session.get(models.PropertySummary, 10).booking_count == 1
 
 
-def test_create_booking_slot_taken():
-    mock_db = MagicMock()
-    app.dependency_overrides[get_db] = lambda: mock_db
+def test_create_booking_property_not_found(db_session):
     app.dependency_overrides[get_current_user] = mock_client
 
-    mock_db.query.return_value.filter.return_value.first.side_effect = [
-        models.Property(id=10),
-        models.Booking(id=1, status="confirmed")
-    ]
+    response = client.post("/bookings/", json={"property_id": 999, "booking_date": "2026-05-20T10:00:00"})
+    assert response.status_code == 404
+
+
+def test_create_booking_slot_taken(db_session):
+    app.dependency_overrides[get_current_user] = mock_client
+    db_session.add(models.Booking(id=1, property_id=10, client_id=2, booking_date=datetime(2026, 5, 20, 10, 0),
+                                  status="confirmed"))
+    db_session.commit()
 
     payload = {"property_id": 10, "booking_date": "2026-05-20T10:00:00"}
     response = client.post("/bookings/", json=payload)
@@ -65,17 +73,17 @@ def test_create_booking_slot_taken():
     assert "already booked" in response.json()["detail"]
 
 
-def test_get_calendar_as_agent():
-    mock_db = MagicMock()
-    app.dependency_overrides[get_db] = lambda: mock_db
+def test_get_calendar_as_agent(db_session):
     app.dependency_overrides[get_current_user] = mock_agent
-
-    fake_booking = models.Booking(
-        id=1, property_id=10, client_id=2,
-        booking_date=datetime(2026, 5, 20, 10, 0), status="confirmed"
-    )
-    mock_db.query.return_value.join.return_value.filter.return_value.order_by.return_value.all.return_value = [
-        fake_booking]
+    db_session.add_all([
+        models.Booking(id=1, property_id=10, client_id=2, booking_date=datetime(2026, 5, 20, 10, 0),
+                       status="confirmed"),
+        models.Booking(id=2, property_id=10, client_id=2, booking_date=datetime(2026, 5, 21, 10, 0),
+                       status="confirmed"),
+        models.Booking(id=3, property_id=11, client_id=2, booking_date=datetime(2026, 5, 20, 12, 0),
+                       status="confirmed"),
+    ])
+    db_session.commit()
 
     response = client.get("/bookings/calendar?day=2026-05-20")
     assert response.status_code == 200
@@ -83,34 +91,31 @@ def test_get_calendar_as_agent():
     assert response.json()[0]["id"] == 1
 
 
-def test_update_booking_status_success():
-    mock_db = MagicMock()
-    app.dependency_overrides[get_db] = lambda: mock_db
-    app.dependency_overrides[get_current_user] = mock_agent
+def test_get_calendar_forbidden_for_clients(db_session):
+    app.dependency_overrides[get_current_user] = mock_client
 
-    mock_prop = models.Property(id=10, owner_id=1)
-    mock_booking = models.Booking(id=5, property_id=10, status="pending")
-    mock_booking.property = mock_prop
+    response = client.get("/bookings/calendar?day=2026-05-20")
+    assert response.status_code == 403
 
-    mock_db.query.return_value.join.return_value.filter.return_value.first.return_value = mock_booking
+
+def test_update_booking_status_success(db_session):
+    app.dependency_overrides[get_current_user] = mock_agent
+    db_session.add(models.Booking(id=5, property_id=10, client_id=2, booking_date=datetime(2026, 5, 20, 10, 0),
+                                  status="pending"))
+    db_session.commit()
 
     response = client.patch("/bookings/5/status?new_status=confirmed")
     assert response.status_code == 200
-    assert mock_booking.status == "confirmed"
-    assert mock_db.commit.called
+    db_session.expire_all()
+    assert db_session.get(models.Booking, 5).status == "confirmed"
 
 
-def test_update_booking_forbidden_not_owner():
-    mock_db = MagicMock()
-    app.dependency_overrides[get_db] = lambda: mock_db
+def test_update_booking_forbidden_not_owner(db_session):
     app.dependency_overrides[get_current_user] = mock_agent
-
-    mock_prop = models.Property(id=10, owner_id=99)
-    mock_booking = models.Booking(id=5, property_id=10)
-    mock_booking.property = mock_prop
-
-    mock_db.query.return_value.join.return_value.filter.return_value.first.return_value = mock_booking
+    db_session.add(models.Booking(id=5, property_id=11, client_id=2, booking_date=datetime(2026, 5, 20, 10, 0),
+                                  status="pending"))
+    db_session.commit()
 
     response = client.patch("/bookings/5/status?new_status=confirmed")
     assert response.status_code == 403
-    assert "manage bookings for your own properties" in response.json()["detail"]
\ No newline at end of file
+    assert "manage bookings for your own properties" in response.json()["detail"]
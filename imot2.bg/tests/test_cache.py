@@ -0,0 +1,148 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+from main import app
+from cache import TTLCache
+from database import get_db
+from routers.auth import get_current_user
+import models
+import search
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(autouse=True)
+def clean_overrides():
+    yield
+    app.dependency_overrides.clear()
+    search.invalidate_results()
+
+
+@pytest.fixture
+def db_session(engine):
+    db = sessionmaker(bind=engine)()
+    db.add(models.User(id=1, username="agent", email="agent@test.com", role="agent", is_verified=True))
+    db.add(models.User(
+        id=2, username="newbie", email="newbie@test.com", first_name="Нов", last_name="Агент",
+        role="agent", is_verified=False
+    ))
+    db.add(models.User(id=3, username="admin", email="admin@test.com", role="admin", is_verified=True))
+    db.add(models.Property(id=1, title="Къща", price=100, property_type="rent", location="София", owner_id=1))
+    db.add(models.Property(id=2, title="Вила", price=200, property_type="rent", location="София", owner_id=2))
+    db.commit()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def client(db_session):
+    app.dependency_overrides[get_db] = lambda: db_session
+    return TestClient(app)
+
+
+def listed_ids(client, url="/properties/?prop_type=rent&location=София"):
+    return [p["id"] for p in client.get(url).json()["items"]]
+
+
+def test_lru_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = TTLCache(maxsize=10, ttl=30, clock=clock)
+    cache.set("key", "value")
+
+    clock.now = 29
+    assert cache.get("key") == "value"
+    clock.now = 31
+    assert cache.get("key") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_clear_discards_values_computed_before_it():
+    cache = TTLCache(maxsize=10, ttl=30)
+    generation = cache.generation
+    cache.clear()
+
+    cache.set("key", "stale", generation)
+
+    assert cache.get("key") is None
+
+
+def test_equivalent_searches_share_an_entry(client):
+    before = search.result_cache.stats()
+    listed_ids(client, "/properties/?location=София")
+    listed_ids(client, "/properties/?location=%20софия,")
+
+    after = search.result_cache.stats()
+    assert after["misses"] - before["misses"] == 1
+    assert after["hits"] - before["hits"] == 1
+
+
+def test_create_property_invalidates_results(client, db_session):
+    assert listed_ids(client) == [1]
+
+    app.dependency_overrides[get_current_user] = lambda: db_session.get(models.User, 1)
+    payload = {"title": "Нов имот", "price": 50, "property_type": "rent", "location": "София"}
+    new_id = client.post("/properties/", json=payload).json()["id"]
+
+    assert listed_ids(client) == [new_id, 1]
+
+
+def test_delete_property_invalidates_results(client, db_session):
+    assert listed_ids(client) == [1]
+
+    app.dependency_overrides[get_current_user] = lambda: db_session.get(models.User, 1)
+    assert client.delete("/properties/1").status_code == 204
+
+    assert listed_ids(client) == []
+
+
+def test_verifying_owner_invalidates_results(client, db_session):
+    assert listed_ids(client) == [1]
+
+    app.dependency_overrides[get_current_user] = lambda: db_session.get(models.User, 3)
+    assert client.patch("/admin/verify/2").status_code == 200
+
+    assert listed_ids(client) == [2, 1]
+
+
+def test_cached_hits_still_show_new_images(client, db_session):
+    listed_ids(client)
+    hits = search.result_cache.hits
+    db_session.add(models.PropertyImage(property_id=1, url="static/uploads/new.jpg"))
+    db_session.commit()
+
+    response = client.get("/properties/?prop_type=rent&location=София")
+
+    assert response.json()["items"][0]["images"] == [{"url": "static/uploads/new.jpg", "variants": None}]
+    assert search.result_cache.hits == hits + 1
+
+
+def test_admin_stats_expose_cache_counters(client, db_session):
+    listed_ids(client)
+    app.dependency_overrides[get_current_user] = lambda: db_session.get(models.User, 3)
+
+    stats = client.get("/admin/stats").json()["cache_stats"]["search_results"]
+
+    assert stats["size"] == 1
+    assert stats["misses"] == search.result_cache.misses
+    assert "hit_ratio" in stats
@@ -0,0 +1,62 @@
+import asyncio
+import pytest
+from sqlalchemy import text
+import database
+
+
+def pragma(engine, name):
+    with engine.connect() as conn:
+        return conn.execute(text(f"PRAGMA {name}")).scalar()
+
+
+def test_sqlite_file_gets_wal_and_tuning_pragmas(tmp_path):
+    engine = database.make_engine(f"sqlite:///{tmp_path / 'test.db'}", env={})
+
+    assert pragma(engine, "journal_mode") == "wal"
+    assert pragma(engine, "synchronous") == 1  # NORMAL
+    assert pragma(engine, "cache_size") == -65536
+    assert pragma(engine, "busy_timeout") == 5000
+    assert engine.pool.size() == database.POOL_SIZE
+    engine.dispose()
+
+
+def test_pragmas_and_pool_follow_the_environment(tmp_path):
+    env = {"IMOT2_SQLITE_SYNCHRONOUS": "FULL", "IMOT2_SQLITE_MMAP_SIZE": "", "IMOT2_DB_POOL_SIZE": "3"}
+    engine = database.make_engine(f"sqlite:///{tmp_path / 'test.db'}", env=env)
+
+    assert pragma(engine, "synchronous") == 2  # FULL
+    assert pragma(engine, "mmap_size") == 0
+    assert engine.pool.size() == 3
+    engine.dispose()
+
+
+def test_invalid_pragma_value_is_rejected():
+    with pytest.raises(ValueError):
+        database.sqlite_pragmas({"IMOT2_SQLITE_CACHE_SIZE": "1; DROP TABLE users"})
+
+
+def test_async_engine_gets_the_same_pragmas(tmp_path):
+    engine = database.make_async_engine(f"sqlite:///{tmp_path / 'test.db'}", env={})
+
+    async def read():
+        async with engine.connect() as conn:
+            values = [(await conn.execute(text(f"PRAGMA {name}"))).scalar()
+                      for name in ("journal_mode", "busy_timeout")]
+        await engine.dispose()
+        return values
+
+    assert asyncio.run(read()) == ["wal", 5000]
+
+
+def test_postgresql_profile():
+    options = database.engine_options("postgresql://imot2:secret@db/imot2", env={"IMOT2_DB_MAX_OVERFLOW": "5"})
+
+    assert options["pool_pre_ping"] is True
+    assert options["pool_recycle"] == database.POSTGRES_POOL_RECYCLE
+    assert (options["pool_size"], options["max_overflow"]) == (database.POOL_SIZE, 5)
+    assert "connect_args" not in options
+    assert database.async_url("postgresql://imot2:secret@db/imot2") == "postgresql+asyncpg://imot2:secret@db/imot2"
+
+
+def test_in_memory_sqlite_keeps_its_single_connection_pool():
+    assert database.engine_options("sqlite://", env={}) == {"connect_args": {"check_same_thread": False}}
@@ -0,0 +1,142 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta, timezone
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+from main import app
+from database import get_db
+from routers.auth import get_current_user
+import exports
+import locations
+import models
+import search
+
+LAST_WEEK = datetime.now(timezone.utc) - timedelta(days=7)
+
+
+@pytest.fixture(autouse=True)
+def clean_overrides():
+    yield
+    app.dependency_overrides.clear()
+    search.invalidate_results()
+
+
+@pytest.fixture
+def db_session(engine):
+    db = sessionmaker(bind=engine)()
+    db.add(models.User(id=1, username="agent", email="agent@test.com", role="agent", is_verified=True))
+    db.add_all([
+        models.Property(id=1, title="Студио", price=500, property_type="rent", location="София, Лозенец",
+                        owner_id=1, updated_at=LAST_WEEK,
+                        images=[models.PropertyImage(url="static/uploads/a.jpg"),
+                                models.PropertyImage(url="static/uploads/b.jpg")]),
+        models.Property(id=2, title="Къща, \"с двор\"", price=90000, property_type="sale", location="Пловдив",
+                        owner_id=1, updated_at=LAST_WEEK),
+        models.Property(id=3, title="Продаден", price=1000, property_type="sale", location="Варна",
+                        owner_id=1, status="sold", updated_at=LAST_WEEK),
+    ])
+    db.commit()
+    locations.backfill(db)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def client(db_session):
+    app.dependency_overrides[get_db] = lambda: db_session
+    return TestClient(app)
+
+
+def ndjson(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def unseen(response, previous):
+    """Records of an incremental export that the previous one did not already contain."""
+    seen = {(row["id"], row["updated_at"]) for row in ndjson(previous)}
+    return [row for row in ndjson(response) if (row["id"], row["updated_at"]) not in seen]
+
+
+def test_full_ndjson_export_contains_listed_properties(client):
+    response = client.get("/properties/export")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = ndjson(response)
+    assert [row["id"] for row in rows] == [1, 2]
+    assert rows[0]["city"] == "София" and rows[0]["neighborhood"] == "Лозенец"
+    assert rows[0]["images"] == ["static/uploads/a.jpg", "static/uploads/b.jpg"]
+    assert set(rows[0]) == set(exports.FIELDS)
+
+
+def test_csv_export_quotes_values_and_joins_images(client):
+    response = client.get("/properties/export?format=csv")
+
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert response.headers["content-type"].startswith("text/csv")
+    assert [row["title"] for row in rows] == ["Студио", "Къща, \"с двор\""]
+    assert rows[0]["images"] == "static/uploads/a.jpg|static/uploads/b.jpg"
+
+
+def test_changed_since_export_includes_withdrawn_listings(client, db_session):
+    first = client.get("/properties/export", params={"since": (LAST_WEEK - timedelta(days=1)).isoformat()})
+    watermark = first.headers["X-Export-Watermark"]
+    assert [row["id"] for row in ndjson(first)] == [1, 2, 3]
+
+    db_session.get(models.Property, 2).status = "sold"
+    db_session.commit()
+
+    second = client.get("/properties/export", params={"since": watermark})
+    assert [(row["id"], row["status"]) for row in unseen(second, first)] == [(2, "sold")]
+
+
+def test_deleted_listing_is_withdrawn_in_next_incremental_export(client, db_session):
+    first = client.get("/properties/export", params={"since": LAST_WEEK.isoformat()})
+    app.dependency_overrides[get_current_user] = lambda: models.User(id=1, role="agent", is_verified=True)
+
+    assert client.delete("/properties/2").status_code == 204
+
+    second = client.get("/properties/export", params={"since": first.headers["X-Export-Watermark"]})
+    rows = unseen(second, first)
+    assert [(row["id"], row["deleted"]) for row in rows] == [(2, True)]
+    assert rows[0]["title"] is None
+    assert all(not row["deleted"] for row in ndjson(client.get("/properties/export")))
+
+
+def test_change_committed_after_an_export_read_is_in_the_next_export(shared_engine):
+    seed = sessionmaker(bind=shared_engine)()
+    seed.add(models.User(id=1, username="agent", email="agent@test.com", role="agent", is_verified=True))
+    seed.add(models.Property(id=1, title="Студио", price=500, property_type="rent", location="София",
+                             owner_id=1, updated_at=LAST_WEEK))
+    seed.commit()
+    seed.close()
+    reader = sessionmaker(bind=shared_engine)()
+    app.dependency_overrides[get_db] = lambda: reader
+    client = TestClient(app)
+
+    writer = sessionmaker(bind=shared_engine)()
+    writer.get(models.Property, 1).price = 450
+    writer.flush()  # updated_at is set here, before the export reads
+    first = client.get("/properties/export", params={"since": LAST_WEEK.isoformat()})
+    writer.commit()
+    writer.close()
+    second = client.get("/properties/export", params={"since": first.headers["X-Export-Watermark"]})
+    reader.close()
+
+    assert ndjson(first) == []
+    assert [(row["id"], row["price"]) for row in ndjson(second)] == [(1, 450)]
+
+
+def test_export_streams_in_batches(db_session):
+    lines = exports.stream_export(db_session.get_bind(), exports.NDJSON, batch_size=1)
+
+    assert json.loads(next(lines))["id"] == 1
+    assert [json.loads(line)["id"] for line in lines] == [2]
+
+
+def test_export_rejects_unknown_format(client):
+    assert client.get("/properties/export?format=xml").status_code == 400
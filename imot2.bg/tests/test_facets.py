@@ -0,0 +1,82 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+from main import app
+from database import get_db
+import locations
+import models
+import search
+
+
+@pytest.fixture(autouse=True)
+def clean_overrides():
+    yield
+    app.dependency_overrides.clear()
+    search.invalidate_results()
+
+
+@pytest.fixture
+def seeded(engine):
+    db = sessionmaker(bind=engine)()
+    db.add(models.User(id=1, username="agent", email="agent@test.com", role="agent", is_verified=True))
+    db.add_all([
+        models.Property(title="Студио", price=500, property_type="rent", location="София, Лозенец", owner_id=1),
+        models.Property(title="Двустаен", price=900, property_type="rent", location="София, Младост", owner_id=1),
+        models.Property(title="Тристаен", price=150000, property_type="sale", location="София", owner_id=1),
+        models.Property(title="Къща", price=90000, property_type="sale", location="Пловдив", owner_id=1),
+        models.Property(title="Вила", price=750000, property_type="sale", location="Варна", owner_id=1,
+                        status="sold"),
+    ])
+    db.commit()
+    locations.backfill(db)
+    db.close()
+    return engine
+
+
+@pytest.fixture
+def client(seeded):
+    session = sessionmaker(bind=seeded)()
+    app.dependency_overrides[get_db] = lambda: session
+    yield TestClient(app)
+    session.close()
+
+
+def as_dict(facet):
+    return {entry["value"]: entry["count"] for entry in facet}
+
+
+def test_facets_count_every_dimension(client):
+    body = client.get("/properties/facets").json()
+
+    assert body["total"] == 4
+    assert as_dict(body["property_type"]) == {"rent": 2, "sale": 2}
+    assert as_dict(body["city"]) == {"София": 3, "Пловдив": 1}
+    assert [bucket["count"] for bucket in body["price"]] == [2, 0, 1, 1, 0, 0]
+    assert body["price"][-1] == {"min": 500000, "max": None, "count": 0}
+
+
+def test_facets_follow_current_filters(client):
+    body = client.get("/properties/facets?prop_type=rent").json()
+
+    assert body["total"] == 2
+    assert as_dict(body["city"]) == {"София": 2}
+
+
+def test_facets_use_a_single_query(client, engine):
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    client.get("/properties/facets?location=София")
+
+    assert len(statements) == 1
+    assert "GROUP BY" in statements[0]
+
+
+def test_facets_returned_alongside_results(client):
+    body = client.get("/properties/?prop_type=sale&include_facets=true&limit=1").json()
+
+    assert len(body["items"]) == 1
+    assert body["next_cursor"]
+    assert body["facets"]["total"] == 2
+
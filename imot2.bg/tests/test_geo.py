@@ -0,0 +1,126 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+from main import app
+from database import get_db
+import geo
+import models
+import search
+
+SOFIA_CENTER = (42.6977, 23.3219)
+
+
+@pytest.fixture(autouse=True)
+def clean_overrides():
+    yield
+    app.dependency_overrides.clear()
+    search.invalidate_results()
+
+
+@pytest.fixture
+def db_session(engine):
+    db = sessionmaker(bind=engine)()
+    db.add(models.User(id=1, username="agent", email="agent@test.com", role="agent", is_verified=True))
+    db.add_all([
+        models.Property(id=1, title="Център", price=900, property_type="rent", location="София",
+                        latitude=42.6975, longitude=23.3241, owner_id=1),
+        models.Property(id=2, title="НДК", price=800, property_type="rent", location="София",
+                        latitude=42.6847, longitude=23.3188, owner_id=1),
+        models.Property(id=3, title="Бояна", price=700, property_type="rent", location="София",
+                        latitude=42.6450, longitude=23.2660, owner_id=1),
+        models.Property(id=4, title="Пловдив", price=600, property_type="rent", location="Пловдив",
+                        latitude=42.1354, longitude=24.7453, owner_id=1),
+        models.Property(id=5, title="Без адрес", price=500, property_type="rent", location="София", owner_id=1),
+    ])
+    db.commit()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def client(db_session):
+    app.dependency_overrides[get_db] = lambda: db_session
+    return TestClient(app)
+
+
+def listed_ids(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    return [p["id"] for p in response.json()["items"]]
+
+
+def test_bounding_box_returns_listings_in_viewport(client):
+    ids = listed_ids(client, "/properties/?min_lat=42.6&max_lat=42.75&min_lng=23.2&max_lng=23.4")
+
+    assert sorted(ids) == [1, 2, 3]
+
+
+def test_radius_search_sorts_by_distance(client):
+    lat, lng = SOFIA_CENTER
+
+    ids = listed_ids(client, f"/properties/?lat={lat}&lng={lng}&radius_km=2")
+
+    assert ids == [1, 2]
+
+
+def test_distance_sort_pages_with_cursor(client):
+    lat, lng = SOFIA_CENTER
+    url = f"/properties/?lat={lat}&lng={lng}&radius_km=10&limit=1"
+
+    first = client.get(url).json()
+    second = client.get(url + f"&cursor={first['next_cursor']}").json()
+    third = client.get(url + f"&cursor={second['next_cursor']}").json()
+
+    assert [page["items"][0]["id"] for page in (first, second, third)] == [1, 2, 3]
+    assert third["next_cursor"] is None
+
+
+def test_incomplete_map_filters_rejected(client):
+    assert client.get("/properties/?min_lat=42&max_lat=43").status_code == 400
+    assert client.get("/properties/?lat=42&lng=23").status_code == 400
+    assert client.get("/properties/?sort=distance").status_code == 400
+    assert client.get("/properties/?lat=42&lng=23&radius_km=1000").status_code == 422
+
+
+def test_spatial_index_follows_moves_and_deletes(client, db_session):
+    db_session.get(models.Property, 4).latitude, db_session.get(models.Property, 4).longitude = SOFIA_CENTER
+    db_session.delete(db_session.get(models.Property, 1))
+    db_session.commit()
+
+    lat, lng = SOFIA_CENTER
+    ids = listed_ids(client, f"/properties/?lat={lat}&lng={lng}&radius_km=2")
+
+    assert ids == [4, 2]
+
+
+@pytest.mark.sqlite
+def test_radius_query_uses_rtree(db_session):
+    query, computed = search.filter_properties(db_session, near=(*SOFIA_CENTER, 2))
+    compiled = query.statement.compile(db_session.get_bind())
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+
+    plan = db_session.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params).all()
+
+    assert any(f"{geo.RTREE_TABLE} VIRTUAL TABLE" in row[-1] for row in plan)
+    assert "distance" in computed
+
+
+@pytest.mark.sqlite
+def test_setup_backfills_existing_rows(db_session):
+    db_session.execute(text(f"DROP TABLE {geo.RTREE_TABLE}"))
+    db_session.commit()
+
+    geo.setup_spatial_index(db_session.get_bind())
+
+    count = db_session.execute(text(f"SELECT count(*) FROM {geo.RTREE_TABLE}")).scalar()
+    assert count == 4
+
+
+def test_bounding_box_encloses_radius():
+    south, west, north, east = geo.bounding_box(*SOFIA_CENTER, 10)
+
+    assert north - south == pytest.approx(2 * 10 / geo.KM_PER_DEGREE)
+    assert east - west > north - south
@@ -0,0 +1,87 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+from main import app
+from database import get_db
+import hashing
+import models
+import ratelimit
+
+client = TestClient(app)
+
+OLD_COST_HASH = hashing.pwd_context.copy(bcrypt__rounds=4).hash("secret123")
+
+
+@pytest.fixture(autouse=True)
+def clean_overrides():
+    hashing.metrics.reset()
+    yield
+    app.dependency_overrides.clear()
+    ratelimit.reset()
+
+
+@pytest.fixture
+def db_session(engine):
+    db = sessionmaker(bind=engine)()
+    db.add(models.User(id=1, username="ivan", email="ivan@test.com", role="client", is_verified=True,
+                       hashed_password=OLD_COST_HASH))
+    db.commit()
+    app.dependency_overrides[get_db] = lambda: db
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def login(password="secret123"):
+    return client.post("/auth/login", json={"username": "ivan", "password": password})
+
+
+def test_login_rehashes_password_with_outdated_cost(db_session):
+    assert login().status_code == 200
+
+    db_session.expire_all()
+    stored = db_session.get(models.User, 1).hashed_password
+    assert stored != OLD_COST_HASH and stored.startswith(f"$2b${hashing.BCRYPT_ROUNDS}$")
+    assert hashing.pwd_context.verify("secret123", stored)
+    assert login().status_code == 200
+    assert hashing.metrics.stats()["completed"] == 2
+
+
+def test_wrong_password_is_not_rehashed(db_session):
+    assert login("wrong").status_code == 401
+
+    db_session.expire_all()
+    assert db_session.get(models.User, 1).hashed_password == OLD_COST_HASH
+
+
+def test_saturated_pool_rejects_instead_of_queueing(db_session, monkeypatch):
+    monkeypatch.setattr(hashing, "MAX_PENDING", 0)
+
+    response = login()
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+    assert hashing.metrics.stats()["rejected"] == 1
+
+
+def test_hash_that_waited_too_long_is_dropped(db_session, monkeypatch):
+    monkeypatch.setattr(hashing, "QUEUE_TIMEOUT_SECONDS", -1)
+
+    assert login().status_code == 503
+    stats = hashing.metrics.stats()
+    assert (stats["timed_out"], stats["completed"], stats["pending"]) == (1, 0, 0)
+
+
+def test_register_hashes_on_the_hashing_pool(db_session):
+    payload = {
+        "email": "maria@test.com", "username": "maria", "password": "pass1234",
+        "first_name": "Maria", "last_name": "Petrova", "role": "client"
+    }
+
+    response = client.post("/auth/register", json=payload)
+
+    assert response.status_code == 200
+    user = db_session.get(models.User, response.json()["id"])
+    assert hashing.pwd_context.verify("pass1234", user.hashed_password)
+    assert hashing.metrics.stats()["completed"] == 1
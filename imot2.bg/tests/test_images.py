@@ -0,0 +1,101 @@
+import io
+import os
+import pytest
+from PIL import Image
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+from main import app
+from database import get_db
+from routers.auth import get_current_user
+import images
+import models
+import search
+import uploads
+
+
+def encoded(size, mode="RGB", file_format="JPEG"):
+    buffer = io.BytesIO()
+    Image.new(mode, size, "red").save(buffer, file_format)
+    return buffer.getvalue()
+
+
+@pytest.fixture(autouse=True)
+def clean_overrides():
+    yield
+    app.dependency_overrides.clear()
+    search.invalidate_results()
+
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOAD_DIR", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def db_session(engine):
+    db = sessionmaker(bind=engine)()
+    db.add(models.User(id=1, username="agent", email="agent@test.com", role="agent", is_verified=True))
+    db.add(models.Property(id=1, title="Студио", price=500, property_type="rent", location="София", owner_id=1,
+                           summary=models.PropertySummary(review_count=0, rating_total=0, booking_count=0,
+                                                          image_count=0)))
+    db.commit()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def client(db_session, upload_dir):
+    app.dependency_overrides[get_db] = lambda: db_session
+    app.dependency_overrides[get_current_user] = lambda: db_session.get(models.User, 1)
+    return TestClient(app)
+
+
+def test_variants_are_downscaled_in_both_formats(tmp_path):
+    path = tmp_path / "photo.jpg"
+    path.write_bytes(encoded((2000, 1000)))
+
+    variants = images.generate_variants(str(path))
+
+    assert {name: (v["width"], v["height"]) for name, v in variants.items()} == {
+        "thumb": (320, 160), "card": (640, 320), "large": (1600, 800)
+    }
+    assert variants["card"]["webp"] == str(tmp_path / "photo.card.webp")
+    with Image.open(variants["card"]["webp"]) as webp, Image.open(variants["card"]["jpeg"]) as jpeg:
+        assert (webp.format, jpeg.format) == ("WEBP", "JPEG")
+
+
+def test_small_and_transparent_images_are_not_upscaled(tmp_path):
+    path = tmp_path / "logo.png"
+    path.write_bytes(encoded((200, 100), mode="RGBA", file_format="PNG"))
+
+    variants = images.generate_variants(str(path))
+
+    assert (variants["large"]["width"], variants["large"]["height"]) == (200, 100)
+    assert os.path.exists(variants["thumb"]["jpeg"])
+
+
+def test_upload_records_variants_in_background(client, db_session, upload_dir):
+    response = client.post("/properties/1/upload-image", files={"file": ("p.jpg", encoded((1200, 900)), "image/jpeg")})
+
+    assert response.status_code == 200
+    db_session.expire_all()
+    image = db_session.query(models.PropertyImage).one()
+    assert image.variants["thumb"]["width"] == 320
+    assert image.variants["card"]["webp"].startswith("/") and image.variants["card"]["webp"].endswith(".card.webp")
+    assert db_session.get(models.PropertySummary, 1).cover_image_variants == image.variants
+
+    page = client.get("/properties-page").text
+    assert images.image_url(image.url, image.variants, "card", "webp") in page
+    assert client.get("/properties/1").json()["images"][0]["variants"] == image.variants
+
+
+def test_image_url_falls_back_to_original():
+    variants = {"card": {"webp": "/static/uploads/a.card.webp", "jpeg": "/static/uploads/a.card.jpg"}}
+
+    assert images.image_url("/static/uploads/a.jpg", variants, "card", "webp") == "/static/uploads/a.card.webp"
+    assert images.image_url("static/uploads/a.jpg", variants, "large") == "/static/uploads/a.jpg"
+    assert images.image_url("static/uploads/a.jpg") == "/static/uploads/a.jpg"
+    assert images.image_url(None) is None
@@ -0,0 +1,102 @@
+import io
+import json
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+from main import app
+from database import get_db
+from routers.auth import get_current_user
+import imports
+import models
+import search
+
+CSV_FILE = (
+    "title,price,property_type,location,description,latitude,longitude\n"
+    "Студио,500,rent,\"София, Лозенец\",Слънчево,42.68,23.32\n"
+    "Без цена,,rent,София,,,\n"
+    "\n"
+    "Къща,90000,sale,Пловдив,,,\n"
+    "Грешна ширина,1000,sale,Варна,,95,\n"
+)
+
+
+@pytest.fixture(autouse=True)
+def clean_overrides():
+    yield
+    app.dependency_overrides.clear()
+    search.invalidate_results()
+
+
+@pytest.fixture
+def db_session(engine):
+    db = sessionmaker(bind=engine)()
+    db.add_all([
+        models.User(id=1, username="agent", email="agent@test.com", role="agent", is_verified=True),
+        models.User(id=2, username="client", email="client@test.com", role="client", is_verified=True),
+    ])
+    db.commit()
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def client(db_session):
+    app.dependency_overrides[get_db] = lambda: db_session
+    app.dependency_overrides[get_current_user] = lambda: db_session.get(models.User, 1)
+    return TestClient(app)
+
+
+def upload(client, name, content, **params):
+    return client.post("/properties/import", params=params, files={"file": (name, content.encode("utf-8"))})
+
+
+def test_csv_import_saves_valid_rows_and_reports_the_rest(client, db_session):
+    response = upload(client, "listings.csv", CSV_FILE)
+
+    assert response.status_code == 200
+    report = response.json()
+    assert (report["imported"], report["failed"]) == (2, 2)
+    assert [error["line"] for error in report["errors"]] == [3, 6]
+    assert report["errors"][0]["errors"] == ["price: Field required"]
+
+    studio = db_session.query(models.Property).filter(models.Property.title == "Студио").one()
+    assert (studio.owner_id, studio.status, studio.latitude) == (1, "available", 42.68)
+    assert studio.place.neighborhood == "Лозенец"
+    assert studio.summary.review_count == 0
+
+
+def test_ndjson_import_with_explicit_format(client):
+    lines = [
+        json.dumps({"title": "Офис", "price": 1200, "property_type": "rent", "location": "София"}),
+        "{not json",
+        json.dumps(["list"]),
+    ]
+
+    report = upload(client, "feed.txt", "\n".join(lines), format="ndjson").json()
+
+    assert (report["imported"], report["failed"]) == (1, 2)
+    assert report["errors"][0]["errors"][0].startswith("Invalid JSON")
+    assert client.get("/properties/?q=офис").json()["items"][0]["title"] == "Офис"
+
+
+def test_import_batches_inserts(engine, db_session):
+    rows = "\n".join(
+        json.dumps({"title": f"Имот {n}", "price": n, "property_type": "sale", "location": "София"})
+        for n in range(25)
+    )
+    inserts = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda *args: inserts.append(args[2]) if args[2].startswith("INSERT INTO properties") else None)
+
+    report = imports.import_listings(db_session, io.BytesIO(rows.encode()), imports.NDJSON, owner_id=1, batch_size=10)
+
+    assert report["imported"] == 25
+    assert len(inserts) == 3
+
+
+def test_import_requires_agent_and_known_format(client, db_session):
+    assert upload(client, "listings.xlsx", "x").status_code == 400
+
+    app.dependency_overrides[get_current_user] = lambda: db_session.get(models.User, 2)
+    assert upload(client, "listings.csv", CSV_FILE).status_code == 403
@@ -0,0 +1,82 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+from main import app
+from database import get_db
+import models
+import search
+import summary
+
+
+@pytest.fixture(autouse=True)
+def clean_overrides():
+    yield
+    app.dependency_overrides.clear()
+    search.invalidate_results()
+
+
+def make_client(engine, listings):
+    """Seeds the given number of listings with three images each and returns a client."""
+    db = sessionmaker(bind=engine)()
+    db.add(models.User(id=1, username="agent", email="agent@test.com", role="agent", is_verified=True))
+    for prop_id in range(1, listings + 1):
+        db.add(models.Property(
+            id=prop_id, title=f"Имот {prop_id}", price=1000 * prop_id,
+            property_type="sale", location="София", owner_id=1,
+            images=[models.PropertyImage(url=f"static/uploads/{prop_id}-{n}.jpg") for n in range(3)]
+        ))
+    db.commit()
+    summary.rebuild(db)
+    db.close()
+
+    session = sessionmaker(bind=engine)()
+    app.dependency_overrides[get_db] = lambda: session
+    return TestClient(app)
+
+
+def count_statements(engine, client, url):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert response.status_code == 200
+    return response, len(statements)
+
+
+@pytest.mark.parametrize("listings", [2, 15])
+def test_api_listing_statement_count_is_constant(engine, listings):
+    client = make_client(engine, listings)
+
+    response, statements = count_statements(engine, client, "/properties/")
+
+    assert len(response.json()["items"]) == listings
+    assert all(len(p["images"]) == 3 for p in response.json()["items"])
+    assert statements == 2
+
+
+@pytest.mark.parametrize("listings", [2, 15])
+def test_search_page_statement_count_is_constant(engine, listings):
+    client = make_client(engine, listings)
+
+    response, statements = count_statements(engine, client, "/properties-page")
+
+    assert f"static/uploads/{listings}-0.jpg" in response.text
+    assert f"static/uploads/{listings}-1.jpg" not in response.text
+    assert statements == 1
+
+
+def test_gallery_starts_with_first_upload(engine):
+    make_client(engine, 1)
+    db = sessionmaker(bind=engine)()
+
+    prop = db.get(models.Property, 1)
+
+    assert prop.images[0].url == "static/uploads/1-0.jpg"
+    db.close()
@@ -0,0 +1,97 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+from main import app
+from database import get_db
+import locations
+import models
+import search
+
+
+@pytest.fixture(autouse=True)
+def clean_overrides():
+    yield
+    app.dependency_overrides.clear()
+    search.invalidate_results()
+
+
+@pytest.fixture
+def db_session(engine):
+    db = sessionmaker(bind=engine)()
+    db.add(models.User(id=1, username="agent", email="agent@test.com", role="agent", is_verified=True))
+    db.add_all([
+        models.Property(id=1, title="Студио", price=500, property_type="rent", location="София, Лозенец", owner_id=1),
+        models.Property(id=2, title="Двустаен", price=900, property_type="rent", location="гр. София, ж.к. Младост",
+                        owner_id=1),
+        models.Property(id=3, title="Къща", price=90000, property_type="sale", location="Пловдив", owner_id=1),
+        models.Property(id=4, title="Без адрес", price=100, property_type="rent", location="", owner_id=1),
+    ])
+    db.commit()
+    locations.backfill(db)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def client(db_session):
+    app.dependency_overrides[get_db] = lambda: db_session
+    return TestClient(app)
+
+
+def listed_ids(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    return sorted(p["id"] for p in response.json()["items"])
+
+
+def test_normalize_transliterates_and_drops_prefixes():
+    assert locations.normalize("София") == "sofia"
+    assert locations.normalize("  SOFIA ") == "sofia"
+    assert locations.normalize("Лозенец") == "lozenets"
+    assert locations.normalize("ж.к. Младост 1") == "mladost 1"
+    assert locations.normalize(None) == ""
+
+
+def test_backfill_links_listings_to_shared_entries(db_session):
+    linked = {p.id: p.place for p in db_session.query(models.Property)}
+
+    assert linked[1].city_key == linked[2].city_key == "sofia"
+    assert (linked[1].neighborhood, linked[2].neighborhood) == ("Лозенец", "ж.к. Младост")
+    assert linked[3].neighborhood is None
+    assert linked[4] is None
+
+
+def test_city_filter_accepts_latin_prefix_and_typos(client):
+    for city in ("София", "sofia", "Соф", "Sofiq", "Sofiya"):
+        assert listed_ids(client, f"/properties/?city={city}") == [1, 2], city
+    assert listed_ids(client, "/properties/?city=Бургас") == []
+
+
+def test_neighborhood_filter_on_search_page(client):
+    response = client.get("/properties-page?neighborhood=Lozenec")
+
+    assert response.status_code == 200
+    assert "Студио" in response.text
+    assert "Двустаен" not in response.text
+
+
+def test_created_listing_resolves_existing_entry(db_session):
+    place = locations.resolve(db_session, "SOFIA, Lozenets")
+    db_session.commit()
+
+    assert place.id == db_session.get(models.Property, 1).location_id
+    assert db_session.query(models.Location).count() == 3
+
+
+@pytest.mark.sqlite
+def test_city_lookup_uses_indexes(db_session):
+    key = locations.normalize("Sofiq")
+    plan = db_session.execute(
+        text("EXPLAIN QUERY PLAN SELECT name_key FROM location_trigrams WHERE kind = 'city' AND trigram IN ('  s', ' so')")
+    ).all()
+
+    assert locations.match_keys(db_session, locations.CITY, key) == ["sofia"]
+    assert not any(row[-1].startswith("SCAN location_trigrams") for row in plan)
@@ -4,6 +4,7 @@ from fastapi.testclient import TestClient
 from main import app
 from database import get_db
 import models
+import sessions
 
 client = TestClient(app)
 
@@ -19,22 +20,22 @@ def test_home_page_logged_in(mock_template):
     mock_db = MagicMock()
     app.dependency_overrides[get_db] = lambda: mock_db
 
-    fake_user = models.User(id=1, username="ivan_test", email="ivan@test.com")
-    mock_db.query.return_value.filter.return_value.first.return_value = fake_user
+    fake_user = models.User(id=1, username="ivan_test", email="ivan@test.com", role="client", is_verified=True)
 
-    client.cookies.set("username", "ivan_test")
+    client.cookies.set(sessions.COOKIE_NAME, sessions.issue(fake_user))
 
     response = client.get("/")
 
     assert response.status_code == 200
     assert mock_template.called
     assert mock_template.call_args[0][1] == "index.html"
+    assert mock_template.call_args[0][2]["user"].username == "ivan_test"
 
 
 def test_property_details_not_found():
     mock_db = MagicMock()
     app.dependency_overrides[get_db] = lambda: mock_db
-    mock_db.query.return_value.filter.return_value.first.return_value = None
+    mock_db.query.return_value.options.return_value.filter.return_value.first.return_value = None
 
     response = client.get("/properties/999")
     assert response.status_code == 404
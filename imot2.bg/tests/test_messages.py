@@ -1,9 +1,8 @@
 import pytest
-from unittest.mock import MagicMock
 from fastapi.testclient import TestClient
 from datetime import datetime
+from sqlalchemy.orm import sessionmaker
 from main import app
-from database import get_db
 from routers.auth import get_current_user
 import models
 
@@ -14,28 +13,29 @@ def mock_sender():
     return models.User(id=1, username="sender_user", email="sender@test.com")
 
 
-def mock_receiver():
-    return models.User(id=2, username="receiver_user", email="receiver@test.com")
-
-
 @pytest.fixture(autouse=True)
 def clean_overrides():
     yield
     app.dependency_overrides.clear()
 
 
-def test_send_message_success():
-    mock_db = MagicMock()
-    app.dependency_overrides[get_db] = lambda: mock_db
-    app.dependency_overrides[get_current_user] = mock_sender
+@pytest.fixture
+def db_session(shared_engine, async_db):
+    db = sessionmaker(bind=shared_engine)()
+    db.add_all([
+        models.User(id=1, username="sender_user", email="sender@test.com"),
+        models.User(id=2, username="receiver_user", email="receiver@test.com"),
+        models.User(id=3, username="third_user", email="third@test.com"),
+    ])
+    db.commit()
+    try:
+        yield db
+    finally:
+        db.close()
 
-    mock_db.query.return_value.filter.return_value.first.return_value = mock_receiver()
 
-    def mock_add(obj):
-        obj.id = 100
-        obj.timestamp = datetime.now()
-
-    mock_db.add.side_effect = mock_add
+def test_send_message_success(db_session):
+    app.dependency_overrides[get_current_user] = mock_sender
 
     payload = {"receiver_id": 2, "content": "Hello there!"}
     response = client.post("/messages/", json=payload)
@@ -43,56 +43,48 @@ def test_send_message_success():
     assert response.status_code == 200
     assert response.json()["content"] == "Hello there!"
     assert response.json()["sender_id"] == 1
-    assert mock_db.commit.called
+    assert response.json()["timestamp"]
+    assert db_session.query(models.Message).count() == 1
 
 
-def test_send_message_receiver_not_found():
-    mock_db = MagicMock()
-    app.dependency_overrides[get_db] = lambda: mock_db
+def test_send_message_receiver_not_found(db_session):
     app.dependency_overrides[get_current_user] = mock_sender
 
-    mock_db.query.return_value.filter.return_value.first.return_value = None
-
     response = client.post("/messages/", json={"receiver_id": 999, "content": "Hi"})
     assert response.status_code == 404
     assert response.json()["detail"] == "Receiver not found"
 
 
-def test_send_message_to_self():
-    mock_db = MagicMock()
-    app.dependency_overrides[get_db] = lambda: mock_db
+def test_send_message_to_self(db_session):
     app.dependency_overrides[get_current_user] = mock_sender  # ID = 1
 
-    mock_db.query.return_value.filter.return_value.first.return_value = mock_sender()
-
     response = client.post("/messages/", json={"receiver_id": 1, "content": "Me to myself"})
     assert response.status_code == 400
     assert "cannot send messages to yourself" in response.json()["detail"]
 
 
-def test_get_my_messages_inbox():
-    mock_db = MagicMock()
-    app.dependency_overrides[get_db] = lambda: mock_db
+def test_get_my_messages_inbox(db_session):
     app.dependency_overrides[get_current_user] = mock_sender
-
-    fake_msgs = [
-        models.Message(id=1, sender_id=1, receiver_id=2, content="Msg 1", timestamp=datetime.now()),
-        models.Message(id=2, sender_id=2, receiver_id=1, content="Msg 2", timestamp=datetime.now())
-    ]
-    mock_db.query.return_value.filter.return_value.order_by.return_value.all.return_value = fake_msgs
+    db_session.add_all([
+        models.Message(id=1, sender_id=1, receiver_id=2, content="Msg 1", timestamp=datetime(2026, 1, 1, 10)),
+        models.Message(id=2, sender_id=2, receiver_id=1, content="Msg 2", timestamp=datetime(2026, 1, 1, 11)),
+        models.Message(id=3, sender_id=2, receiver_id=3, content="Not mine", timestamp=datetime(2026, 1, 1, 12)),
+    ])
+    db_session.commit()
 
     response = client.get("/messages/inbox")
     assert response.status_code == 200
-    assert len(response.json()) == 2
+    assert [m["id"] for m in response.json()] == [2, 1]
 
 
-def test_get_specific_conversation():
-    mock_db = MagicMock()
-    app.dependency_overrides[get_db] = lambda: mock_db
+def test_get_specific_conversation(db_session):
     app.dependency_overrides[get_current_user] = mock_sender
-
-    mock_db.query.return_value.filter.return_value.order_by.return_value.all.return_value = []
+    db_session.add_all([
+        models.Message(id=1, sender_id=1, receiver_id=2, content="Msg 1", timestamp=datetime(2026, 1, 1, 10)),
+        models.Message(id=2, sender_id=1, receiver_id=3, content="Other chat", timestamp=datetime(2026, 1, 1, 11)),
+    ])
+    db_session.commit()
 
     response = client.get("/messages/chat/2")
     assert response.status_code == 200
-    assert isinstance(response.json(), list)
+    assert [m["id"] for m in response.json()] == [1]
@@ -0,0 +1,113 @@
+import pytest
+import baseline
+from fastapi.testclient import TestClient
+from sqlalchemy import inspect, text
+from sqlalchemy.dialects import postgresql
+import main
+import manage
+import migrations
+import models
+import schema
+
+
+@pytest.fixture
+def engine(empty_engine):
+    """Migrations start from a database without tables."""
+    return empty_engine
+
+
+def test_migrate_creates_schema_and_records_version(engine):
+    applied = migrations.migrate(engine)
+
+    assert [m.version for m in applied] == [m.version for m in migrations.MIGRATIONS]
+    assert migrations.current_version(engine) == migrations.HEAD
+    assert {"users", "properties", "schema_migrations"} <= set(inspect(engine).get_table_names())
+    assert migrations.migrate(engine) == []
+
+
+def test_unversioned_database_is_brought_under_migrations(engine):
+    baseline.apply(engine)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO users (id, username, email) VALUES (1, 'ivan', 'ivan@test.com')"))
+        conn.execute(text("DROP INDEX ix_bookings_property_date"))
+
+    assert migrations.current_version(engine) == 0
+    migrations.migrate(engine)
+
+    assert migrations.current_version(engine) == migrations.HEAD
+    assert "ix_bookings_property_date" in {index["name"] for index in inspect(engine).get_indexes("bookings")}
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT username FROM users")).scalar() == "ivan"
+
+
+def test_migrated_schema_matches_the_models(engine):
+    migrations.migrate(engine)
+
+    inspector = inspect(engine)
+    for table in models.Base.metadata.sorted_tables:
+        assert {column["name"] for column in inspector.get_columns(table.name)} == set(table.columns.keys())
+        indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        assert {index.name for index in table.indexes} <= indexes, table.name
+
+
+def test_baseline_adds_columns_to_tables_of_the_original_schema(engine):
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE properties (id INTEGER PRIMARY KEY, title VARCHAR, description TEXT, "
+            "price FLOAT, property_type VARCHAR, location VARCHAR, status VARCHAR, "
+            "is_active BOOLEAN, owner_id INTEGER)"
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO properties (id, title, price, property_type, location, status, is_active, owner_id) "
+            "VALUES (1, 'Old', 10, 'sale', 'София', 'available', true, 1)"
+        )
+
+    migrations.migrate(engine)
+
+    columns = {column["name"] for column in inspect(engine).get_columns("properties")}
+    assert set(baseline.LEGACY_COLUMNS["properties"]) <= columns
+    with engine.connect() as conn:
+        assert conn.execute(text(
+            "SELECT title, city_key FROM properties JOIN locations ON locations.id = properties.location_id"
+        )).one() == ("Old", "sofia")
+        assert conn.execute(text("SELECT image_count FROM property_summary WHERE property_id = 1")).scalar() == 0
+
+
+def test_check_only_passes_at_head(engine):
+    with pytest.raises(migrations.SchemaOutOfDate):
+        migrations.check(engine)
+
+    migrations.migrate(engine)
+
+    migrations.check(engine)
+
+
+def test_app_refuses_to_start_on_unmigrated_database(engine, monkeypatch):
+    monkeypatch.setattr(main, "engine", engine)
+    with pytest.raises(migrations.SchemaOutOfDate):
+        with TestClient(main.app):
+            pass
+
+    migrations.migrate(engine)
+    with TestClient(main.app) as client:
+        assert client.get("/login").status_code == 200
+
+
+def test_index_sql_is_online_on_postgresql():
+    index = next(index for index in models.Booking.__table__.indexes if index.name == "ix_bookings_property_date")
+
+    sql = schema.create_index_sql(index, postgresql.dialect())
+
+    assert sql.startswith("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_bookings_property_date ON bookings")
+
+
+def test_migrate_command_reports_status(engine, monkeypatch, capsys):
+    monkeypatch.setattr(manage, "engine", engine)
+
+    with pytest.raises(SystemExit):
+        manage.main(["migrate", "--status"])
+    assert "Pending: 1 baseline" in capsys.readouterr().out
+
+    manage.main(["migrate"])
+    manage.main(["migrate", "--status"])
+    assert f"Schema version {migrations.HEAD} of {migrations.HEAD}" in capsys.readouterr().out
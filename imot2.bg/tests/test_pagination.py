@@ -0,0 +1,117 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+from main import app
+from database import get_db
+import models
+import search
+import pagination
+
+
+@pytest.fixture(autouse=True)
+def clean_overrides():
+    yield
+    app.dependency_overrides.clear()
+    search.invalidate_results()
+
+
+@pytest.fixture
+def db_session(engine):
+    db = sessionmaker(bind=engine)()
+
+    db.add(models.User(id=1, username="agent", email="agent@test.com", role="agent", is_verified=True))
+    db.add(models.User(id=2, username="pending", email="pending@test.com", role="agent", is_verified=False))
+    prices = [300, 100, 200, 100, 500, 400, 100]
+    for prop_id, price in enumerate(prices, start=1):
+        db.add(models.Property(
+            id=prop_id, title=f"Апартамент {prop_id}", price=price,
+            property_type="sale", location="София", owner_id=1
+        ))
+    db.add(models.Property(id=8, title="Апартамент 8", price=50, property_type="sale", location="София", owner_id=2))
+    db.commit()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def client(db_session):
+    app.dependency_overrides[get_db] = lambda: db_session
+    return TestClient(app)
+
+
+def collect_pages(client, url):
+    ids, cursor, pages = [], None, 0
+    while True:
+        response = client.get(url + (f"&cursor={cursor}" if cursor else ""))
+        assert response.status_code == 200
+        body = response.json()
+        ids += [p["id"] for p in body["items"]]
+        pages += 1
+        cursor = body["next_cursor"]
+        if not cursor:
+            return ids, pages
+
+
+@pytest.mark.parametrize("sort, expected", [
+    ("newest", [7, 6, 5, 4, 3, 2, 1]),
+    ("id", [1, 2, 3, 4, 5, 6, 7]),
+    ("price_asc", [2, 4, 7, 3, 1, 6, 5]),
+    ("price_desc", [5, 6, 1, 3, 7, 4, 2]),
+])
+def test_pages_cover_every_listing_once(client, sort, expected):
+    ids, pages = collect_pages(client, f"/properties/?sort={sort}&limit=2")
+
+    assert ids == expected
+    assert pages == 4
+
+
+def test_relevance_sort_pages_through_ranked_results(client):
+    ids, _ = collect_pages(client, "/properties/?q=апартамент&limit=3")
+
+    assert sorted(ids) == [1, 2, 3, 4, 5, 6, 7]
+
+
+def test_page_size_is_capped(client):
+    response = client.get(f"/properties/?limit={pagination.MAX_PAGE_SIZE + 1}")
+    assert response.status_code == 422
+
+
+def test_invalid_sort_rejected(client):
+    response = client.get("/properties/?sort=cheapest")
+    assert response.status_code == 400
+
+
+def test_cursor_must_match_sort(client):
+    cursor = client.get("/properties/?sort=price_asc&limit=2").json()["next_cursor"]
+
+    response = client.get(f"/properties/?sort=newest&cursor={cursor}")
+    assert response.status_code == 400
+
+    response = client.get("/properties/?cursor=not-a-cursor")
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("values", [
+    ["100", 4], [[1], 4], [100.0], [100.0, 4, 5], [100.0, None], [True, 4], [{"a": 1}, 4],
+])
+def test_tampered_cursor_rejected(client, values):
+    cursor = pagination.encode_cursor("price_asc", values)
+
+    response = client.get(f"/properties/?sort=price_asc&cursor={cursor}")
+
+    assert response.status_code == 400
+
+
+def test_cursor_round_trip():
+    cursor = pagination.encode_cursor("price_asc", [100.0, 4])
+    assert pagination.decode_cursor(cursor, "price_asc") == [100.0, 4]
+
+
+def test_search_page_links_to_next_page(client, monkeypatch):
+    monkeypatch.setattr(pagination, "DEFAULT_PAGE_SIZE", 5)
+    response = client.get("/properties-page")
+
+    assert response.status_code == 200
+    assert "cursor=" in response.text
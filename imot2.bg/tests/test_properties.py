@@ -1,10 +1,13 @@
 import pytest
 from unittest.mock import MagicMock, patch
 from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
 from main import app
-from database import get_db, SessionLocal
+from database import get_db
 from routers.auth import get_current_user
 import models
+import search
+import uploads
 import io
 
 def mock_verified_agent():
@@ -23,6 +26,7 @@ def mock_admin():
 def clean_overrides():
     yield
     app.dependency_overrides.clear()
+    search.invalidate_results()
 
 
 @pytest.fixture
@@ -31,8 +35,15 @@ def client():
 
 
 @pytest.fixture
-def db_session():
-    db = SessionLocal()
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOAD_DIR", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def db_session(engine):
+    db = sessionmaker(bind=engine)()
+    app.dependency_overrides[get_db] = lambda: db
     try:
         yield db
     finally:
@@ -53,13 +64,15 @@ def test_get_properties_filters(client):
         status="available"  # Липсваше
     )
 
-    mock_query = mock_db.query.return_value.join.return_value.filter.return_value
-    mock_query.filter.return_value.filter.return_value.filter.return_value.all.return_value = [fake_prop]
+    mock_query = mock_db.query.return_value.options.return_value.join.return_value.filter.return_value
+    mock_query = mock_query.filter.return_value.filter.return_value
+    mock_query.order_by.return_value.limit.return_value.all.return_value = [fake_prop]
 
     response = client.get("/properties/?title=Apartment&prop_type=rent&location=Sofia")
 
     assert response.status_code == 200
-    assert response.json()[0]["status"] == "available"
+    assert response.json()["items"][0]["status"] == "available"
+    assert response.json()["next_cursor"] is None
 
 
 def test_create_property_success(client):
@@ -96,7 +109,7 @@ def test_create_property_unverified_error(client):
     assert "Account not verified" in response.json()["detail"]
 
 
-def test_upload_image_success(client):
+def test_upload_image_success(client, upload_dir):
     mock_db = MagicMock()
     app.dependency_overrides[get_db] = lambda: mock_db
     app.dependency_overrides[get_current_user] = mock_verified_agent
@@ -104,7 +117,7 @@ def test_upload_image_success(client):
     mock_prop = models.Property(id=1, owner_id=1)
     mock_db.query.return_value.filter.return_value.first.return_value = mock_prop
 
-    file_content = b"fake-image-binary"
+    file_content = b"\xff\xd8\xff" + b"fake-image-binary"
     file = io.BytesIO(file_content)
 
     response = client.post(
@@ -158,6 +171,7 @@ def test_delete_property_not_found(client):
 
 
 def test_get_property_api_details(client, db_session):
+    db_session.add(mock_verified_agent())
     prop = models.Property(title="API House", price=1000, location="Sofia", property_type="sale", owner_id=1)
     db_session.add(prop)
     db_session.commit()
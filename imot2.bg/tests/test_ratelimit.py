@@ -0,0 +1,99 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+from main import app
+from database import get_db
+import hashing
+import models
+import ratelimit
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def clean_overrides():
+    ratelimit.reset()
+    yield
+    app.dependency_overrides.clear()
+    ratelimit.reset()
+
+
+@pytest.fixture
+def db_session(engine):
+    db = sessionmaker(bind=engine)()
+    db.add(models.User(id=1, username="ivan", email="ivan@test.com", role="client", is_verified=True,
+                       hashed_password=hashing.pwd_context.copy(bcrypt__rounds=4).hash("secret123")))
+    db.commit()
+    app.dependency_overrides[get_db] = lambda: db
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@pytest.mark.parametrize("make_backend", [ratelimit.MemoryBackend, "database"])
+def test_bucket_refills_over_time(make_backend, engine):
+    backend = ratelimit.DatabaseBackend(engine) if make_backend == "database" else make_backend()
+
+    assert backend.take("k", 2, 1.0, now=100.0) == (True, 0.0)
+    assert backend.take("k", 2, 1.0, now=100.0) == (True, 0.0)
+    allowed, retry_after = backend.take("k", 2, 1.0, now=100.5)
+    assert not allowed and retry_after == pytest.approx(0.5)
+    assert backend.take("k", 2, 1.0, now=101.0)[0]
+    assert backend.take("other", 2, 1.0, now=101.0)[0]
+    # A long idle period refills only up to capacity.
+    assert [backend.take("k", 2, 1.0, now=500.0)[0] for _ in range(3)] == [True, True, False]
+
+
+def test_memory_backend_drops_least_recently_used_keys():
+    backend = ratelimit.MemoryBackend(max_keys=2)
+    backend.take("a", 1, 1.0, now=0.0)
+    backend.take("b", 1, 1.0, now=0.0)
+    backend.take("c", 1, 1.0, now=0.0)
+
+    assert not backend.take("c", 1, 1.0, now=0.0)[0]
+    assert backend.take("a", 1, 1.0, now=0.0)[0]
+
+
+def test_login_is_throttled_per_username(db_session, monkeypatch):
+    monkeypatch.setattr(ratelimit.LOGIN_BY_USERNAME, "capacity", 2)
+
+    statuses = [client.post("/auth/login", json={"username": name, "password": "wrong"}).status_code
+                for name in ("ivan", "IVAN", "ivan", "maria")]
+
+    assert statuses == [401, 401, 429, 401]
+    stats = ratelimit.stats()["login-user"]
+    assert (stats["allowed"], stats["rejected"]) == (3, 1)
+
+
+def test_rejected_login_does_not_check_the_password(db_session, monkeypatch):
+    monkeypatch.setattr(ratelimit.LOGIN_BY_IP, "capacity", 1)
+    hashing.metrics.reset()
+    client.post("/auth/login", json={"username": "ivan", "password": "secret123"})
+
+    response = client.post("/auth/login", json={"username": "ivan", "password": "secret123"})
+
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 1
+    assert hashing.metrics.stats()["completed"] == 1
+
+
+def test_register_is_throttled_per_ip(db_session, monkeypatch):
+    monkeypatch.setattr(ratelimit.REGISTER_BY_IP, "capacity", 1)
+    payload = {
+        "email": "maria@test.com", "username": "maria", "password": "pass1234",
+        "first_name": "Maria", "last_name": "Petrova", "role": "client"
+    }
+
+    assert client.post("/auth/register", json=payload).status_code == 200
+    assert client.post("/auth/register", json={**payload, "username": "maria2"}).status_code == 429
+    assert ratelimit.stats()["register-ip"]["rejected"] == 1
+
+
+def test_database_backend_shares_buckets_between_workers(db_session, engine, monkeypatch):
+    monkeypatch.setattr(ratelimit, "backend", ratelimit.DatabaseBackend(engine))
+    monkeypatch.setattr(ratelimit.LOGIN_BY_USERNAME, "capacity", 1)
+
+    assert client.post("/auth/login", json={"username": "ivan", "password": "wrong"}).status_code == 401
+    assert client.post("/auth/login", json={"username": "ivan", "password": "wrong"}).status_code == 429
+    assert db_session.query(models.RateLimitBucket).count() == 2
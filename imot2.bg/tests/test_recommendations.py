@@ -0,0 +1,125 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from main import app
+from database import get_db, same_database
+from routers.auth import get_current_user
+import models
+import recommendations
+import search
+import summary
+
+
+@pytest.fixture(autouse=True)
+def clean_overrides():
+    yield
+    app.dependency_overrides.clear()
+    search.invalidate_results()
+    recommendations.index.clear()
+
+
+@pytest.fixture
+def db_session(engine):
+    db = sessionmaker(bind=engine)()
+    db.add(models.User(id=1, username="agent", email="agent@test.com", role="agent", is_verified=True,
+                       first_name="A", last_name="B"))
+    db.add_all([
+        models.Property(id=1, title="Двустаен Лозенец", price=150000, property_type="sale",
+                        location="София, Лозенец", latitude=42.675, longitude=23.330, owner_id=1),
+        models.Property(id=2, title="Двустаен Иван Вазов", price=160000, property_type="sale",
+                        location="София, Иван Вазов", latitude=42.680, longitude=23.315, owner_id=1),
+        models.Property(id=3, title="Тристаен Младост", price=230000, property_type="sale",
+                        location="София, Младост", latitude=42.650, longitude=23.380, owner_id=1),
+        models.Property(id=4, title="Двустаен под наем", price=900, property_type="rent",
+                        location="София, Лозенец", latitude=42.676, longitude=23.331, owner_id=1),
+        models.Property(id=5, title="Двустаен Пловдив", price=150000, property_type="sale",
+                        location="Пловдив", owner_id=1),
+        models.Property(id=6, title="Продаден", price=150000, property_type="sale",
+                        location="София, Лозенец", owner_id=1, status="sold"),
+    ])
+    db.commit()
+    summary.rebuild(db)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def client(db_session):
+    app.dependency_overrides[get_db] = lambda: db_session
+    app.dependency_overrides[get_current_user] = lambda: db_session.get(models.User, 1)
+    return TestClient(app)
+
+
+def similar_ids(client, prop_id):
+    response = client.get(f"/properties/{prop_id}")
+    assert response.status_code == 200
+    return [similar["id"] for similar in response.json()["similar"]]
+
+
+def test_details_list_most_similar_listings_first(client):
+    assert similar_ids(client, 1) == [2, 3, 5, 4]
+
+
+def test_similar_listings_carry_card_fields(client, db_session):
+    db_session.add(models.PropertyImage(property_id=2, url="static/uploads/2.jpg"))
+    summary.rebuild(db_session)
+
+    first = client.get("/properties/1").json()["similar"][0]
+
+    assert first == {
+        "id": 2, "title": "Двустаен Иван Вазов", "price": 160000, "property_type": "sale",
+        "location": "София, Иван Вазов", "cover_image_url": "static/uploads/2.jpg", "average_rating": None,
+    }
+
+
+def test_writes_update_index_in_place(client, db_session):
+    similar_ids(client, 1)
+    built_at = recommendations.index._built_at
+
+    created = client.post("/properties/", json={
+        "title": "Двустаен до НДК", "price": 151000, "property_type": "sale",
+        "location": "София, Лозенец", "latitude": 42.675, "longitude": 23.329
+    }).json()
+    client.delete("/properties/2")
+
+    assert similar_ids(client, 1)[:2] == [created["id"], 3]
+    assert recommendations.index._built_at == built_at
+    assert len(recommendations.index) == 5
+
+
+def test_index_is_rebuilt_when_stale(db_session):
+    now = [0.0]
+    index = recommendations.SimilarityIndex(refresh_seconds=10, clock=lambda: now[0])
+    prop = db_session.get(models.Property, 1)
+    index.similar(db_session, prop)
+
+    moved = db_session.get(models.Property, 3)
+    moved.price, moved.latitude, moved.longitude = 150000, 42.675, 23.330
+    db_session.commit()
+    now[0] = 11.0
+
+    assert index.similar(db_session, prop, limit=1) == [3]
+
+
+def test_removing_rows_keeps_positions_consistent():
+    index = recommendations.SimilarityIndex()
+    for prop_id in range(1, 6):
+        index._upsert((prop_id, 1000 * prop_id, "sale", "София", None, None, None))
+
+    index._remove(2)
+    index._remove(5)
+
+    assert sorted(index._rows) == [1, 3, 4]
+    assert all(index._ids[row] == prop_id for prop_id, row in index._rows.items())
+
+
+def test_engines_on_one_database_share_the_index(tmp_path):
+    url = f"sqlite:///{tmp_path / 'test.db'}"
+    sync_engine, other_engine = create_engine(url), create_engine(url)
+
+    assert same_database(sync_engine, other_engine)
+    assert not same_database(create_engine("sqlite://"), create_engine("sqlite://"))
+    assert not same_database(sync_engine, create_engine(f"sqlite:///{tmp_path / 'other.db'}"))
@@ -1,10 +1,11 @@
+import asyncio
 import pytest
-from unittest.mock import MagicMock
 from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
 from main import app
-from database import get_db
 from routers.auth import get_current_user
 import models
+import recommendations
 
 client = TestClient(app)
 
@@ -18,20 +19,24 @@ def mock_reviewer():
     return models.User(id=1, username="reviewer_1", role="client")
 
 
-def test_create_review_success():
-    mock_db = MagicMock()
-    app.dependency_overrides[get_db] = lambda: mock_db
-    app.dependency_overrides[get_current_user] = mock_reviewer
-
-    mock_db.query.return_value.filter.return_value.first.side_effect = [
-        models.Property(id=10, title="Beach House"),
-        None
-    ]
+@pytest.fixture
+def db_session(shared_engine, async_db):
+    db = sessionmaker(bind=shared_engine)()
+    db.add_all([
+        models.User(id=1, username="reviewer_1", email="reviewer@test.com", role="client", is_verified=True),
+        models.User(id=2, username="agent", email="agent@test.com", role="agent", is_verified=True),
+        models.Property(id=10, title="Beach House", price=1000, property_type="sale", location="Варна",
+                        owner_id=2),
+    ])
+    db.commit()
+    try:
+        yield db
+    finally:
+        db.close()
 
-    def mock_add(obj):
-        obj.id = 50
 
-    mock_db.add.side_effect = mock_add
+def test_create_review_success(db_session):
+    app.dependency_overrides[get_current_user] = mock_reviewer
 
     payload = {"property_id": 10, "rating": 5, "comment": "Amazing place!"}
     response = client.post("/reviews/", json=payload)
@@ -39,18 +44,35 @@ def test_create_review_success():
     assert response.status_code == 200
     assert response.json()["rating"] == 5
     assert response.json()["author_id"] == 1
-    assert mock_db.commit.called
+    summary = db_session.get(models.PropertySummary, 10)
+    assert (summary.review_count, summary.rating_total) == (1, 5)
 
 
-def test_create_review_duplicate_error():
-    mock_db = MagicMock()
-    app.dependency_overrides[get_db] = lambda: mock_db
+def test_review_refreshes_recommendations_off_the_event_loop(db_session, monkeypatch):
     app.dependency_overrides[get_current_user] = mock_reviewer
+    index = recommendations.index
+    index.similar(db_session, db_session.get(models.Property, 10))
+    refresh, on_event_loop = index.refresh, []
+
+    def recording_refresh(db, property_ids):
+        try:
+            on_event_loop.append(asyncio.get_running_loop() is not None)
+        except RuntimeError:
+            on_event_loop.append(False)
+        refresh(db, property_ids)
+
+    monkeypatch.setattr(index, "refresh", recording_refresh)
+    response = client.post("/reviews/", json={"property_id": 10, "rating": 4, "comment": "Добре"})
+
+    assert response.status_code == 200
+    assert on_event_loop == [False]
+    assert index._features[index._rows[10], recommendations.RATING] == 4
 
-    mock_db.query.return_value.filter.return_value.first.side_effect = [
-        models.Property(id=10),
-        models.Review(id=1, author_id=1, property_id=10)
-    ]
+
+def test_create_review_duplicate_error(db_session):
+    app.dependency_overrides[get_current_user] = mock_reviewer
+    db_session.add(models.Review(id=1, author_id=1, property_id=10, rating=3))
+    db_session.commit()
 
     payload = {"property_id": 10, "rating": 4, "comment": "Another one"}
     response = client.post("/reviews/", json=payload)
@@ -58,40 +80,28 @@ def test_create_review_duplicate_error():
     assert response.status_code == 400
     assert "already reviewed this property" in response.json()["detail"]
 
-
-def test_create_review_invalid_rating():
-    mock_db = MagicMock()
-    app.dependency_overrides[get_db] = lambda: mock_db
+def test_create_review_invalid_rating(db_session):
     app.dependency_overrides[get_current_user] = mock_reviewer
 
-    mock_db.query.return_value.filter.return_value.first.return_value = models.Property(id=10)
-
     payload = {"property_id": 10, "rating": 6, "comment": "Too high"}
     response = client.post("/reviews/", json=payload)
 
     assert response.status_code == 422
 
-def test_create_review_property_not_found():
-    mock_db = MagicMock()
-    app.dependency_overrides[get_db] = lambda: mock_db
+def test_create_review_property_not_found(db_session):
     app.dependency_overrides[get_current_user] = mock_reviewer
 
-    mock_db.query.return_value.filter.return_value.first.return_value = None
-
     response = client.post("/reviews/", json={"property_id": 999, "rating": 5, "comment": "X"})
     assert response.status_code == 404
     assert "Property not found" in response.json()["detail"]
 
 
-def test_get_property_reviews():
-    mock_db = MagicMock()
-    app.dependency_overrides[get_db] = lambda: mock_db
-
-    fake_reviews = [
+def test_get_property_reviews(db_session):
+    db_session.add_all([
         models.Review(id=1, property_id=10, rating=5, comment="Great", author_id=1),
         models.Review(id=2, property_id=10, rating=4, comment="Good", author_id=2)
-    ]
-    mock_db.query.return_value.filter.return_value.all.return_value = fake_reviews
+    ])
+    db_session.commit()
 
     response = client.get("/reviews/property/10")
     assert response.status_code == 200
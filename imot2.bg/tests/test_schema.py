@@ -0,0 +1,78 @@
+from datetime import datetime
+import pytest
+from sqlalchemy import or_, tuple_
+from sqlalchemy.orm import sessionmaker
+import models
+import pagination
+import search
+
+
+@pytest.fixture
+def db_session(engine):
+    db = sessionmaker(bind=engine)()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def query_plan(db, query):
+    """Runs EXPLAIN QUERY PLAN for an ORM query with its real bound parameters."""
+    compiled = query.statement.compile(db.get_bind())
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    rows = db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params).all()
+    return "\n".join(row[-1] for row in rows)
+
+
+@pytest.mark.sqlite
+def test_search_by_type_and_price_uses_partial_index(db_session):
+    query, rank = search.filter_properties(db_session, prop_type="sale", max_price=200000)
+    query = query.order_by(models.Property.price, models.Property.id)
+
+    plan = query_plan(db_session, query)
+
+    assert "USING INDEX ix_properties_listed_type_price" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+@pytest.mark.sqlite
+def test_price_sorted_page_seeks_through_partial_index(db_session):
+    query, rank = search.filter_properties(db_session)
+    page = query.filter(
+        tuple_(models.Property.price, models.Property.id) > tuple_(150000.0, 42)
+    ).order_by(models.Property.price, models.Property.id).limit(pagination.DEFAULT_PAGE_SIZE + 1)
+
+    plan = query_plan(db_session, page)
+
+    assert "USING INDEX ix_properties_listed_price" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+@pytest.mark.sqlite
+def test_owner_listings_use_owner_index(db_session):
+    query = db_session.query(models.Property).filter(models.Property.owner_id == 1)
+
+    assert "USING INDEX ix_properties_owner_id" in query_plan(db_session, query)
+
+
+@pytest.mark.sqlite
+def test_booking_slot_check_uses_property_date_index(db_session):
+    query = db_session.query(models.Booking).filter(
+        models.Booking.property_id == 10,
+        models.Booking.booking_date == datetime(2026, 5, 20, 10, 0),
+        models.Booking.status == "confirmed"
+    )
+
+    assert "USING INDEX ix_bookings_property_date" in query_plan(db_session, query)
+
+
+@pytest.mark.sqlite
+def test_conversation_uses_message_indexes(db_session):
+    query = db_session.query(models.Message).filter(
+        or_(
+            (models.Message.sender_id == 1) & (models.Message.receiver_id == 2),
+            (models.Message.sender_id == 2) & (models.Message.receiver_id == 1)
+        )
+    )
+
+    assert "USING INDEX ix_messages_sender_receiver_time" in query_plan(db_session, query)
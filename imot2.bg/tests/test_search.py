@@ -0,0 +1,97 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+from main import app
+from database import get_db
+import models
+import search
+
+
+@pytest.fixture(autouse=True)
+def clean_overrides():
+    yield
+    app.dependency_overrides.clear()
+    search.invalidate_results()
+
+
+@pytest.fixture
+def db_session(engine):
+    db = sessionmaker(bind=engine)()
+
+    agent = models.User(id=1, username="agent", email="agent@test.com", role="agent", is_verified=True)
+    db.add(agent)
+    db.add_all([
+        models.Property(id=1, title="Тристаен апартамент", description="Светъл, с гледка към Витоша",
+                        price=250000, property_type="sale", location="София, Лозенец", owner_id=1),
+        models.Property(id=2, title="Къща с двор", description="Близо до апартамент комплекс",
+                        price=180000, property_type="sale", location="Пловдив", owner_id=1),
+        models.Property(id=3, title="Studio apartment", description="Central",
+                        price=600, property_type="rent", location="Sofia, Center", owner_id=1),
+    ])
+    db.commit()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def client(db_session):
+    app.dependency_overrides[get_db] = lambda: db_session
+    return TestClient(app)
+
+
+def test_tokenize_handles_cyrillic_and_punctuation():
+    assert search.tokenize("  София, ЛОЗЕНЕЦ!") == ["софия", "лозенец"]
+    assert search.tokenize(None) == []
+
+
+def test_match_expression_quotes_user_input():
+    match = search.build_match_expression(q='апартамент" OR *', location="Sofia")
+    assert match == 'location : ("sofia"*) AND ("апартамент"* AND "or"*)'
+
+
+def test_search_is_case_insensitive_for_cyrillic(client):
+    response = client.get("/properties/?location=софия")
+
+    assert response.status_code == 200
+    assert [p["id"] for p in response.json()["items"]] == [1]
+
+
+@pytest.mark.sqlite
+def test_search_ranks_title_matches_first(client):
+    response = client.get("/properties/?q=апартамент")
+
+    assert [p["id"] for p in response.json()["items"]] == [1, 2]
+
+
+def test_search_matches_word_prefixes(client):
+    response = client.get("/properties/?title=apart")
+
+    assert [p["id"] for p in response.json()["items"]] == [3]
+
+
+def test_index_follows_updates_and_deletes(client, db_session):
+    db_session.get(models.Property, 2).title = "Вила"
+    db_session.delete(db_session.get(models.Property, 1))
+    db_session.commit()
+
+    response = client.get("/properties/?q=апартамент")
+    assert [p["id"] for p in response.json()["items"]] == [2]
+
+    response = client.get("/properties/?title=вила")
+    assert [p["id"] for p in response.json()["items"]] == [2]
+
+
+@pytest.mark.sqlite
+def test_setup_backfills_existing_rows(db_session):
+    db_session.execute(text(f"DROP TABLE {search.FTS_TABLE}"))
+    db_session.commit()
+
+    search.setup_search_index(db_session.get_bind())
+
+    rows = db_session.execute(
+        text(f"SELECT rowid FROM {search.FTS_TABLE} WHERE {search.FTS_TABLE} MATCH 'лозенец'")
+    ).all()
+    assert rows == [(1,)]
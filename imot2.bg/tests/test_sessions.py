@@ -0,0 +1,146 @@
+import asyncio
+import time
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import NullPool
+from main import app
+from database import async_url, get_db
+from routers.auth import get_current_user
+import models
+import sessions
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def clean_overrides():
+    yield
+    app.dependency_overrides.clear()
+    sessions.revocations.clear()
+    client.cookies.clear()
+
+
+@pytest.fixture
+def db_session(shared_engine, async_db):
+    db = sessionmaker(bind=shared_engine)()
+    db.add(models.User(id=1, username="ivan", email="ivan@test.com", role="client", is_verified=True))
+    db.commit()
+    app.dependency_overrides[get_db] = lambda: db
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def user():
+    return models.User(id=1, username="ivan", role="client", is_verified=True)
+
+
+def test_token_carries_claims():
+    session = sessions.decode(sessions.issue(user()))
+
+    assert (session.id, session.username, session.role, session.is_verified) == (1, "ivan", "client", True)
+    assert session.expires_at - session.issued_at == pytest.approx(sessions.SESSION_TTL_SECONDS, abs=1)
+
+
+def test_forged_expired_and_unknown_key_tokens_are_rejected(monkeypatch):
+    token = sessions.issue(user())
+    header, payload, signature = token.split(".")
+    with pytest.raises(sessions.InvalidSession):
+        sessions.decode(f"{header}.{payload}.{signature[::-1]}")
+
+    monkeypatch.setattr(sessions, "SESSION_TTL_SECONDS", -10)
+    with pytest.raises(sessions.InvalidSession):
+        sessions.decode(sessions.issue(user()))
+
+    monkeypatch.setattr(sessions, "keys", {"other": "secret"})
+    with pytest.raises(sessions.InvalidSession):
+        sessions.decode(token)
+
+
+def test_rotated_out_signing_key_is_still_accepted(monkeypatch):
+    monkeypatch.setattr(sessions, "keys", sessions.parse_keys("old:first-secret"))
+    old_token = sessions.issue(user())
+
+    monkeypatch.setattr(sessions, "keys", sessions.parse_keys("new:second-secret, old:first-secret"))
+
+    assert sessions.decode(old_token).username == "ivan"
+    assert sessions.jwt.get_unverified_header(sessions.issue(user()))["kid"] == "new"
+
+
+def test_logout_revokes_token_in_every_process(db_session):
+    token = sessions.issue(user())
+    client.cookies.set(sessions.COOKIE_NAME, token)
+    assert client.get("/messages/inbox").status_code == 200
+
+    assert client.get("/auth/logout", follow_redirects=False).status_code == 303
+
+    client.cookies.set(sessions.COOKIE_NAME, token)
+    assert client.get("/messages/inbox").status_code == 401
+    other_worker = sessions.RevocationList()
+    assert other_worker.is_revoked(db_session, sessions.decode(token))
+    assert not other_worker.is_revoked(db_session, sessions.decode(sessions.issue(user())))
+
+
+def test_revocations_are_reloaded_after_refresh_interval(db_session):
+    now = [0.0]
+    revocations = sessions.RevocationList(refresh_seconds=30, clock=lambda: now[0])
+    session = sessions.decode(sessions.issue(user()))
+    assert not revocations.is_revoked(db_session, session)
+
+    db_session.add(models.RevokedSession(user_id=1, revoked_at=time.time() + 1, expires_at=time.time() + 60))
+    db_session.commit()
+
+    assert not revocations.is_revoked(db_session, session)
+    now[0] = 31
+    assert revocations.is_revoked(db_session, session)
+
+
+def test_revocation_applies_in_memory_only_once_committed(db_session):
+    session = sessions.decode(sessions.issue(user()))
+    assert not sessions.revocations.is_revoked(db_session, session)
+
+    sessions.revocations.revoke_user(db_session, session.id)
+    sessions.revocations.revoke(db_session, session)
+    assert not sessions.revocations.is_revoked(db_session, session)
+    db_session.rollback()
+    db_session.commit()
+    assert not sessions.revocations.is_revoked(db_session, session)
+
+    sessions.revocations.revoke(db_session, session)
+    db_session.commit()
+    assert sessions.revocations.is_revoked(db_session, session)
+
+
+def test_role_check_needs_no_query(db_session):
+    client.cookies.set(sessions.COOKIE_NAME, sessions.issue(user()))
+    client.get("/admin/reviews")  # loads the revocation list
+    statements = []
+    event.listen(db_session.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    response = client.get("/admin/reviews")
+
+    assert response.status_code == 403
+    assert statements == []
+
+
+def test_async_check_only_queries_when_a_reload_is_due(db_session):
+    now = [0.0]
+    revocations = sessions.RevocationList(refresh_seconds=30, clock=lambda: now[0])
+    session = sessions.decode(sessions.issue(user()))
+    engine = create_async_engine(async_url(str(db_session.get_bind().url)), poolclass=NullPool)
+    statements = []
+    event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    async def check():
+        async with AsyncSession(engine) as db:
+            results = [await revocations.is_revoked_async(db, session) for _ in range(3)]
+            now[0] = 31
+            return results + [await revocations.is_revoked_async(db, session)]
+
+    assert asyncio.run(check()) == [False] * 4
+    assert len(statements) == 2
+    assert asyncio.iscoroutinefunction(get_current_user)
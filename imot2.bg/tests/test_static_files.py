@@ -0,0 +1,92 @@
+import gzip
+import hashlib
+import os
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from main import app
+import static_files
+import uploads
+
+CONTENT = b"\xff\xd8\xff\xe0" + bytes(range(256)) * 4
+SHA256 = hashlib.sha256(CONTENT).hexdigest()
+
+
+@pytest.fixture
+def client(tmp_path):
+    (tmp_path / f"{SHA256}.jpg").write_bytes(CONTENT)
+    (tmp_path / "legacy.jpg").write_bytes(CONTENT)
+    files_app = FastAPI()
+    files_app.mount("/static/uploads", static_files.UploadedFiles(directory=str(tmp_path)))
+    return TestClient(files_app)
+
+
+def test_content_addressed_file_is_immutable_with_strong_etag(client):
+    response = client.get(f"/static/uploads/{SHA256}.jpg")
+
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["cache-control"] == static_files.CACHE_CONTROL
+    assert response.headers["etag"] == f'"{SHA256}.jpg"'
+    assert response.headers["content-type"] == "image/jpeg"
+
+
+def test_matching_etag_gets_not_modified(client):
+    response = client.get(f"/static/uploads/{SHA256}.jpg", headers={"If-None-Match": f'"{SHA256}.jpg"'})
+
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["cache-control"] == static_files.CACHE_CONTROL
+
+
+def test_other_uploads_keep_default_etag(client):
+    response = client.get("/static/uploads/legacy.jpg")
+
+    assert response.headers["cache-control"] == static_files.CACHE_CONTROL
+    assert response.headers["etag"] != '"legacy.jpg"'
+
+
+def test_range_request_returns_partial_content(client):
+    response = client.get(f"/static/uploads/{SHA256}.jpg", headers={"Range": "bytes=4-11"})
+
+    assert response.status_code == 206
+    assert response.content == CONTENT[4:12]
+    assert response.headers["content-range"] == f"bytes 4-11/{len(CONTENT)}"
+
+
+def test_precompressed_copy_served_when_accepted(client, tmp_path):
+    (tmp_path / f"{SHA256}.jpg.gz").write_bytes(gzip.compress(CONTENT))
+    url = f"/static/uploads/{SHA256}.jpg"
+
+    compressed = client.get(url, headers={"Accept-Encoding": "br;q=0, gzip"})
+    plain = client.get(url, headers={"Accept-Encoding": "identity, gzip;q=0"})
+
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.content == CONTENT  # decoded by the client
+    assert compressed.headers["etag"] == f'"{SHA256}.jpg.gzip"'
+    assert compressed.headers["content-type"] == "image/jpeg"
+    assert "content-encoding" not in plain.headers
+    assert plain.content == CONTENT
+    assert compressed.headers["vary"] == plain.headers["vary"] == "Accept-Encoding"
+
+
+def test_encoding_qualities():
+    assert static_files.encoding_qualities("gzip, br;q=0.5, *;q=0, deflate;q=x") == {
+        "gzip": 1.0, "br": 0.5, "*": 0.0, "deflate": 0.0
+    }
+    assert static_files.encoding_qualities(None) == {}
+
+
+def test_app_serves_uploads_through_cached_mount():
+    name = f"{SHA256}.jpg"
+    path = os.path.join(uploads.UPLOAD_DIR, name)
+    os.makedirs(uploads.UPLOAD_DIR, exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(CONTENT)
+    try:
+        response = TestClient(app).get(f"/static/uploads/{name}")
+    finally:
+        os.remove(path)
+
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == static_files.CACHE_CONTROL
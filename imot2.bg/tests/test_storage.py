@@ -0,0 +1,173 @@
+import io
+import os
+import pytest
+from PIL import Image
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+from main import app
+from database import get_db
+from routers.auth import get_current_user
+import models
+import search
+import storage
+import uploads
+
+
+def photo(color="red"):
+    buffer = io.BytesIO()
+    Image.new("RGB", (800, 600), color).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+@pytest.fixture(autouse=True)
+def clean_overrides():
+    yield
+    app.dependency_overrides.clear()
+    search.invalidate_results()
+
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOAD_DIR", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def db_session(engine):
+    db = sessionmaker(bind=engine)()
+    db.add(models.User(id=1, username="agent", email="agent@test.com", role="agent", is_verified=True))
+    db.add_all([
+        models.Property(id=prop_id, title=f"Имот {prop_id}", price=500, property_type="rent", location="София",
+                        owner_id=1)
+        for prop_id in (1, 2)
+    ])
+    db.commit()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def client(db_session, upload_dir):
+    app.dependency_overrides[get_db] = lambda: db_session
+    app.dependency_overrides[get_current_user] = lambda: db_session.get(models.User, 1)
+    return TestClient(app)
+
+
+def upload(client, prop_id, content):
+    response = client.post(f"/properties/{prop_id}/upload-image", files={"file": ("p.jpg", content, "image/jpeg")})
+    assert response.status_code == 200
+    return response.json()
+
+
+def stored_files(upload_dir):
+    return sorted(path.name for path in upload_dir.rglob("*") if path.is_file())
+
+
+def test_identical_uploads_are_stored_once(client, db_session, upload_dir):
+    content = photo()
+
+    first = upload(client, 1, content)
+    second = upload(client, 2, content)
+
+    assert first["url"] == second["url"]
+    assert first["url"] == "/" + storage.content_path(first["sha256"], ".jpg")
+    assert stored_files(upload_dir).count(f"{first['sha256']}.jpg") == 1
+    db_session.expire_all()
+    stored = db_session.get(models.StoredFile, first["sha256"])
+    assert stored.ref_count == 2
+    assert [image.variants for image in db_session.query(models.PropertyImage)] == [stored.variants] * 2
+
+
+def test_file_is_collected_after_its_last_reference(client, db_session, upload_dir):
+    sha256 = upload(client, 1, photo())["sha256"]
+    upload(client, 2, photo())
+    upload(client, 2, photo("blue"))
+    files_with_variants = len(stored_files(upload_dir))
+
+    assert client.delete("/properties/1").status_code == 204
+    db_session.expire_all()
+    assert db_session.get(models.StoredFile, sha256).ref_count == 1
+
+    assert client.delete("/properties/2").status_code == 204
+    db_session.expire_all()
+    assert [row.ref_count for row in db_session.query(models.StoredFile)] == [0, 0]
+    assert len(stored_files(upload_dir)) == files_with_variants
+    assert storage.collect_garbage(db_session).get("removed") == 0
+
+    storage.collect_garbage(db_session, min_age=0)
+
+    assert db_session.query(models.StoredFile).count() == 0
+    assert stored_files(upload_dir) == []
+
+
+def test_released_file_survives_an_upload_in_flight(client, db_session, upload_dir):
+    sha256 = upload(client, 1, photo())["sha256"]
+    assert client.delete("/properties/1").status_code == 204
+    age(*[path for path in upload_dir.rglob("*") if path.is_file()])
+    # Another upload of the same bytes has moved its file into place but not committed yet.
+    stored = storage.content_path(sha256, ".jpg")
+    os.utime(stored)
+
+    storage.collect_garbage(db_session)
+
+    assert os.path.exists(stored)
+    assert upload(client, 2, photo())["sha256"] == sha256
+    db_session.expire_all()
+    assert db_session.get(models.StoredFile, sha256).ref_count == 1
+
+
+@pytest.fixture
+def relative_upload_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(uploads, "UPLOAD_DIR", "static/uploads")
+    os.makedirs("static/uploads")
+    return tmp_path / "static" / "uploads"
+
+
+def age(*paths):
+    for path in paths:
+        os.utime(path, (1_000_000_000, 1_000_000_000))
+
+
+def test_gc_removes_only_unreferenced_files(client, db_session, relative_upload_dir):
+    kept = relative_upload_dir.parent.parent / storage.content_path(upload(client, 1, photo())["sha256"], ".jpg")
+    legacy = relative_upload_dir / "legacy.jpg"
+    legacy_card = relative_upload_dir / "legacy.card.webp"
+    orphan = relative_upload_dir / "ef" / "01" / f"{'f' * 64}.jpg"
+    orphan_thumb = relative_upload_dir / "ef" / "01" / f"{'f' * 64}.thumb.jpg"
+    leftover = relative_upload_dir / "crashed-upload.png"
+    fresh = relative_upload_dir / "in-progress.jpg"
+    orphan.parent.mkdir(parents=True)
+    for path in (legacy, legacy_card, orphan, orphan_thumb, leftover, fresh):
+        path.write_bytes(b"x" * 10)
+    db_session.add(models.PropertyImage(property_id=2, url="/static/uploads/legacy.jpg"))
+    db_session.commit()
+    age(*[path for path in relative_upload_dir.rglob("*") if path.is_file() and path != fresh])
+    files_before = stored_files(relative_upload_dir)
+
+    dry = storage.collect_garbage(db_session, batch_size=2, dry_run=True)
+
+    assert (dry["orphaned"], dry["removed"]) == (3, 0)
+    assert sorted(os.path.basename(path) for path in dry["orphans"]) == sorted(
+        [orphan.name, orphan_thumb.name, leftover.name]
+    )
+    assert stored_files(relative_upload_dir) == files_before
+
+    report = storage.collect_garbage(db_session, batch_size=2)
+
+    assert (report["orphaned"], report["removed"], report["freed_bytes"]) == (3, 3, 30)
+    assert not any(path.exists() for path in (orphan, orphan_thumb, leftover))
+    assert all(path.exists() for path in (kept, legacy, legacy_card, fresh))
+
+
+def test_gc_endpoint_is_admin_only(client, db_session, relative_upload_dir):
+    assert client.post("/admin/uploads/gc").status_code == 403
+
+    db_session.get(models.User, 1).role = "admin"
+    db_session.commit()
+    response = client.post("/admin/uploads/gc")
+
+    assert response.status_code == 200
+    assert response.json()["orphaned"] == 0
@@ -0,0 +1,139 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+from main import app
+from database import get_db
+from routers.auth import get_current_user
+import baseline
+import models
+import search
+import summary
+import uploads
+
+JPEG = b"\xff\xd8\xff"
+
+
+@pytest.fixture(autouse=True)
+def clean_overrides():
+    yield
+    app.dependency_overrides.clear()
+    search.invalidate_results()
+
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOAD_DIR", str(tmp_path / "uploads"))
+    return tmp_path / "uploads"
+
+
+@pytest.fixture
+def db_session(shared_engine, async_db):
+    db = sessionmaker(bind=shared_engine)()
+    db.add_all([
+        models.User(id=1, username="agent", email="agent@test.com", role="agent", is_verified=True,
+                    first_name="A", last_name="B"),
+        models.User(id=2, username="client", email="client@test.com", role="client", is_verified=True),
+        models.User(id=3, username="admin", email="admin@test.com", role="admin", is_verified=True),
+    ])
+    db.commit()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def client(db_session):
+    app.dependency_overrides[get_db] = lambda: db_session
+    return TestClient(app)
+
+
+def act_as(db_session, user_id):
+    app.dependency_overrides[get_current_user] = lambda: db_session.get(models.User, user_id)
+
+
+def create_listing(client, db_session):
+    act_as(db_session, 1)
+    response = client.post("/properties/", json={
+        "title": "Апартамент", "price": 1000, "property_type": "rent", "location": "София"
+    })
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+def stored_summary(db_session, prop_id):
+    db_session.expire_all()
+    return db_session.get(models.PropertySummary, prop_id)
+
+
+def test_new_listing_starts_with_empty_summary(client, db_session):
+    prop_id = create_listing(client, db_session)
+
+    row = stored_summary(db_session, prop_id)
+
+    assert (row.review_count, row.booking_count, row.image_count, row.cover_image_url) == (0, 0, 0, None)
+    assert row.average_rating is None
+
+
+def test_write_paths_keep_summary_in_step(client, db_session, upload_dir):
+    prop_id = create_listing(client, db_session)
+    client.post(f"/properties/{prop_id}/upload-image", files={"file": ("a.jpg", JPEG + b"first")})
+    client.post(f"/properties/{prop_id}/upload-image", files={"file": ("b.jpg", JPEG + b"second")})
+
+    act_as(db_session, 2)
+    client.post("/reviews/", json={"property_id": prop_id, "rating": 5, "comment": "Чудесно"})
+    booking = client.post("/bookings/", json={"property_id": prop_id, "booking_date": "2026-05-20T10:00:00"}).json()
+    act_as(db_session, 3)
+    client.post("/reviews/", json={"property_id": prop_id, "rating": 2, "comment": "Шумно"})
+    act_as(db_session, 1)
+    client.patch(f"/bookings/{booking['id']}/status?new_status=declined")
+
+    row = stored_summary(db_session, prop_id)
+    first_image = db_session.query(models.PropertyImage).order_by(models.PropertyImage.id).first()
+    assert (row.review_count, row.average_rating, row.booking_count, row.image_count) == (2, 3.5, 0, 2)
+    assert row.cover_image_url == first_image.url
+
+    act_as(db_session, 3)
+    review_id = db_session.query(models.Review.id).filter(models.Review.rating == 2).scalar()
+    client.delete(f"/admin/reviews/{review_id}")
+
+    details = client.get(f"/properties/{prop_id}").json()
+    assert (details["review_count"], details["average_rating"]) == (1, 5.0)
+    assert summary.check(db_session) == []
+
+
+def test_missing_summary_is_recomputed_on_write(client, db_session):
+    prop_id = create_listing(client, db_session)
+    db_session.execute(text("DELETE FROM property_summary"))
+    db_session.add(models.Review(property_id=prop_id, author_id=3, rating=4))
+    db_session.commit()
+
+    act_as(db_session, 2)
+    client.post("/reviews/", json={"property_id": prop_id, "rating": 2, "comment": None})
+
+    row = stored_summary(db_session, prop_id)
+    assert (row.review_count, row.rating_total) == (2, 6)
+
+
+def test_check_and_rebuild_repair_drift(client, db_session):
+    prop_id = create_listing(client, db_session)
+    db_session.add(models.Review(property_id=prop_id, author_id=2, rating=4))
+    db_session.commit()
+
+    assert summary.check(db_session) == [prop_id]
+
+    assert summary.rebuild(db_session, batch_size=1) == 1
+    assert summary.check(db_session) == []
+    assert stored_summary(db_session, prop_id).average_rating == 4.0
+
+
+def test_schema_backfills_new_summary_table(db_session):
+    db_session.add(models.Property(id=7, title="Стар", price=1, property_type="sale", owner_id=1))
+    db_session.add(models.PropertyImage(property_id=7, url="static/uploads/old.jpg"))
+    db_session.execute(text("DROP TABLE property_summary"))
+    db_session.commit()
+
+    baseline.apply(db_session.get_bind())
+
+    assert stored_summary(db_session, 7).cover_image_url == "static/uploads/old.jpg"
@@ -0,0 +1,166 @@
+import asyncio
+import hashlib
+import os
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+from main import app
+from database import get_db
+from routers.auth import get_current_user
+import models
+import search
+import uploads
+
+JPEG = b"\xff\xd8\xff\xe0" + b"\x00" * 100
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 100
+
+
+@pytest.fixture(autouse=True)
+def clean_overrides():
+    yield
+    app.dependency_overrides.clear()
+    search.invalidate_results()
+
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOAD_DIR", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def db_session(engine):
+    db = sessionmaker(bind=engine)()
+    db.add(models.User(id=1, username="agent", email="agent@test.com", role="agent", is_verified=True))
+    db.add(models.Property(id=1, title="Студио", price=500, property_type="rent", location="София", owner_id=1))
+    db.commit()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def client(db_session, upload_dir):
+    app.dependency_overrides[get_db] = lambda: db_session
+    app.dependency_overrides[get_current_user] = lambda: db_session.get(models.User, 1)
+    return TestClient(app)
+
+
+def upload(client, name, content, content_type):
+    return client.post("/properties/1/upload-image", files={"file": (name, content, content_type)})
+
+
+def test_upload_streams_file_and_records_checksum(client, db_session, upload_dir, monkeypatch):
+    monkeypatch.setattr(uploads, "CHUNK_SIZE", 16)
+    content = PNG * 5
+
+    response = upload(client, "photo.bin", content, "image/png")
+
+    assert response.status_code == 200
+    assert response.json()["sha256"] == hashlib.sha256(content).hexdigest()
+    image = db_session.query(models.PropertyImage).one()
+    assert (image.content_type, image.size_bytes) == ("image/png", len(content))
+    assert image.url.endswith(".png")
+    assert [path.read_bytes() for path in upload_dir.rglob("*.*")] == [content]
+
+
+def test_upload_rejects_unsupported_type(client, upload_dir):
+    response = upload(client, "notes.txt", b"hello", "text/plain")
+
+    assert response.status_code == 415
+    assert list(upload_dir.iterdir()) == []
+
+
+def test_upload_rejects_content_not_matching_type(client, upload_dir):
+    response = upload(client, "fake.jpg", PNG, "image/jpeg")
+
+    assert response.status_code == 415
+    assert list(upload_dir.iterdir()) == []
+
+
+def test_upload_over_limit_leaves_no_partial_file(client, db_session, upload_dir, monkeypatch):
+    monkeypatch.setattr(uploads, "CHUNK_SIZE", 64)
+    monkeypatch.setattr(uploads, "MAX_UPLOAD_BYTES", 150)
+
+    response = upload(client, "big.jpg", JPEG * 2, "image/jpeg")
+
+    assert response.status_code == 413
+    assert list(upload_dir.iterdir()) == []
+    assert db_session.query(models.PropertyImage).count() == 0
+
+
+def run_middleware(path, headers, chunks):
+    """Sends ``chunks`` through UploadSizeLimit; returns the response status and the chunks the app read."""
+    read, sent = [], []
+    messages = iter([{"type": "http.request", "body": chunk, "more_body": True} for chunk in chunks]
+                    + [{"type": "http.request", "body": b"", "more_body": False}])
+
+    async def receive():
+        return next(messages)
+
+    async def send(message):
+        sent.append(message)
+
+    async def app(scope, receive, send):
+        while True:
+            message = await receive()
+            read.append(message["body"])
+            if not message["more_body"]:
+                break
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    scope = {"type": "http", "method": "POST", "path": path,
+             "headers": [(name.encode(), value.encode()) for name, value in headers.items()]}
+    try:
+        asyncio.run(uploads.UploadSizeLimit(app)(scope, receive, send))
+    except HTTPException as error:
+        return error.status_code, read
+    return sent[0]["status"], read
+
+
+def test_declared_size_rejected_without_reading_the_body(monkeypatch):
+    monkeypatch.setattr(uploads, "CHUNK_SIZE", 10)
+    monkeypatch.setattr(uploads, "MAX_UPLOAD_BYTES", 100)
+
+    status, read = run_middleware("/properties/1/upload-image", {"content-length": "111"}, [b"x" * 111])
+
+    assert (status, read) == (413, [])
+
+
+def test_undeclared_body_stops_being_read_at_the_limit(monkeypatch):
+    monkeypatch.setattr(uploads, "CHUNK_SIZE", 10)
+    monkeypatch.setattr(uploads, "MAX_UPLOAD_BYTES", 100)
+
+    status, read = run_middleware("/properties/1/upload-image", {}, [b"x" * 50] * 10)
+
+    assert (status, read) == (413, [b"x" * 50] * 2)
+    assert run_middleware("/properties/1", {}, [b"x" * 50] * 10) == (200, [b"x" * 50] * 10 + [b""])
+
+
+def test_chunked_upload_over_limit_is_rejected(client, db_session, upload_dir, monkeypatch):
+    monkeypatch.setattr(uploads, "CHUNK_SIZE", 64)
+    monkeypatch.setattr(uploads, "MAX_UPLOAD_BYTES", 150)
+    boundary = "imot2"
+    body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"big.jpg\"\r\n"
+            f"Content-Type: image/jpeg\r\n\r\n").encode() + JPEG * 20 + f"\r\n--{boundary}--\r\n".encode()
+
+    response = client.post("/properties/1/upload-image", content=iter([body[:100], body[100:]]),
+                           headers={"content-type": f"multipart/form-data; boundary={boundary}"})
+
+    assert response.status_code == 413
+    assert list(upload_dir.iterdir()) == []
+    assert db_session.query(models.PropertyImage).count() == 0
+
+
+def test_upload_checks_ownership_before_writing(client, db_session, upload_dir):
+    db_session.add(models.User(id=2, username="other", email="other@test.com", role="agent", is_verified=True))
+    db_session.get(models.Property, 1).owner_id = 2
+    db_session.commit()
+
+    response = upload(client, "photo.jpg", JPEG, "image/jpeg")
+
+    assert response.status_code == 403
+    assert not os.listdir(upload_dir)
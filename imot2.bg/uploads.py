@@ -0,0 +1,159 @@
+"""Streaming image upload pipeline.
+
+Uploads are read in fixed-size chunks and written with aiofiles, so the event loop
+is never blocked by disk I/O, whatever the size of the file. The declared content
+type and the file signature are checked on the first chunk, the size limit is
+enforced while streaming, and a SHA-256 checksum is computed on the way through.
+A rejected or failed upload leaves no partial file behind.
+
+The multipart body is parsed (and spooled to temporary files) before a handler
+runs, so the request body of the upload routes is capped beforehand by the
+UploadSizeLimit middleware.
+"""
+import hashlib
+import os
+import re
+import uuid
+from dataclasses import dataclass
+from typing import Optional
+import aiofiles
+import aiofiles.os
+from fastapi import HTTPException, UploadFile
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+
+UPLOAD_DIR = "static/uploads"
+CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+MAX_BATCH_FILES = 20
+# Upload routes (POST) and how many files each accepts.
+UPLOAD_ROUTES = {
+    re.compile(r"/properties/\d+/upload-image"): 1,
+    re.compile(r"/properties/\d+/images"): MAX_BATCH_FILES,
+}
+
+# Accepted content types, their file extension and the signature files start with.
+IMAGE_TYPES = {
+    "image/jpeg": (".jpg", (b"\xff\xd8\xff",)),
+    "image/png": (".png", (b"\x89PNG\r\n\x1a\n",)),
+    "image/gif": (".gif", (b"GIF87a", b"GIF89a")),
+    "image/webp": (".webp", (b"RIFF",)),
+}
+
+
+@dataclass
+class StoredUpload:
+    path: str
+    url: str
+    content_type: str
+    size: int
+    sha256: str
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"File too large (max {max_bytes // (1024 * 1024)} MB)")
+
+
+def body_limit(files: int) -> int:
+    """Largest request body accepted for ``files`` files of up to MAX_UPLOAD_BYTES each."""
+    # The multipart body carries boundaries, part headers and form fields besides the files.
+    return files * MAX_UPLOAD_BYTES + CHUNK_SIZE
+
+
+class UploadSizeLimit:
+    """ASGI middleware that caps the request body of the upload routes before it is parsed.
+
+    A request whose Content-Length exceeds the limit is answered with 413 without
+    reading its body. Other requests, including chunked ones without a
+    Content-Length, have their body counted as the app receives it, and fail with
+    413 as soon as the count passes the limit, so no more of it is read or spooled.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    @staticmethod
+    def _limit(scope) -> Optional[int]:
+        if scope["type"] != "http" or scope["method"] != "POST":
+            return None
+        files = next((count for route, count in UPLOAD_ROUTES.items() if route.fullmatch(scope["path"])), None)
+        return None if files is None else body_limit(files)
+
+    async def __call__(self, scope, receive, send):
+        limit = self._limit(scope)
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        declared = Headers(scope=scope).get("content-length")
+        if declared and declared.isdigit() and int(declared) > limit:
+            error = _too_large(limit)
+            await JSONResponse({"detail": error.detail}, status_code=error.status_code)(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Raised inside the form parser; FastAPI re-raises HTTPExceptions from it as they are.
+                    raise _too_large(limit)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def _check_signature(content_type: str, head: bytes):
+    _, signatures = IMAGE_TYPES[content_type]
+    if not head.startswith(signatures) or (content_type == "image/webp" and head[8:12] != b"WEBP"):
+        raise HTTPException(status_code=415, detail="File content does not match its image type")
+
+
+async def save_upload(file: UploadFile, upload_dir: Optional[str] = None,
+                      max_bytes: Optional[int] = None) -> StoredUpload:
+    """Streams an uploaded image to ``upload_dir`` and returns where it was stored."""
+    upload_dir, max_bytes = upload_dir or UPLOAD_DIR, max_bytes or MAX_UPLOAD_BYTES
+    content_type = (file.content_type or "").split(";")[0].strip().lower()
+    if content_type not in IMAGE_TYPES:
+        raise HTTPException(
+            status_code=415, detail=f"Unsupported image type. Allowed: {', '.join(sorted(IMAGE_TYPES))}"
+        )
+
+    first_chunk = await file.read(CHUNK_SIZE)
+    _check_signature(content_type, first_chunk)
+
+    await aiofiles.os.makedirs(upload_dir, exist_ok=True)
+    extension, _ = IMAGE_TYPES[content_type]
+    path = os.path.join(upload_dir, f"{uuid.uuid4()}{extension}")
+    checksum, size = hashlib.sha256(), 0
+
+    try:
+        async with aiofiles.open(path, "wb") as buffer:
+            chunk = first_chunk
+            while chunk:
+                size += len(chunk)
+                if size > max_bytes:
+                    raise _too_large(max_bytes)
+                checksum.update(chunk)
+                await buffer.write(chunk)
+                chunk = await file.read(CHUNK_SIZE)
+    except HTTPException:
+        await _discard(path)
+        raise
+    except Exception:
+        await _discard(path)
+        raise HTTPException(status_code=500, detail="Could not save file")
+
+    return StoredUpload(
+        path=path, url=f"/{path}", content_type=content_type, size=size, sha256=checksum.hexdigest()
+    )
+
+
+async def _discard(path: str):
+    try:
+        await aiofiles.os.remove(path)
+    except FileNotFoundError:
+        pass